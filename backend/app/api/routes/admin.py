@@ -1,6 +1,7 @@
 """Admin control endpoints for manual processing and system monitoring."""
 
 from fastapi import APIRouter, HTTPException, Query, Depends
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from app.db.database import get_db
 from app.db.models import (
@@ -8,20 +9,26 @@ from app.db.models import (
     Device,
     Observation,
     InventoryEvent,
+    VisionResultCache,
 )
 
 # Capture.status values (see app.db.models.Capture)
 STATUS_STORED = "stored"
 STATUS_ANALYZING = "analyzing"
 STATUS_COMPLETE = "complete"
+STATUS_UNCHANGED = "unchanged"
 STATUS_FAILED = "failed"
+from app.config import settings
 from app.workers.celery_app import (
-    process_image_capture,
+    enqueue_capture,
     process_pending_captures,
     celery_app,
 )
 from app.middleware.rate_limit import rate_limit_store
+from app.services.admission import get_ingest_admission
+from app.services.storage import get_storage_manager
 import logging
+import os
 from typing import Optional
 
 logger = logging.getLogger(__name__)
@@ -44,6 +51,13 @@ async def get_system_stats(db: Session = Depends(get_db)):
     processing = db.query(Capture).filter(Capture.status == STATUS_ANALYZING).count()
     completed = db.query(Capture).filter(Capture.status == STATUS_COMPLETE).count()
     failed = db.query(Capture).filter(Capture.status == STATUS_FAILED).count()
+    unchanged = db.query(Capture).filter(Capture.status == STATUS_UNCHANGED).count()
+    threshold_overrides = db.query(Device).filter(Device.near_duplicate_threshold.isnot(None)).count()
+    suppressed_events = db.query(func.coalesce(func.sum(Capture.suppressed_events), 0)).scalar()
+    cache_entries, cache_hits = db.query(
+        func.count(VisionResultCache.cache_key),
+        func.coalesce(func.sum(VisionResultCache.hit_count), 0),
+    ).one()
 
     # Get active tasks from Celery (optional; tests/dev may not have Redis running)
     total_active = 0
@@ -64,10 +78,27 @@ async def get_system_stats(db: Session = Depends(get_db)):
             "pending": pending,
             "processing": processing,
             "completed": completed,
+            "unchanged": unchanged,
             "failed": failed,
         },
+        "near_duplicates": {
+            "threshold": settings.NEAR_DUPLICATE_THRESHOLD,
+            "device_overrides": threshold_overrides,
+            "suppressed": unchanged,
+            "analyzed": completed,
+            "hit_rate": round(unchanged / (unchanged + completed), 4) if (unchanged + completed) else 0.0,
+        },
+        "vision_cache": {
+            "enabled": settings.VISION_CACHE_ENABLED,
+            "entries": cache_entries,
+            "hits": int(cache_hits),
+        },
         "observations": {"total": observation_count},
-        "events": {"total": event_count},
+        "events": {
+            "total": event_count,
+            "suppressed_unchanged": int(suppressed_events),
+            "suppression_enabled": settings.INVENTORY_SUPPRESS_UNCHANGED_EVENTS,
+        },
         "queue": {
             "active_jobs": total_active,
             "reserved_jobs": total_reserved,
@@ -77,6 +108,7 @@ async def get_system_stats(db: Session = Depends(get_db)):
             "enabled": True,
             "total_tracked": len(getattr(rate_limit_store, "_mem", {})),
         },
+        "ingest_admission": get_ingest_admission().stats(),
     }
 
 
@@ -84,6 +116,7 @@ async def get_system_stats(db: Session = Depends(get_db)):
 async def process_capture(
     capture_id: str,
     sync: bool = Query(False),
+    reanalyze: bool = Query(False),
     db: Session = Depends(get_db),
 ):
     """
@@ -92,6 +125,7 @@ async def process_capture(
     Args:
         capture_id: ID of capture to process
         sync: If True, wait for result; if False, queue asynchronously (default)
+        reanalyze: If True, bypass the vision result cache and call the provider again
     """
     capture = db.query(Capture).filter(Capture.id == capture_id).first()
     if not capture:
@@ -100,10 +134,18 @@ async def process_capture(
     if sync:
         # Process synchronously
         try:
-            from app.services.vision import VisionAnalyzer
+            from app.services.vision import get_vision_analyzer
 
-            analyzer = VisionAnalyzer()
-            result = analyzer.analyze_image(capture.image_path)
+            image_path = capture.image_path
+            if not os.path.isabs(image_path):
+                image_path = str(get_storage_manager().storage_path / image_path)
+
+            analyzer = get_vision_analyzer()
+            result = analyzer.analyze_image(
+                image_path,
+                image_sha256=capture.image_sha256,
+                use_cache=not reanalyze,
+            )
 
             # Create observation
             observation = Observation(
@@ -128,11 +170,11 @@ async def process_capture(
             raise HTTPException(status_code=500, detail=str(e))
     else:
         # Queue async job
-        task = process_image_capture.delay(capture_id)
+        task = enqueue_capture(capture_id, use_cache=not reanalyze, reprocess=True)
         return {
             "capture_id": capture_id,
-            "task_id": task.id,
-            "status": "queued",
+            "task_id": task.id if task else None,
+            "status": "queued" if task else "already_queued",
             "sync": False,
         }
 
@@ -168,12 +210,15 @@ async def process_pending(
         # Process synchronously
         processed = 0
         try:
-            from app.services.vision import VisionAnalyzer
+            from app.services.vision import get_vision_analyzer
 
-            analyzer = VisionAnalyzer()
+            analyzer = get_vision_analyzer()
             for capture in pending:
                 try:
-                    result = analyzer.analyze_image(capture.image_path)
+                    image_path = capture.image_path
+                    if not os.path.isabs(image_path):
+                        image_path = str(get_storage_manager().storage_path / image_path)
+                    result = analyzer.analyze_image(image_path, image_sha256=capture.image_sha256)
                     observation = Observation(
                         capture_id=capture.id,
                         raw_json=result.model_dump() if hasattr(result, "model_dump") else result,
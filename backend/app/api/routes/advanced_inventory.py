@@ -4,19 +4,21 @@ import logging
 import uuid
 from datetime import datetime, timedelta, date
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.db.database import get_db
 from app.db.models import (
     InventoryItem, InventoryState, InventoryEvent, Capture,
-    ConsumptionEvent, HouseholdMember,
+    ConsumptionEvent, HouseholdMember, Location,
 )
 from app.models.schemas import (
     InventoryItem as InventoryItemSchema,
     InventoryResponse,
 )
+from app.services.event_feed import filtered_events, item_names, page_events
+from app.services.exports import csv_lines, export_response, iter_query, json_document, ndjson_lines
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -154,22 +156,29 @@ async def get_stale_items(
 
 @router.get("/inventory/recent-changes")
 async def get_recent_changes(
+    response: Response,
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
+    item_id: Optional[str] = None,
+    event_type: Optional[str] = None,
+    capture_id: Optional[str] = None,
     db: Session = Depends(get_db),
 ):
-    """Get recent inventory events."""
-    events = (
-        db.query(InventoryEvent)
-        .order_by(InventoryEvent.created_at.desc())
-        .limit(limit)
-        .all()
-    )
+    """Get recent inventory events, newest first.
+
+    The next (older) page's cursor comes back in the X-Next-Cursor header.
+    """
+    query = filtered_events(db, item_id=item_id, event_type=event_type, capture_id=capture_id)
+    events, next_cursor, _ = page_events(query, limit, cursor=cursor)
+    names = item_names(db, events)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
 
     return [
         {
             "id": e.id,
             "item_id": e.item_id,
-            "item_name": e.item.canonical_name if e.item else "Unknown",
+            "item_name": names.get(e.item_id, "Unknown"),
             "event_type": e.event_type,
             "delta": e.delta,
             "details": e.details,
@@ -179,18 +188,48 @@ async def get_recent_changes(
     ]
 
 
+_EXPORT_FIELDS = [
+    "id", "canonical_name", "brand", "category", "count_estimate",
+    "confidence", "par_level", "location", "last_seen_at",
+]
+
+
 @router.get("/inventory/export")
 async def export_inventory(
-    format: str = Query("json", regex="^(json|csv)$"),
+    format: str = Query("json", regex="^(json|csv|ndjson)$"),
+    compress: bool = Query(False, description="gzip the download"),
     db: Session = Depends(get_db),
 ):
-    """Export full inventory."""
-    items = db.query(InventoryItem).all()
-    return {"items": [_item_to_dict(i) for i in items]}
+    """Export full inventory, streamed row by row."""
+    rows = (
+        db.query(InventoryItem, InventoryState, Location.name)
+        .outerjoin(InventoryState, InventoryState.item_id == InventoryItem.id)
+        .outerjoin(Location, Location.id == InventoryState.location_id)
+        .order_by(InventoryItem.id, InventoryState.id)
+    )
+    records = _first_state_per_item(iter_query(rows))
+
+    # JSON stays an inline API response; CSV/NDJSON are downloads
+    filename = None if format == "json" else f"pantry-inventory-{datetime.utcnow().strftime('%Y%m%d')}.{format}"
+    if format == "csv":
+        pieces = csv_lines(_EXPORT_FIELDS, ([r[f] for f in _EXPORT_FIELDS] for r in records))
+    elif format == "ndjson":
+        pieces = ndjson_lines(records)
+    else:
+        pieces = json_document("items", records)
+    return export_response(pieces, format, filename, compress)
+
+
+def _first_state_per_item(rows):
+    last_id = None
+    for item, state, location_name in rows:
+        if item.id == last_id:
+            continue
+        last_id = item.id
+        yield _item_to_dict(item, state, location_name)
 
 
-def _item_to_dict(item: InventoryItem) -> dict:
-    state = item.states[0] if item.states else None
+def _item_to_dict(item: InventoryItem, state: Optional[InventoryState], location_name: Optional[str]) -> dict:
     return {
         "id": item.id,
         "canonical_name": item.canonical_name,
@@ -199,7 +238,7 @@ def _item_to_dict(item: InventoryItem) -> dict:
         "count_estimate": state.count_estimate if state else 0,
         "confidence": state.confidence if state else 0,
         "par_level": state.par_level if state else None,
-        "location": state.location.name if state and state.location else None,
+        "location": location_name,
         "last_seen_at": str(state.last_seen_at) if state else None,
     }
 
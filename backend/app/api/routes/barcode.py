@@ -19,6 +19,7 @@ from app.models.schemas import (
     BarcodeAddToInventoryRequest,
 )
 from app.services.barcode import lookup_barcode
+from app.services.shopping import sync_shopping_items
 
 logger = logging.getLogger("pantry-api.barcode")
 
@@ -267,6 +268,7 @@ async def add_barcode_to_inventory(
         barcode_entry.lookup_count = (barcode_entry.lookup_count or 1) + 1
         barcode_entry.last_lookup_at = datetime.utcnow()
 
+    sync_shopping_items(db, [item.id])
     db.commit()
 
     return {
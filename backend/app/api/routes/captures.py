@@ -1,14 +1,16 @@
 """Capture routes with structured logging."""
 from datetime import datetime
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, UploadFile
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 import logging
 import os
 
 from app.db.database import get_db
 from app.db.models import Capture, Device, Observation
 from app.models.schemas import CaptureDetail, CaptureResponse
+from app.services.image_delivery import image_response, resolve_image_path
+from app.services.image_sizes import get_derivative_cache
 from app.services.storage import get_storage_manager
 from app.auth import TokenManager
 
@@ -66,6 +68,8 @@ async def create_manual_capture(
         "content_type": image.content_type,
     })
 
+    get_storage_manager().validate_content_type(image.content_type)
+
     device = None
     if device_id:
         device = db.query(Device).filter(Device.id == device_id).first()
@@ -86,41 +90,40 @@ async def create_manual_capture(
         db.flush()
         logger.info("Created auto-device for manual capture", extra={"device_id": device.id})
 
-    content = await image.read()
-    if not content:
+    storage_mgr = get_storage_manager()
+    staged = await run_in_threadpool(storage_mgr.stage_upload, image.file)
+    if not staged.size:
+        storage_mgr.discard_staged(staged.path)
         logger.error("Empty image file")
         raise HTTPException(status_code=400, detail="Image file is empty")
 
+    # Content-addressed: identical frames share one file (ref-counted in image_blobs)
+    image_path = storage_mgr.commit_staged(staged, db)
+
     capture = Capture(
         device_id=device.id,
         trigger_type="manual",
         captured_at=datetime.utcnow(),
-        image_path="pending",
+        image_path=image_path,
+        image_sha256=staged.sha256,
         battery_v=None,
         rssi=None,
         status="stored",
     )
     db.add(capture)
     db.flush()
-
-    storage_mgr = get_storage_manager()
-    capture.image_path = storage_mgr.save_image(
-        device_id=device.id,
-        capture_id=capture.id,
-        image_data=content,
-    )
     device.last_seen_at = datetime.utcnow()
     db.commit()
 
     logger.info("Capture stored", extra={
         "capture_id": capture.id,
-        "image_size": len(content),
+        "image_size": staged.size,
         "image_path": capture.image_path,
     })
 
     try:
-        from app.workers.celery_app import process_image_capture
-        process_image_capture.delay(capture.id)
+        from app.workers.celery_app import enqueue_capture
+        enqueue_capture(capture.id)
         logger.info("Capture queued for analysis", extra={"capture_id": capture.id})
     except Exception as task_err:
         logger.error("Failed to queue analysis task", extra={
@@ -157,22 +160,39 @@ async def get_capture(capture_id: str, db: Session = Depends(get_db)):
         status=cap.status,
         error_message=cap.error_message,
         image_path=cap.image_path,
+        image_sha256=cap.image_sha256,
         latest_observation=obs.raw_json if obs else None,
     )
 
 
 @router.get("/captures/{capture_id}/image")
-async def get_capture_image(capture_id: str, db: Session = Depends(get_db)):
-    cap = db.query(Capture).filter(Capture.id == capture_id).first()
-    if not cap:
-        raise HTTPException(status_code=404, detail="Capture not found")
-    image_path = cap.image_path
-    if not image_path:
-        raise HTTPException(status_code=404, detail="Image not found")
-    if not os.path.isabs(image_path):
-        storage_mgr = get_storage_manager()
-        image_path = str(storage_mgr.storage_path / image_path)
-    if not os.path.exists(image_path):
-        logger.warning("Image file missing", extra={"capture_id": capture_id, "path": image_path})
-        raise HTTPException(status_code=404, detail="Image file missing")
-    return FileResponse(image_path, media_type="image/jpeg")
+async def get_capture_image(
+    capture_id: str,
+    request: Request,
+    size: str = Query("full", pattern="^(thumb|medium|full)$"),
+    db: Session = Depends(get_db),
+):
+    def resolve() -> str:
+        cap = db.query(Capture).filter(Capture.id == capture_id).first()
+        if not cap:
+            raise HTTPException(status_code=404, detail="Capture not found")
+        image_path = cap.image_path
+        if not image_path:
+            raise HTTPException(status_code=404, detail="Image not found")
+        if not os.path.isabs(image_path):
+            storage_mgr = get_storage_manager()
+            image_path = str(storage_mgr.storage_path / image_path)
+        if not os.path.exists(image_path):
+            logger.warning("Image file missing", extra={"capture_id": capture_id, "path": image_path})
+            raise HTTPException(status_code=404, detail="Image file missing")
+        return image_path
+
+    image_path = resolve_image_path("capture", capture_id, resolve)
+
+    def serve():
+        path = image_path if size == "full" else get_derivative_cache().get(image_path, size)
+        # The original is content-addressed and never changes; resized copies
+        # are regenerated (encoder settings, evictions), so they revalidate by ETag
+        return image_response(path, request.headers, immutable=size == "full")
+
+    return await run_in_threadpool(serve)
@@ -15,6 +15,7 @@ from app.db.models import (
     Observation,
 )
 from app.models.schemas import ObservationItem
+from app.services.shopping import sync_shopping_items
 
 logger = __import__("logging").getLogger("pantry-api.detections")
 
@@ -144,6 +145,7 @@ def _add_to_inventory(
     if quantity_estimate:
         state.count_estimate = quantity_estimate
 
+    sync_shopping_items(db, [item.id])
     db.commit()
     db.refresh(item)
     db.refresh(state)
@@ -164,6 +166,7 @@ def _remove_from_inventory(db: Session, capture: Capture, name: str, brand: Opti
 
     if state:
         db.delete(state)
+        sync_shopping_items(db, [item.id])
         db.commit()
         return True
 
@@ -173,6 +176,7 @@ def _remove_from_inventory(db: Session, capture: Capture, name: str, brand: Opti
     ).first()
     if state:
         db.delete(state)
+        sync_shopping_items(db, [item.id])
         db.commit()
         return True
 
@@ -121,6 +121,7 @@ async def get_device(
         total_captures=total_captures,
         failed_uploads=failed_uploads,
         status=_get_device_status(device),
+        near_duplicate_threshold=device.near_duplicate_threshold,
     )
 
 
@@ -283,6 +284,8 @@ async def update_device(
     Request Body (all optional):
     - name: Update device name
     - enabled: Enable/disable device
+    - near_duplicate_threshold: Per-device dHash distance below which frames are
+      treated as unchanged (0 disables suppression for this device)
     
     Returns:
     - Updated DeviceResponse
@@ -297,6 +300,9 @@ async def update_device(
     if request.name is not None:
         device.name = request.name
         logger.info(f"Updated device name to: {request.name}")
+    if request.near_duplicate_threshold is not None:
+        device.near_duplicate_threshold = request.near_duplicate_threshold
+        logger.info(f"Updated near-duplicate threshold to: {request.near_duplicate_threshold}")
     
     db.commit()
     
@@ -321,6 +327,7 @@ async def update_device(
         total_captures=total_captures,
         failed_uploads=failed_uploads,
         status=_get_device_status(device),
+        near_duplicate_threshold=device.near_duplicate_threshold,
     )
 
 
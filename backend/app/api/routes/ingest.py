@@ -4,8 +4,10 @@ from datetime import datetime
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, Request
 from fastapi.security import HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from app.db.database import get_db
 from app.db.models import Device, Capture
+from app.services.admission import get_ingest_admission
 from app.services.storage import get_storage_manager
 from app.auth import TokenManager, get_current_device, security
 
@@ -45,6 +47,24 @@ async def ingest_image(
     if not auth_token or not TokenManager.verify_token(auth_token, db_device.token_hash):
         raise HTTPException(status_code=401, detail="Invalid token")
 
+    # Admission is normally decided by IngestAdmissionMiddleware before the upload
+    # is read; clients that only send the trigger as a form field, or whose form
+    # trigger differs from the admitted header, are checked here
+    if getattr(request.state, "admitted_trigger", None) != trigger_type:
+        decision = await run_in_threadpool(get_ingest_admission().admit, db_device.token_hash, trigger_type)
+        if not decision.admitted:
+            logger.warning("Capture refused by admission control", extra={
+                "device_id": device_id,
+                "trigger_type": trigger_type,
+                "status_code": decision.status_code,
+                "retry_after": decision.retry_after,
+            })
+            raise HTTPException(
+                status_code=decision.status_code,
+                detail=decision.reason,
+                headers={"Retry-After": str(decision.retry_after)},
+            )
+
     capture_time = datetime.utcnow()
     timestamp_value = captured_at or timestamp
     if timestamp_value:
@@ -53,17 +73,24 @@ async def ingest_image(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid timestamp format")
 
-    # Store image
-    content = await image.read()
-    if not content:
+    # Hash the spooled upload off the event loop; only new blobs are written to staging
+    storage_mgr = get_storage_manager()
+    storage_mgr.validate_content_type(image.content_type)
+    staged = await run_in_threadpool(storage_mgr.stage_upload, image.file)
+    if not staged.size:
+        storage_mgr.discard_staged(staged.path)
         logger.error("Empty image from ESP32", extra={"device_id": device_id})
         raise HTTPException(status_code=400, detail="Empty image payload")
 
+    # Content-addressed: identical frames share one file (ref-counted in image_blobs)
+    image_path = storage_mgr.commit_staged(staged, db)
+
     capture = Capture(
         device_id=db_device.id,
         trigger_type=trigger_type,
         captured_at=capture_time,
-        image_path="pending",
+        image_path=image_path,
+        image_sha256=staged.sha256,
         battery_v=battery_v,
         rssi=rssi,
         status="stored",
@@ -71,13 +98,6 @@ async def ingest_image(
     db.add(capture)
     db.flush()
 
-    storage_mgr = get_storage_manager()
-    capture.image_path = storage_mgr.save_image(
-        device_id=db_device.id,
-        capture_id=capture.id,
-        image_data=content,
-    )
-
     db_device.last_seen_at = datetime.utcnow()
     db_device.last_battery_v = battery_v
     db_device.last_rssi = rssi
@@ -86,14 +106,14 @@ async def ingest_image(
     logger.info("ESP32 capture stored", extra={
         "capture_id": capture.id,
         "device_id": device_id,
-        "image_size": len(content),
+        "image_size": staged.size,
         "battery_v": battery_v,
         "rssi": rssi,
     })
 
     try:
-        from app.workers.celery_app import process_image_capture
-        process_image_capture.delay(capture.id)
+        from app.workers.celery_app import enqueue_capture
+        enqueue_capture(capture.id)
         logger.info("Capture queued from ESP32", extra={"capture_id": capture.id})
     except Exception as e:
         logger.error("Failed to queue ESP32 capture", extra={"capture_id": capture.id, "error": str(e)})
@@ -1,14 +1,14 @@
-import csv
-import io
+import json
 import os
 from datetime import datetime
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import FileResponse, StreamingResponse
-from sqlalchemy.orm import Session
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import and_, not_, or_
+from sqlalchemy.orm import Session, contains_eager, joinedload
+from starlette.concurrency import run_in_threadpool
 
 from app.db.database import get_db
-from app.db.models import InventoryState, InventoryItem, Location, ShoppingListItem as ShoppingListItemModel, InventoryReview
+from app.db.models import InventoryState, InventoryItem, InventoryEvent, Location, ShoppingListItem as ShoppingListItemModel, InventoryReview
 from app.models.schemas import (
     InventoryResponse,
     InventoryItem as InventoryItemSchema,
@@ -18,63 +18,121 @@ from app.models.schemas import (
     ReviewRequest,
     ReviewResponse,
 )
+from app.services.cursors import decode_cursor, encode_cursor
+from app.services.event_feed import filtered_events, item_names, page_events, tail_cursor
+from app.services.exports import csv_lines, export_response, iter_query, json_document, ndjson_lines
 from app.services.inventory import InventoryManager
+from app.services.shopping import sync_shopping_items
+from app.services.image_delivery import image_response, resolve_image_path
+from app.services.image_sizes import get_derivative_cache
 from app.services.storage import get_storage_manager
 
 router = APIRouter()
 
+def _inventory_item(state: InventoryState) -> InventoryItemSchema:
+    item = state.item
+    return InventoryItemSchema(
+        item_id=item.id,
+        canonical_name=item.canonical_name,
+        brand=item.brand,
+        package_type=item.package_type,
+        category=item.category,
+        unit=item.unit,
+        count_estimate=state.count_estimate,
+        confidence=state.confidence,
+        last_seen_at=state.last_seen_at or datetime.utcnow(),
+        location=(state.location.name if state.location else None),
+        expires_at=state.expires_at,
+        opened_at=state.opened_at,
+        par_level=state.par_level,
+        is_manual=state.is_manual,
+        notes=state.notes,
+        rating=item.rating,
+        is_favorite=bool(item.is_favorite),
+        heb_product_name=item.heb_product_name,
+        heb_url=item.heb_url,
+        heb_price=item.heb_price,
+        heb_image_url=item.heb_image_url,
+        heb_status=item.heb_status or "pending",
+        image_url=f"/v1/inventory/{item.id}/image" if item.image_path else None,
+    )
+
+
 @router.get("/inventory", response_model=InventoryResponse)
 async def get_inventory(
     db: Session = Depends(get_db),
     page: int = Query(1, ge=1),
     page_size: int = Query(0, ge=0, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    location: Optional[str] = None,
+    category: Optional[str] = None,
+    favorite: Optional[bool] = None,
+    expiring_before: Optional[datetime] = None,
+    below_par: Optional[bool] = None,
 ):
-    """Get current inventory state."""
-    # Default (page_size=0) returns all items (backwards-compatible with the frontend).
-    states = db.query(InventoryState).all()
-    
-    items = [
-        InventoryItemSchema(
-            item_id=state.item.id,
-            canonical_name=state.item.canonical_name,
-            brand=state.item.brand,
-            package_type=state.item.package_type,
-            category=getattr(state.item, "category", None),
-            unit=getattr(state.item, "unit", None),
-            count_estimate=state.count_estimate,
-            confidence=state.confidence,
-            last_seen_at=state.last_seen_at or datetime.utcnow(),
-            location=(state.location.name if getattr(state, "location", None) else None),
-            expires_at=getattr(state, "expires_at", None),
-            opened_at=getattr(state, "opened_at", None),
-            par_level=getattr(state, "par_level", None),
-            is_manual=state.is_manual,
-            notes=state.notes,
-            rating=getattr(state.item, "rating", None),
-            is_favorite=bool(getattr(state.item, "is_favorite", False)),
-            heb_product_name=getattr(state.item, "heb_product_name", None),
-            heb_url=getattr(state.item, "heb_url", None),
-            heb_price=getattr(state.item, "heb_price", None),
-            heb_image_url=getattr(state.item, "heb_image_url", None),
-            heb_status=getattr(state.item, "heb_status", "pending"),
-            image_url=f"/v1/inventory/{state.item.id}/image" if state.item.image_path else None,
+    """Get current inventory state, ordered by item name.
+
+    Default (page_size=0) returns all items (backwards-compatible with the frontend).
+    With page_size, follow next_cursor for constant-cost paging; `page` still
+    works but costs an OFFSET scan and a COUNT.
+    """
+    query = (
+        db.query(InventoryState)
+        .join(InventoryState.item)
+        .options(contains_eager(InventoryState.item), joinedload(InventoryState.location))
+        .filter(InventoryState.confidence > 0)  # Filter out stale items
+    )
+    if location:
+        query = query.join(InventoryState.location).filter(Location.name == location)
+    if category:
+        query = query.filter(InventoryItem.category == category)
+    if favorite is not None:
+        query = query.filter(InventoryItem.is_favorite == favorite)
+    if expiring_before is not None:
+        query = query.filter(InventoryState.expires_at.isnot(None), InventoryState.expires_at < expiring_before)
+    if below_par is not None:
+        short = and_(InventoryState.par_level.isnot(None), InventoryState.count_estimate < InventoryState.par_level)
+        query = query.filter(short if below_par else not_(short))
+
+    query = query.order_by(InventoryItem.canonical_name, InventoryState.id)
+
+    if page_size == 0 and cursor is None:
+        items = [_inventory_item(state) for state in query.all()]
+        return InventoryResponse(
+            items=items,
+            updated_at=datetime.utcnow(),
+            total=len(items),
+            page=1,
+            page_size=len(items),
+            has_more=False,
         )
-        for state in states
-        if state.confidence > 0  # Filter out stale items
-    ]
 
-    total = len(items)
-    if page_size > 0:
-        start = (page - 1) * page_size
-        items = items[start:start + page_size]
+    page_size = page_size or 100
+    total = None
+    if cursor is not None:
+        name, state_id = decode_cursor(cursor, 2)
+        query = query.filter(or_(
+            InventoryItem.canonical_name > name,
+            and_(InventoryItem.canonical_name == name, InventoryState.id > state_id),
+        ))
+    else:
+        total = query.count()
+        query = query.offset((page - 1) * page_size)
+
+    states = query.limit(page_size + 1).all()
+    has_more = len(states) > page_size
+    states = states[:page_size]
 
     return InventoryResponse(
-        items=items,
+        items=[_inventory_item(state) for state in states],
         updated_at=datetime.utcnow(),
         total=total,
-        page=page if page_size > 0 else 1,
-        page_size=page_size if page_size > 0 else total,
-        has_more=page_size > 0 and (page * page_size) < total,
+        page=page if cursor is None else None,
+        page_size=page_size,
+        has_more=has_more,
+        next_cursor=(
+            encode_cursor(states[-1].item.canonical_name, states[-1].id) if has_more else None
+        ),
     )
 
 @router.post("/inventory/override")
@@ -126,12 +184,14 @@ async def override_inventory(
         if override.is_favorite is not None:
             item.is_favorite = override.is_favorite
 
+        if override.par_level is not None:
+            sync_shopping_items(db, [item.id])
         db.commit()
 
         # Event-driven shopping-list notification (par-level check → Discord)
         try:
-            from app.workers.notify import notify_shopping_list
-            notify_shopping_list.delay()
+            from app.workers.notify import request_shopping_list_notify
+            request_shopping_list_notify()
         except Exception:
             pass  # queue hiccup should not fail the API call
 
@@ -145,101 +205,166 @@ async def override_inventory(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/inventory/{item_id}/image")
-async def get_inventory_item_image(item_id: str, db: Session = Depends(get_db)):
+async def get_inventory_item_image(
+    item_id: str,
+    request: Request,
+    size: str = Query("full", pattern="^(thumb|medium|full)$"),
+    db: Session = Depends(get_db),
+):
     """Serve the image for an inventory item."""
-    item = db.query(InventoryItem).filter(InventoryItem.id == item_id).first()
-    if not item or not item.image_path:
-        raise HTTPException(status_code=404, detail="Image not found")
-    
-    image_path = item.image_path
-    if not os.path.isabs(image_path):
-        storage_mgr = get_storage_manager()
-        image_path = str(storage_mgr.storage_path / image_path)
-    
-    if not os.path.exists(image_path):
-        raise HTTPException(status_code=404, detail="Image file missing")
-    
-    return FileResponse(image_path, media_type="image/jpeg")
+    def resolve() -> str:
+        item = db.query(InventoryItem).filter(InventoryItem.id == item_id).first()
+        if not item or not item.image_path:
+            raise HTTPException(status_code=404, detail="Image not found")
 
+        image_path = item.image_path
+        if not os.path.isabs(image_path):
+            storage_mgr = get_storage_manager()
+            image_path = str(storage_mgr.storage_path / image_path)
 
-@router.get("/inventory/export/csv")
-async def export_inventory_csv(db: Session = Depends(get_db)):
-    """Export inventory as CSV file download."""
-    states = db.query(InventoryState).all()
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    # Header row
-    writer.writerow([
-        "Item ID", "Name", "Brand", "Package Type", "Category", "Unit",
-        "Count", "Confidence", "Last Seen", "Location", "Expires At",
-        "Opened At", "Par Level", "Manual Entry", "Notes",
-    ])
-
-    for state in states:
-        if state.confidence <= 0:
-            continue
-
-        loc_name = ""
-        if hasattr(state, "location") and state.location:
-            loc_name = state.location.name
-
-        writer.writerow([
-            state.item.id,
-            state.item.canonical_name,
-            state.item.brand or "",
-            state.item.package_type or "",
-            getattr(state.item, "category", "") or "",
-            getattr(state.item, "unit", "") or "",
-            state.count_estimate,
-            state.confidence,
-            state.last_seen_at.isoformat() if state.last_seen_at else "",
-            loc_name,
-            state.expires_at.isoformat() if hasattr(state, "expires_at") and state.expires_at else "",
-            state.opened_at.isoformat() if hasattr(state, "opened_at") and state.opened_at else "",
-            getattr(state, "par_level", "") or "",
-            "Yes" if state.is_manual else "No",
-            state.notes or "",
-        ])
-
-    csv_content = output.getvalue()
-    output.close()
+        if not os.path.exists(image_path):
+            raise HTTPException(status_code=404, detail="Image file missing")
+        return image_path
 
-    filename = f"pantry-inventory-{datetime.utcnow().strftime('%Y%m%d')}.csv"
+    image_path = resolve_image_path("inventory", item_id, resolve)
+
+    def serve():
+        path = image_path if size == "full" else get_derivative_cache().get(image_path, size)
+        # The item's image moves to newer captures, so clients revalidate
+        return image_response(path, request.headers)
+
+    return await run_in_threadpool(serve)
+
+
+_CSV_HEADER = [
+    "Item ID", "Name", "Brand", "Package Type", "Category", "Unit",
+    "Count", "Confidence", "Last Seen", "Location", "Expires At",
+    "Opened At", "Par Level", "Manual Entry", "Notes",
+]
 
-    return StreamingResponse(
-        iter([csv_content]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename={filename}"},
+
+def _csv_row(state: InventoryState) -> list:
+    item = state.item
+    return [
+        item.id,
+        item.canonical_name,
+        item.brand or "",
+        item.package_type or "",
+        item.category or "",
+        item.unit or "",
+        state.count_estimate,
+        state.confidence,
+        state.last_seen_at.isoformat() if state.last_seen_at else "",
+        state.location.name if state.location else "",
+        state.expires_at.isoformat() if state.expires_at else "",
+        state.opened_at.isoformat() if state.opened_at else "",
+        state.par_level or "",
+        "Yes" if state.is_manual else "No",
+        state.notes or "",
+    ]
+
+
+@router.get("/inventory/export/csv")
+async def export_inventory_csv(
+    compress: bool = Query(False, description="gzip the download"),
+    db: Session = Depends(get_db),
+):
+    """Export inventory as CSV file download, streamed row by row."""
+    states = (
+        db.query(InventoryState)
+        .join(InventoryState.item)
+        .outerjoin(InventoryState.location)
+        .options(contains_eager(InventoryState.item), contains_eager(InventoryState.location))
+        .filter(InventoryState.confidence > 0)
+        .order_by(InventoryItem.canonical_name, InventoryState.id)
     )
+    rows = (_csv_row(state) for state in iter_query(states))
+
+    filename = f"pantry-inventory-{datetime.utcnow().strftime('%Y%m%d')}.csv"
+    return export_response(csv_lines(_CSV_HEADER, rows), "csv", filename, compress)
 
 
 @router.get("/inventory/history")
 async def get_inventory_history(
     days: int = 7,
+    format: str = Query("json", pattern="^(json|ndjson|csv)$"),
+    compress: bool = Query(False, description="gzip the response body"),
+    item_id: Optional[str] = None,
+    event_type: Optional[str] = None,
+    capture_id: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="page size; enables cursor paging"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous (older) page"),
+    since: Optional[str] = Query(None, description="return events newer than this cursor, oldest first"),
     db: Session = Depends(get_db),
 ):
-    """Get inventory change history"""
-    
-    from app.db.models import InventoryEvent
+    """Get inventory change history.
+
+    Without limit/cursor/since the whole `days` window is streamed newest
+    first (json, ndjson or csv). With any of them a JSON page is returned:
+    follow next_cursor via ?cursor= to go back in time. To receive only new
+    events, start polling ?since= with the first page's tail_cursor, then with
+    the next_cursor of each since= response (a newest-first page's next_cursor
+    points backwards and would re-deliver it). Tails lag by
+    EVENT_TAIL_GRACE_SECONDS so events that commit late are not skipped.
+    """
     from datetime import timedelta
     
     cutoff = datetime.utcnow() - timedelta(days=days)
-    events = db.query(InventoryEvent).filter(
-        InventoryEvent.created_at >= cutoff
-    ).order_by(InventoryEvent.created_at.desc()).all()
-
-    return {
-        "events": [
-            {
-                "item_name": event.item.canonical_name,
-                "event_type": event.event_type,
-                "delta": event.delta,
-                "timestamp": event.created_at,
-                "details": event.details,
-            }
-            for event in events
-        ],
-        "total_events": len(events),
-    }
+    events = filtered_events(db, item_id=item_id, event_type=event_type, capture_id=capture_id)
+
+    if limit is not None or cursor is not None or since is not None:
+        if since is None:
+            events = events.filter(InventoryEvent.created_at >= cutoff)
+        page, next_cursor, has_more = page_events(events, limit or 100, cursor=cursor, since=since)
+        names = item_names(db, page)
+        return {
+            "events": [
+                {
+                    "id": event.id,
+                    "item_id": event.item_id,
+                    "item_name": names.get(event.item_id, "Unknown"),
+                    "event_type": event.event_type,
+                    "delta": event.delta,
+                    "capture_id": event.capture_id,
+                    "timestamp": event.created_at,
+                    "details": event.details,
+                }
+                for event in page
+            ],
+            "total_events": len(page),
+            "has_more": has_more,
+            "next_cursor": next_cursor,
+            # First page only: start tailing from here with ?since=
+            "tail_cursor": tail_cursor(page[0] if page else None) if cursor is None and since is None else None,
+        }
+
+    events = (
+        events
+        .join(InventoryEvent.item)
+        .options(contains_eager(InventoryEvent.item))
+        .filter(InventoryEvent.created_at >= cutoff)
+        .order_by(InventoryEvent.created_at.desc(), InventoryEvent.id.desc())
+    )
+    records = (
+        {
+            "item_name": event.item.canonical_name,
+            "event_type": event.event_type,
+            "delta": event.delta,
+            "timestamp": event.created_at,
+            "details": event.details,
+        }
+        for event in iter_query(events)
+    )
+
+    if format == "csv":
+        rows = (
+            [r["timestamp"].isoformat() if r["timestamp"] else "", r["item_name"], r["event_type"], r["delta"],
+             json.dumps(r["details"]) if r["details"] is not None else ""]
+            for r in records
+        )
+        pieces = csv_lines(["Timestamp", "Item", "Event Type", "Delta", "Details"], rows)
+    elif format == "ndjson":
+        pieces = ndjson_lines(records)
+    else:
+        pieces = json_document("events", records, trailer=lambda count: {"total_events": count})
+    return export_response(pieces, format, compress=compress)
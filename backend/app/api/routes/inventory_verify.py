@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 from app.db.database import get_db
 from app.db.models import InventoryItem, InventoryState
 from app.models.schemas import InventoryVerifyRequest, HebEnrichmentPayload
+from app.services.shopping import sync_shopping_items
 
 router = APIRouter()
 
@@ -69,6 +70,7 @@ async def verify_item_count(item_id: str, payload: InventoryVerifyRequest, db: S
     note = payload.notes or "USER VERIFIED"
     state.notes = (state.notes or "") + f" [{note} {datetime.utcnow().date().isoformat()}]"
 
+    sync_shopping_items(db, [item.id])
     db.commit()
     return {
         "success": True,
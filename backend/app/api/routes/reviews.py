@@ -72,9 +72,9 @@ async def resolve_review(review_id: str, action: str, db: Session = Depends(get_
         # If Celery/broker is down, we still mark approved.
         task_id = None
         try:
-            from app.workers.celery_app import process_image_capture
+            from app.workers.celery_app import enqueue_capture
 
-            task = process_image_capture.delay(review.capture_id)
+            task = enqueue_capture(review.capture_id, reprocess=True)
             task_id = getattr(task, "id", None)
         except Exception:
             task_id = None
@@ -47,8 +47,8 @@ async def recompute(db: Session = Depends(get_db)):
 
     # Fire the event-driven Discord notification (Celery task, no cron needed).
     try:
-        from app.workers.notify import notify_shopping_list
-        notify_shopping_list.delay()
+        from app.workers.notify import request_shopping_list_notify
+        request_shopping_list_notify()
     except Exception:
         pass  # queue hiccup should not fail the API call
 
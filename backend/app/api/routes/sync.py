@@ -0,0 +1,29 @@
+"""Delta sync for polling clients (web UI, Hermes agent).
+
+Instead of re-fetching /v1/inventory, /v1/shopping-list and /v1/inventory/flags
+on every poll, a client keeps the cursor from its last response and asks only
+for what changed since.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.db.database import get_db
+from app.services.sync import changes_since
+
+router = APIRouter()
+
+
+@router.get("/sync")
+async def sync_changes(
+    since: Optional[str] = Query(None, description="cursor from the previous /v1/sync response"),
+    limit: Optional[int] = Query(None, ge=1, le=5000, description="max change-log entries to fold"),
+    db: Session = Depends(get_db),
+):
+    """Rows upserted/deleted since the cursor, grouped by table, plus the next cursor.
+
+    reset=true means the cursor is missing or too old: do one full fetch, then
+    poll with the returned cursor. has_more=true means call again right away.
+    """
+    return changes_since(db, since, limit)
@@ -71,6 +71,10 @@ class Settings(BaseSettings):
     )
     JOB_TIMEOUT: int = 300  # 5 minutes
     MAX_RETRIES: int = 3
+    # Capture claiming: a worker's lease on an analyzing capture (reclaimed once
+    # expired) and how long an enqueue blocks re-queueing the same capture.
+    CAPTURE_LEASE_SECONDS: int = int(os.getenv("CAPTURE_LEASE_SECONDS", "360"))
+    CAPTURE_ENQUEUE_DEDUP_SECONDS: int = int(os.getenv("CAPTURE_ENQUEUE_DEDUP_SECONDS", "600"))
 
     # Image Processing Configuration
     MAX_IMAGE_SIZE: int = 20 * 1024 * 1024  # 20 MB
@@ -81,6 +85,49 @@ class Settings(BaseSettings):
     IMAGE_RETENTION_DAYS: int = int(os.getenv("IMAGE_RETENTION_DAYS", "30"))
     MAX_STORAGE_MB: int = int(os.getenv("MAX_STORAGE_MB", "5000"))
 
+    # Dashboard image sizes (?size=thumb|medium|full), cached under storage/derivatives
+    IMAGE_THUMB_SIZE: int = int(os.getenv("IMAGE_THUMB_SIZE", "256"))
+    IMAGE_MEDIUM_SIZE: int = int(os.getenv("IMAGE_MEDIUM_SIZE", "960"))
+    IMAGE_DERIVATIVE_QUALITY: int = int(os.getenv("IMAGE_DERIVATIVE_QUALITY", "80"))
+    IMAGE_DERIVATIVE_BUDGET_MB: int = int(os.getenv("IMAGE_DERIVATIVE_BUDGET_MB", "500"))
+    IMAGE_PREGENERATE_THUMBS: bool = os.getenv("IMAGE_PREGENERATE_THUMBS", "true").lower() == "true"
+
+    # Image delivery: id -> path LRU, Cache-Control max-age for immutable capture
+    # originals (resized copies revalidate), and an optional nginx internal
+    # location for X-Accel-Redirect (e.g. "/_storage/", see web/pantry.conf).
+    # Empty serves bytes from Python.
+    IMAGE_PATH_CACHE_SIZE: int = int(os.getenv("IMAGE_PATH_CACHE_SIZE", "2048"))
+    IMAGE_PATH_CACHE_TTL_SECONDS: float = float(os.getenv("IMAGE_PATH_CACHE_TTL_SECONDS", "60"))
+    IMAGE_CACHE_MAX_AGE: int = int(os.getenv("IMAGE_CACHE_MAX_AGE", "31536000"))
+    IMAGE_ACCEL_REDIRECT_PREFIX: str = os.getenv("IMAGE_ACCEL_REDIRECT_PREFIX", "")
+
+    # Ingest admission control: backlog (broker queue / pending captures) over
+    # INGEST_MAX_BACKLOG is the load. Sheddable triggers are throttled per device
+    # above INGEST_THROTTLE_LOAD (429) and refused above INGEST_SHED_LOAD (503).
+    INGEST_ADMISSION_ENABLED: bool = os.getenv("INGEST_ADMISSION_ENABLED", "true").lower() == "true"
+    INGEST_MAX_BACKLOG: int = int(os.getenv("INGEST_MAX_BACKLOG", "200"))
+    INGEST_THROTTLE_LOAD: float = float(os.getenv("INGEST_THROTTLE_LOAD", "0.5"))
+    INGEST_SHED_LOAD: float = float(os.getenv("INGEST_SHED_LOAD", "0.9"))
+    INGEST_TIMER_RATE_LIMIT: int = int(os.getenv("INGEST_TIMER_RATE_LIMIT", "6"))  # per device per minute
+    INGEST_SHEDDABLE_TRIGGERS: list = [
+        t.strip() for t in os.getenv("INGEST_SHEDDABLE_TRIGGERS", "timer").split(",") if t.strip()
+    ]
+    INGEST_RETRY_AFTER_SECONDS: int = int(os.getenv("INGEST_RETRY_AFTER_SECONDS", "30"))
+    INGEST_LOAD_SAMPLE_SECONDS: float = float(os.getenv("INGEST_LOAD_SAMPLE_SECONDS", "2"))
+    INGEST_QUEUE_NAME: str = os.getenv("INGEST_QUEUE_NAME", "celery")
+
+    # Shopping-list notifications: triggers within NOTIFY_DEBOUNCE_SECONDS share one
+    # recompute; NOTIFY_LOCK_SECONDS bounds a run's single-flight lock.
+    NOTIFY_DEBOUNCE_SECONDS: float = float(os.getenv("NOTIFY_DEBOUNCE_SECONDS", "30"))
+    NOTIFY_LOCK_SECONDS: float = float(os.getenv("NOTIFY_LOCK_SECONDS", "120"))
+
+    # Streaming exports: rows fetched per round trip (server-side cursor on PostgreSQL)
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+    # Delta sync (/v1/sync): log entries returned per call, and how long they are kept
+    SYNC_MAX_CHANGES: int = int(os.getenv("SYNC_MAX_CHANGES", "1000"))
+    SYNC_LOG_RETENTION_HOURS: int = int(os.getenv("SYNC_LOG_RETENTION_HOURS", "72"))
+
     # Logging Configuration
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "WARNING")
     # Legacy .env compatibility (ignored but accepted)
@@ -89,6 +136,76 @@ class Settings(BaseSettings):
     PORT: Optional[str] = None
 
 
+    # Near-duplicate suppression: skip vision when a frame's dHash is within this
+    # Hamming distance (exclusive, out of 64 bits) of the device's last analyzed
+    # frame. Per-device override on Device.near_duplicate_threshold; 0 disables.
+    NEAR_DUPLICATE_THRESHOLD: int = int(os.getenv("NEAR_DUPLICATE_THRESHOLD", "5"))
+
+    # Keep-alive connections per worker process shared by all vision providers
+    VISION_HTTP_POOL_SIZE: int = int(os.getenv("VISION_HTTP_POOL_SIZE", "10"))
+
+    # Vision result cache: parsed outputs keyed by image digest, provider, model
+    # and prompt hash. In-process LRU in front of the vision_result_cache table.
+    VISION_CACHE_ENABLED: bool = os.getenv("VISION_CACHE_ENABLED", "true").lower() == "true"
+    VISION_CACHE_TTL_HOURS: int = int(os.getenv("VISION_CACHE_TTL_HOURS", "168"))
+    VISION_CACHE_MAX_ENTRIES: int = int(os.getenv("VISION_CACHE_MAX_ENTRIES", "10000"))
+    VISION_CACHE_LRU_SIZE: int = int(os.getenv("VISION_CACHE_LRU_SIZE", "256"))
+
+    # Batched vision: when at least VISION_BATCH_MIN_BACKLOG captures are waiting,
+    # workers send up to VISION_BATCH_SIZE images per provider request.
+    VISION_BATCH_SIZE: int = int(os.getenv("VISION_BATCH_SIZE", "4"))
+    VISION_BATCH_MIN_BACKLOG: int = int(os.getenv("VISION_BATCH_MIN_BACKLOG", "8"))
+
+    # Provider failover: comma-separated VISION_PROVIDER_CHAIN (e.g. "hermes,openai,ollama")
+    # with a per-provider circuit breaker and optional hedged requests.
+    VISION_PROVIDER_CHAIN: str = os.getenv("VISION_PROVIDER_CHAIN", "")
+    VISION_PROVIDER_TIMEOUT: float = float(os.getenv("VISION_PROVIDER_TIMEOUT", "60"))
+    VISION_BREAKER_FAILURES: int = int(os.getenv("VISION_BREAKER_FAILURES", "3"))
+    VISION_BREAKER_RESET_SECONDS: float = float(os.getenv("VISION_BREAKER_RESET_SECONDS", "60"))
+    VISION_HEDGE_ENABLED: bool = os.getenv("VISION_HEDGE_ENABLED", "false").lower() == "true"
+    VISION_HEDGE_PERCENTILE: float = float(os.getenv("VISION_HEDGE_PERCENTILE", "95"))
+
+    # Provider rate scheduling shared by all workers through Redis token buckets.
+    # 0 disables a bucket; VISION_TOKENS_PER_IMAGE is the up-front TPM estimate.
+    VISION_RPM_LIMIT: int = int(os.getenv("VISION_RPM_LIMIT", "0"))
+    VISION_TPM_LIMIT: int = int(os.getenv("VISION_TPM_LIMIT", "0"))
+    VISION_TOKENS_PER_IMAGE: int = int(os.getenv("VISION_TOKENS_PER_IMAGE", "1500"))
+    VISION_RATE_MAX_WAIT: float = float(os.getenv("VISION_RATE_MAX_WAIT", "120"))
+    VISION_RATE_DEFAULT_PAUSE: float = float(os.getenv("VISION_RATE_DEFAULT_PAUSE", "20"))
+
+    # Local-first cascade: the object detector + learned zone patterns resolve what
+    # they can; only unmatched regions are cropped and sent to the vision provider.
+    VISION_CASCADE_ENABLED: bool = os.getenv("VISION_CASCADE_ENABLED", "false").lower() == "true"
+    VISION_CASCADE_DETECTION_CONFIDENCE: float = float(os.getenv("VISION_CASCADE_DETECTION_CONFIDENCE", "0.5"))
+    VISION_CASCADE_CROP_PADDING: float = float(os.getenv("VISION_CASCADE_CROP_PADDING", "0.1"))
+
+    # Zone crops: devices with zones send one crop per changed zone instead of the
+    # full frame, up to VISION_ZONE_CONCURRENCY requests at a time.
+    VISION_ZONE_CROPS_ENABLED: bool = os.getenv("VISION_ZONE_CROPS_ENABLED", "false").lower() == "true"
+    VISION_ZONE_CONCURRENCY: int = int(os.getenv("VISION_ZONE_CONCURRENCY", "4"))
+
+    # Per-capture concurrency: barcode detection + lookups run alongside vision,
+    # with up to BARCODE_LOOKUP_CONCURRENCY product lookups in flight.
+    CAPTURE_STAGE_WORKERS: int = int(os.getenv("CAPTURE_STAGE_WORKERS", "4"))
+    BARCODE_LOOKUP_CONCURRENCY: int = int(os.getenv("BARCODE_LOOKUP_CONCURRENCY", "4"))
+
+    # Vision preprocessing: downscale / re-encode / strip EXIF into a derivative
+    # cached next to the original. Detail level per trigger ("default" = fallback).
+    VISION_PREPROCESS_ENABLED: bool = os.getenv("VISION_PREPROCESS_ENABLED", "true").lower() == "true"
+    VISION_MAX_DIMENSION: int = int(os.getenv("VISION_MAX_DIMENSION", "1568"))
+    VISION_IMAGE_QUALITY: int = int(os.getenv("VISION_IMAGE_QUALITY", "85"))
+    VISION_IMAGE_FORMAT: str = os.getenv("VISION_IMAGE_FORMAT", "jpeg")  # jpeg | webp
+    VISION_DETAIL_BY_TRIGGER: str = os.getenv("VISION_DETAIL_BY_TRIGGER", "manual:high,door:high,light:high,timer:low")
+
+    # Inventory events: skip "seen" events whose count didn't change (counted in
+    # captures.suppressed_events) and coalesce their last_seen_at writes.
+    INVENTORY_SUPPRESS_UNCHANGED_EVENTS: bool = os.getenv("INVENTORY_SUPPRESS_UNCHANGED_EVENTS", "false").lower() == "true"
+    INVENTORY_LAST_SEEN_COALESCE_SECONDS: int = int(os.getenv("INVENTORY_LAST_SEEN_COALESCE_SECONDS", "300"))
+
+    # Event tailing (?since=): events younger than this are held back, so a
+    # transaction that commits a little after its events were stamped isn't skipped
+    EVENT_TAIL_GRACE_SECONDS: int = int(os.getenv("EVENT_TAIL_GRACE_SECONDS", "10"))
+
     # Vision Confidence Tuning
     VISION_MIN_CONFIDENCE: float = float(os.getenv("VISION_MIN_CONFIDENCE", "0.7"))
     VISION_MIN_SCENE_CONFIDENCE: float = float(os.getenv("VISION_MIN_SCENE_CONFIDENCE", "0.3"))
@@ -0,0 +1,112 @@
+"""Change stamping for delta sync.
+
+Any flush that inserts, updates or deletes a row of a SYNCED_TABLES table,
+and any bulk UPDATE/DELETE statement against one, appends
+(seq, entity, entity_id, op) to change_log in the same transaction. seq is an
+autoincrement key, so it only grows: GET /v1/sync returns the rows whose
+entries come after the client's last seq.
+
+seq is drawn when the entry is flushed, not when it commits, so two writers
+could commit their entries out of seq order and a client reading in between
+would move its cursor past the one still in flight. On PostgreSQL a
+transaction therefore takes an advisory lock (held until it ends) before its
+first entry, which makes stamping transactions commit in seq order. SQLite
+already allows only one writer at a time.
+
+Hooks are on the Session class, so every session (API, workers, tests) stamps.
+"""
+import logging
+
+from sqlalchemy import event, select, text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger("pantry-api.change_log")
+
+# pg_advisory_xact_lock key serializing change_log writers ("chglog")
+_STAMP_LOCK_KEY = 0x6368676C6F67
+_LOCKED_TXN = "change_log_locked_txn"
+
+SYNCED_TABLES = (
+    "inventory_items",
+    "inventory_state",
+    "shopping_list_items",
+    "inventory_flags",
+    "captures",
+)
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+
+def _table():
+    from app.db.models import ChangeLog
+    return ChangeLog.__table__
+
+
+def _synced_table(obj):
+    table = getattr(obj, "__table__", None)
+    return table.name if table is not None and table.name in SYNCED_TABLES else None
+
+
+def _append(session: Session, rows) -> None:
+    connection = session.connection()
+    if connection.dialect.name == "postgresql":
+        txn = session.get_transaction()
+        if session.info.get(_LOCKED_TXN) is not txn:
+            connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _STAMP_LOCK_KEY})
+            session.info[_LOCKED_TXN] = txn
+    connection.execute(_table().insert(), rows)
+
+
+def record_changes(session: Session, entity: str, ids, op: str = UPSERT) -> None:
+    """Stamp rows changed behind the ORM's back (raw SQL, other processes)."""
+    rows = [{"entity": entity, "entity_id": str(i), "op": op} for i in dict.fromkeys(ids) if i is not None]
+    if rows:
+        _append(session, rows)
+
+
+@event.listens_for(Session, "after_flush")
+def _stamp_flush(session, flush_context):
+    # new/dirty/deleted still describe what this flush wrote
+    changes = {}
+    for obj in session.new:
+        entity = _synced_table(obj)
+        if entity:
+            changes[(entity, obj.id)] = UPSERT
+    for obj in session.dirty:
+        entity = _synced_table(obj)
+        if entity and session.is_modified(obj, include_collections=False):
+            changes[(entity, obj.id)] = UPSERT
+    for obj in session.deleted:
+        entity = _synced_table(obj)
+        if entity:
+            changes[(entity, obj.id)] = DELETE
+    if changes:
+        _append(session, [
+            {"entity": entity, "entity_id": entity_id, "op": op}
+            for (entity, entity_id), op in changes.items()
+        ])
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _stamp_bulk(orm_execute_state):
+    """Stamp the rows a bulk UPDATE/DELETE is about to touch."""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    table = mapper.local_table if mapper is not None else None
+    if table is None or table.name not in SYNCED_TABLES:
+        return
+
+    op = DELETE if orm_execute_state.is_delete else UPSERT
+    params = orm_execute_state.parameters
+    if isinstance(params, list):
+        # Bulk UPDATE by primary key: session.execute(update(Model), [{"id": ...}, ...])
+        ids = [p.get("id") for p in params]
+    else:
+        where = orm_execute_state.statement.whereclause
+        query = select(table.c.id)
+        if where is not None:
+            query = query.where(where)
+        ids = orm_execute_state.session.connection().execute(query, params or {}).scalars().all()
+    record_changes(orm_execute_state.session, table.name, ids, op)
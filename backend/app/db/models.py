@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Date, Float, Integer, Boolean, Text, ForeignKey, JSON
+from sqlalchemy import Column, String, DateTime, Date, Float, Integer, Boolean, Text, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import uuid
@@ -14,6 +14,10 @@ class Device(Base):
     last_seen_at = Column(DateTime(timezone=True), nullable=True)
     last_battery_v = Column(Float, nullable=True)
     last_rssi = Column(Integer, nullable=True)
+    # Near-duplicate suppression (see app.services.near_duplicate)
+    last_frame_hash = Column(String(16), nullable=True)  # dHash of last analyzed frame
+    last_observation_id = Column(String, nullable=True)
+    near_duplicate_threshold = Column(Integer, nullable=True)  # None = settings default
 
     captures = relationship("Capture", back_populates="device")
     zones = relationship("Zone", back_populates="device")
@@ -26,14 +30,59 @@ class Capture(Base):
     trigger_type = Column(String, nullable=False)  # door, light, timer, manual
     captured_at = Column(DateTime(timezone=True), nullable=False)
     image_path = Column(String, nullable=False)
+    image_sha256 = Column(String(64), nullable=True, index=True)  # content digest; see ImageBlob
     battery_v = Column(Float, nullable=True)
     rssi = Column(Integer, nullable=True)
-    status = Column(String, nullable=False, default="stored", index=True)  # stored, analyzing, complete, failed
+    status = Column(String, nullable=False, default="stored", index=True)  # stored, analyzing, complete, unchanged, failed
     error_message = Column(String, nullable=True)
+    # Set when status == "unchanged": the observation this frame duplicates
+    reference_observation_id = Column(String, ForeignKey("observations.id"), nullable=True)
+    # While status == "analyzing": the claiming worker's lease; expired leases are reclaimed
+    lease_until = Column(DateTime(timezone=True), nullable=True)
+    # Last completed pipeline stage and its intermediate results (see app.workers.capture)
+    pipeline_stage = Column(String, nullable=True)
+    pipeline_checkpoint = Column(JSON, nullable=True)
+    # Unchanged "seen" sightings not written as events (INVENTORY_SUPPRESS_UNCHANGED_EVENTS)
+    suppressed_events = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_captures_status_lease_until", "status", "lease_until"),
+    )
+
     device = relationship("Device", back_populates="captures")
-    observations = relationship("Observation", back_populates="capture")
+    observations = relationship("Observation", back_populates="capture", foreign_keys="Observation.capture_id")
+
+class ImageBlob(Base):
+    """Content-addressed image file shared by every capture with identical bytes.
+
+    ref_count tracks how many captures point at the file; StorageManager only
+    unlinks it when the count drops to zero.
+    """
+    __tablename__ = "image_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String, nullable=False, unique=True)
+    size_bytes = Column(Integer, nullable=False, default=0)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class VisionResultCache(Base):
+    """Parsed VisionOutput cached by (image digest, provider, model, prompt version).
+
+    cache_key is the SHA-256 of those four parts; see app.services.vision_cache.
+    """
+    __tablename__ = "vision_result_cache"
+
+    cache_key = Column(String(64), primary_key=True)
+    image_sha256 = Column(String(64), nullable=False, index=True)
+    provider = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    prompt_hash = Column(String(16), nullable=False)
+    output_json = Column(JSON, nullable=False)
+    hit_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    last_hit_at = Column(DateTime(timezone=True), nullable=True)
 
 class Observation(Base):
     __tablename__ = "observations"
@@ -44,7 +93,7 @@ class Observation(Base):
     scene_confidence = Column(Float, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    capture = relationship("Capture", back_populates="observations")
+    capture = relationship("Capture", back_populates="observations", foreign_keys=[capture_id])
     zone_detections = relationship("ZoneDetection", back_populates="observation")
 
 class Location(Base):
@@ -140,6 +189,11 @@ class InventoryEvent(Base):
 
     item = relationship("InventoryItem", back_populates="events")
 
+    __table_args__ = (
+        # Keyset order for history / recent-changes / since-tails
+        Index("ix_inventory_events_created_at_id", "created_at", "id"),
+    )
+
 
 class ShoppingListItem(Base):
     __tablename__ = "shopping_list_items"
@@ -156,6 +210,10 @@ class ShoppingListItem(Base):
     item = relationship("InventoryItem")
     location = relationship("Location")
 
+    __table_args__ = (
+        Index("ix_shopping_list_items_item_id_resolved_at", "item_id", "resolved_at"),
+    )
+
 
 class InventoryReview(Base):
     __tablename__ = "inventory_reviews"
@@ -182,6 +240,8 @@ class Zone(Base):
     expected_item_type = Column(String, nullable=True)
     notes = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
+    # dHash of this zone's crop when it was last analyzed (unchanged zones aren't resent)
+    last_frame_hash = Column(String(16), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     device = relationship("Device", back_populates="zones")
@@ -422,3 +482,21 @@ class MealPlanEntry(Base):
 
     meal_plan = relationship("MealPlan", back_populates="entries")
     recipe = relationship("Recipe")
+
+
+class ChangeLog(Base):
+    """Append-only feed of row changes behind GET /v1/sync (see app/db/change_log.py)."""
+
+    __tablename__ = "change_log"
+
+    seq = Column(Integer, primary_key=True, autoincrement=True)  # monotonic sync cursor
+    entity = Column(String, nullable=False)  # table name of the changed row
+    entity_id = Column(String, nullable=False)
+    op = Column(String, nullable=False)  # upsert | delete
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    __table_args__ = ({"sqlite_autoincrement": True},)
+
+
+# Registers the flush/bulk-statement hooks that write ChangeLog rows
+from app.db import change_log  # noqa: E402,F401
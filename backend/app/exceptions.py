@@ -52,3 +52,38 @@ class VisionAnalysisError(PantryException):
     """Vision API analysis error"""
     def __init__(self, message: str):
         super().__init__(f"Vision analysis failed: {message}", status_code=500)
+
+class VisionImageError(VisionAnalysisError):
+    """The input image itself is unusable (missing file): every provider would fail alike"""
+
+
+class VisionCapacityError(VisionAnalysisError):
+    """Our own rate budget for a provider wasn't available in time; the provider wasn't called"""
+
+
+class VisionRateLimitError(VisionAnalysisError):
+    """Provider rejected the call for rate limiting"""
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class VisionBatchMismatchError(VisionAnalysisError):
+    """Multi-image response could not be mapped back to its images"""
+
+class UploadTooLargeError(PantryException):
+    """Uploaded image exceeds MAX_IMAGE_SIZE"""
+    def __init__(self, max_bytes: int):
+        super().__init__(
+            f"Image exceeds maximum size of {max_bytes} bytes",
+            status_code=413,
+            details={"max_bytes": max_bytes}
+        )
+
+class UnsupportedImageTypeError(PantryException):
+    """Uploaded image content type is not in ALLOWED_IMAGE_TYPES"""
+    def __init__(self, content_type: str):
+        super().__init__(
+            f"Unsupported image type: {content_type}",
+            status_code=415,
+            details={"content_type": content_type}
+        )
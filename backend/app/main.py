@@ -11,13 +11,15 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from app.api.routes import ingest, inventory, admin, devices, advanced_inventory, agent
-from app.api.routes import shopping, reviews, captures, zones, household, barcode, detections, nutrition, recipes, meal_plans, inventory_verify, flags
+from app.api.routes import shopping, reviews, captures, zones, household, barcode, detections, nutrition, recipes, meal_plans, inventory_verify, flags, sync
 from app.config import settings
 from app.db.database import engine, Base
 from app.exceptions import PantryException
 from app.middleware.rate_limit import RateLimitMiddleware
 from app.middleware.request_log import RequestLogMiddleware
 from app.middleware.api_auth import APIAuthMiddleware
+from app.middleware.admission import IngestAdmissionMiddleware
+from app.middleware.upload_limit import UploadLimitMiddleware
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
@@ -53,6 +55,12 @@ app.add_middleware(APIAuthMiddleware)
 # Rate limiting middleware (must be added before CORS)
 app.add_middleware(RateLimitMiddleware)
 
+# Shed low-priority ingest under backlog from the headers, before the upload is read
+app.add_middleware(IngestAdmissionMiddleware)
+
+# Refuse oversized uploads on Content-Length, or mid-stream for chunked bodies
+app.add_middleware(UploadLimitMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -81,6 +89,7 @@ app.include_router(recipes.router, prefix="/v1", tags=["recipes"])
 app.include_router(meal_plans.router, prefix="/v1", tags=["meal_plans"])
 app.include_router(inventory_verify.router, prefix="/v1", tags=["inventory_verify"])
 app.include_router(flags.router, prefix="/v1", tags=["flags"])
+app.include_router(sync.router, prefix="/v1", tags=["sync"])
 
 @app.get("/health")
 async def health_check():
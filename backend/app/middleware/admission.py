@@ -0,0 +1,58 @@
+"""Ingest admission control, decided before the upload body is read.
+
+FastAPI parses the whole multipart form before a route (or any of its
+dependencies) runs, so a capture refused there has already been uploaded in
+full. This middleware decides from the headers alone instead: the trigger
+comes from X-Trigger-Type and the device from its Bearer token (keyed by the
+token's hash, the same value stored in devices.token_hash), while the backlog
+is sampled without touching the request at all. A shed capture costs the
+device one round trip and no upload.
+
+Requests without both headers (older firmware sending the token and trigger
+as form fields) are decided by the ingest route once the form is parsed, as
+are requests whose form trigger_type differs from the admitted header.
+"""
+import logging
+
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+
+from app.auth import TokenManager
+from app.services.admission import get_ingest_admission
+
+logger = logging.getLogger("pantry-api.admission")
+
+TRIGGER_HEADER = "X-Trigger-Type"
+
+
+def _extract_bearer(request) -> str:
+    auth = request.headers.get("Authorization", "")
+    if auth.lower().startswith("bearer "):
+        return auth[7:].strip()
+    return ""
+
+
+class IngestAdmissionMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        if request.method == "POST" and request.url.path == "/v1/ingest":
+            trigger_type = request.headers.get(TRIGGER_HEADER, "").strip()
+            token = _extract_bearer(request)
+            if trigger_type and token:
+                decision = await run_in_threadpool(
+                    get_ingest_admission().admit, TokenManager.hash_token(token), trigger_type
+                )
+                if not decision.admitted:
+                    logger.warning("Capture refused by admission control", extra={
+                        "trigger_type": trigger_type,
+                        "status_code": decision.status_code,
+                        "retry_after": decision.retry_after,
+                    })
+                    return JSONResponse(
+                        status_code=decision.status_code,
+                        content={"detail": decision.reason, "status_code": decision.status_code},
+                        headers={"Retry-After": str(decision.retry_after)},
+                    )
+                # Tell the route which trigger was admitted; it re-checks a different form value
+                request.state.admitted_trigger = trigger_type
+        return await call_next(request)
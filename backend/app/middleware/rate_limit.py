@@ -143,7 +143,11 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
 
 
 class AdaptiveRateLimit:
-    """Adaptive rate limiting based on system load (kept for compatibility)."""
+    """Limit that shrinks (by up to half) as load approaches 1.0.
+
+    Used by ingest admission control (app.services.admission) with the
+    analysis backlog as load.
+    """
 
     def __init__(self, base_limit: int = settings.RATE_LIMIT_REQUESTS):
         self.base_limit = base_limit
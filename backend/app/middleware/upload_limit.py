@@ -0,0 +1,81 @@
+"""Size cap on image uploads, enforced before the route runs.
+
+Starlette parses (and spools) the whole multipart body before the route
+handler is called, so the route itself can only check sizes after the fact.
+This middleware works at the ASGI level instead: a declared Content-Length
+over the limit is refused without reading the body at all, and bodies without
+one (chunked) are counted as they are received and cut off with a 413 as soon
+as they pass the limit, before the rest is read or spooled.
+
+The image's content type lives inside the multipart body, so the 415 check
+still happens in the route, once the form has been parsed.
+"""
+import logging
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+from app.config import settings
+
+logger = logging.getLogger("pantry-api.upload_limit")
+
+# Routes that accept an image upload
+_UPLOAD_PATHS = ("/v1/ingest", "/v1/captures/manual")
+
+# Allowance for multipart boundaries and the small form fields sent alongside the image
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def _too_large_detail() -> str:
+    return f"Image exceeds maximum size of {settings.MAX_IMAGE_SIZE} bytes"
+
+
+class UploadLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in _UPLOAD_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        limit = settings.MAX_IMAGE_SIZE + MULTIPART_OVERHEAD
+        declared = dict(scope["headers"]).get(b"content-length", b"").decode("latin-1")
+        if declared.isdigit() and int(declared) > limit:
+            logger.warning("Upload rejected: Content-Length too large", extra={
+                "path": scope["path"],
+                "content_length": int(declared),
+                "limit": limit,
+            })
+            response = JSONResponse(
+                status_code=413,
+                content={"detail": _too_large_detail(), "status_code": 413},
+            )
+            await response(scope, receive, send)
+            return
+
+        received = 0
+        refused = False
+
+        async def capped_receive():
+            nonlocal received, refused
+            message = await receive()
+            if refused:
+                # Only the response's disconnect listener reads on from here: drop the rest
+                while message["type"] == "http.request":
+                    message = await receive()
+                return message
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    refused = True
+                    logger.warning("Upload rejected: body too large", extra={
+                        "path": scope["path"],
+                        "received": received,
+                        "limit": limit,
+                    })
+                    # Raised inside form parsing; FastAPI passes HTTPException through as-is
+                    raise HTTPException(status_code=413, detail=_too_large_detail())
+            return message
+
+        await self.app(scope, capped_receive, send)
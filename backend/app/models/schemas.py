@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Dict, Optional, List
 from datetime import datetime, date
 
 class IngestRequest(BaseModel):
@@ -26,6 +26,7 @@ class CaptureDetail(BaseModel):
     status: str
     error_message: Optional[str] = None
     image_path: str
+    image_sha256: Optional[str] = None
 
     latest_observation: Optional[dict] = None
 
@@ -72,6 +73,7 @@ class InventoryResponse(BaseModel):
     page: Optional[int] = None
     page_size: Optional[int] = None
     has_more: Optional[bool] = None
+    next_cursor: Optional[str] = None  # pass back as ?cursor= for the next page
 
 class ObservationItem(BaseModel):
     """Parsed observation item from OpenAI Vision"""
@@ -81,6 +83,7 @@ class ObservationItem(BaseModel):
     quantity_estimate: Optional[int] = None
     confidence: float
     expiry_date: Optional[str] = None  # ISO date extracted from label
+    zone_id: Optional[str] = None  # set when the item came from a zone crop
 
 class VisionOutput(BaseModel):
     scene_type: Optional[str] = None
@@ -88,6 +91,7 @@ class VisionOutput(BaseModel):
     scene_confidence: float
     items: List[ObservationItem]
     notes: Optional[str] = None
+    zone_items: Optional[Dict[str, List[str]]] = None  # zone crops: item names seen per zone sent
 
 class InventoryOverride(BaseModel):
     """Manual inventory correction"""
@@ -320,6 +324,7 @@ class DeviceUpdate(BaseModel):
     """Request to update device settings"""
     name: Optional[str] = None
     enabled: Optional[bool] = None
+    near_duplicate_threshold: Optional[int] = Field(None, ge=0, le=64)
 
 
 class DeviceResponse(BaseModel):
@@ -334,6 +339,7 @@ class DeviceResponse(BaseModel):
     total_captures: int = 0
     failed_uploads: int = 0
     status: str  # active, idle, inactive, offline
+    near_duplicate_threshold: Optional[int] = None  # None = server default
     device_token: Optional[str] = None  # Only returned on creation
 
 
@@ -0,0 +1,156 @@
+"""Ingest admission control driven by analysis backlog.
+
+Backlog is the larger of the Celery broker queue length (Redis LLEN) and the
+number of captures still `stored`/`analyzing`, sampled at most every
+INGEST_LOAD_SAMPLE_SECONDS. It feeds the shared AdaptiveRateLimit, and
+low-priority triggers (INGEST_SHEDDABLE_TRIGGERS, `timer` by default) are
+admitted as follows:
+
+* below INGEST_THROTTLE_LOAD: admitted as usual
+* up to INGEST_SHED_LOAD: per-device limit that shrinks with load (429)
+* at or above INGEST_SHED_LOAD: shed outright (503)
+
+Door, manual and other event triggers are always admitted. Refusals carry
+Retry-After so devices back off instead of piling up a backlog.
+
+Decisions are made by IngestAdmissionMiddleware before the upload body is
+read; see app/middleware/admission.py.
+"""
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from app.config import settings
+from app.middleware.rate_limit import AdaptiveRateLimit, rate_limit_store
+
+logger = logging.getLogger("pantry-api.admission")
+
+_ADMISSION_PERIOD = 60  # seconds, window for the per-device throttle
+
+
+@dataclass
+class AdmissionDecision:
+    admitted: bool
+    status_code: int = 200
+    retry_after: int = 0
+    reason: str = ""
+
+
+class IngestAdmission:
+    """Samples analysis backlog and decides whether a capture is admitted."""
+
+    def __init__(self):
+        self.limiter = AdaptiveRateLimit(base_limit=settings.INGEST_TIMER_RATE_LIMIT)
+        self._redis = None
+        self._redis_attempted = False
+        self._sampled_at = 0.0
+        self._backlog = 0
+        self._lock = threading.Lock()
+        self.shed = 0
+        self.throttled = 0
+
+    def _get_redis(self):
+        if self._redis_attempted:
+            return self._redis
+        self._redis_attempted = True
+        try:
+            import redis
+            self._redis = redis.from_url(
+                settings.CELERY_BROKER_URL,
+                socket_connect_timeout=2,
+                socket_timeout=2,
+            )
+            self._redis.ping()
+        except Exception as e:
+            logger.warning("Broker queue depth unavailable, using DB backlog only", extra={"error": str(e)})
+            self._redis = None
+        return self._redis
+
+    def broker_depth(self) -> Optional[int]:
+        """Messages waiting in the Celery queue, or None when the broker can't be read."""
+        r = self._get_redis()
+        if r is None:
+            return None
+        try:
+            return int(r.llen(settings.INGEST_QUEUE_NAME))
+        except Exception as e:
+            logger.warning("Broker queue depth read failed", extra={"error": str(e)})
+            return None
+
+    @staticmethod
+    def pending_captures() -> int:
+        from app.db.database import SessionLocal
+        from app.db.models import Capture
+
+        db = SessionLocal()
+        try:
+            return db.query(Capture).filter(Capture.status.in_(("stored", "analyzing"))).count()
+        finally:
+            db.close()
+
+    def backlog(self) -> int:
+        """Current backlog, re-sampled at most every INGEST_LOAD_SAMPLE_SECONDS."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._sampled_at < settings.INGEST_LOAD_SAMPLE_SECONDS:
+                return self._backlog
+        depth = max(self.broker_depth() or 0, self.pending_captures())
+        with self._lock:
+            self._backlog = depth
+            self._sampled_at = now
+            self.limiter.update_load(depth, max_queue_size=settings.INGEST_MAX_BACKLOG)
+        return depth
+
+    def _retry_after(self) -> int:
+        # Scale the hint with load so devices spread out as the backlog grows
+        return max(1, math.ceil(settings.INGEST_RETRY_AFTER_SECONDS * (1 + self.limiter.current_load)))
+
+    def admit(self, device_key: str, trigger_type: str) -> AdmissionDecision:
+        """Decide on one capture; device_key is the device's token hash.
+
+        Blocking (may sample the backlog); call from a threadpool when serving requests.
+        """
+        if not settings.INGEST_ADMISSION_ENABLED:
+            return AdmissionDecision(True)
+        if trigger_type not in settings.INGEST_SHEDDABLE_TRIGGERS:
+            return AdmissionDecision(True)
+
+        self.backlog()
+        load = self.limiter.current_load
+        if load >= settings.INGEST_SHED_LOAD:
+            self.shed += 1
+            return AdmissionDecision(False, 503, self._retry_after(), "Analysis backlog full; low-priority capture shed")
+        if load < settings.INGEST_THROTTLE_LOAD:
+            return AdmissionDecision(True)
+
+        limit = self.limiter.get_adaptive_limit()
+        count, allowed = rate_limit_store.incr(f"ingest-admission|{device_key}", _ADMISSION_PERIOD, limit)
+        if not allowed:
+            self.throttled += 1
+            return AdmissionDecision(False, 429, self._retry_after(), "Analysis backlog high; capture rate reduced")
+        return AdmissionDecision(True)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.INGEST_ADMISSION_ENABLED,
+            "backlog": self._backlog,
+            "load": round(self.limiter.current_load, 3),
+            "adaptive_limit": self.limiter.get_adaptive_limit(),
+            "shed": self.shed,
+            "throttled": self.throttled,
+        }
+
+
+# Global instance
+_ingest_admission = None
+
+
+def get_ingest_admission() -> IngestAdmission:
+    """Get or create the per-process admission controller."""
+    global _ingest_admission
+    if _ingest_admission is None:
+        _ingest_admission = IngestAdmission()
+    return _ingest_admission
@@ -0,0 +1,173 @@
+"""Local-first detection cascade.
+
+The on-device detector (ObjectDetector) runs before the remote LLM. Each
+detection is matched to the device's zones. Where a zone has a learned
+pattern (ZoneService.infer_item_for_zone), the item is taken as-is. Only the
+remaining regions are cropped and sent to the vision provider. The LLM's
+answers for zoned crops feed back into ZonePattern, so a shelf needs fewer
+remote calls the longer it runs.
+
+Frames the detector can't reason about fall back to a full-frame analysis:
+no detector, no zones, or no detections.
+"""
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.config import settings
+from app.models.schemas import ObservationItem, VisionOutput
+
+logger = logging.getLogger("pantry-worker.cascade")
+
+
+@dataclass
+class LocalMatch:
+    """A detection resolved locally from a learned zone pattern."""
+    detection: object
+    zone_id: str
+    item: object  # InventoryItem
+    confidence: float
+
+
+@dataclass
+class PendingRegion:
+    """A detection the local pass could not resolve; sent to the LLM as a crop."""
+    detection: object
+    zone_id: Optional[str]
+    crop_path: Optional[str] = None
+
+
+@dataclass
+class CascadePlan:
+    matches: List[LocalMatch] = field(default_factory=list)
+    regions: List[PendingRegion] = field(default_factory=list)
+
+    def local_items(self) -> List[ObservationItem]:
+        """Locally resolved detections, one item per inventory item with a count."""
+        grouped: Dict[str, Tuple[object, int, float]] = {}
+        for match in self.matches:
+            item, count, conf = grouped.get(match.item.id, (match.item, 0, 0.0))
+            grouped[match.item.id] = (item, count + 1, max(conf, match.confidence))
+        return [
+            ObservationItem(
+                name=item.canonical_name,
+                brand=item.brand,
+                package_type=item.package_type,
+                quantity_estimate=count,
+                confidence=conf,
+            )
+            for item, count, conf in grouped.values()
+        ]
+
+
+def plan_cascade(db, device_id: str, image_path: str, detector=None) -> Optional[CascadePlan]:
+    """Split a frame's detections into locally resolved matches and regions for the LLM.
+
+    Returns None when the cascade has nothing to go on (full-frame analysis).
+    """
+    from app.services.zones import ZoneService
+
+    if detector is None:
+        from app.services.object_detection import get_detector
+        detector = get_detector()
+    if not detector.is_available():
+        return None
+
+    zone_service = ZoneService(db)
+    zones = zone_service.get_zones_for_device(device_id)
+    if not zones:
+        return None
+
+    pairs = detector.detect_zones_intersecting(
+        image_path, zones, conf_threshold=settings.VISION_CASCADE_DETECTION_CONFIDENCE,
+    )
+    if not pairs:
+        return None
+
+    plan = CascadePlan()
+    inferred: Dict[str, Optional[Tuple[object, float]]] = {}
+    for detection, zone in pairs:
+        if zone is None:
+            plan.regions.append(PendingRegion(detection=detection, zone_id=None))
+            continue
+        if zone.id not in inferred:
+            inferred[zone.id] = zone_service.infer_item_for_zone(zone.id, detection.class_name)
+        guess = inferred[zone.id]
+        if guess and guess[0] is not None:
+            plan.matches.append(LocalMatch(detection=detection, zone_id=zone.id, item=guess[0], confidence=guess[1]))
+        else:
+            plan.regions.append(PendingRegion(detection=detection, zone_id=zone.id))
+
+    logger.info("Cascade plan", extra={
+        "device_id": device_id,
+        "local_matches": len(plan.matches),
+        "llm_regions": len(plan.regions),
+    })
+    return plan
+
+
+def crop_regions(image_path: str, regions: List[PendingRegion], out_dir: str) -> None:
+    """Write a padded JPEG crop per region into out_dir (sets region.crop_path).
+
+    Detection x/y are box centres (YOLO xywh), normalized 0-1.
+    """
+    from PIL import Image
+
+    pad = settings.VISION_CASCADE_CROP_PADDING
+    with Image.open(image_path) as img:
+        img = img.convert("RGB")
+        img_w, img_h = img.size
+        for index, region in enumerate(regions):
+            det = region.detection
+            half_w = det.width * (1 + pad) / 2
+            half_h = det.height * (1 + pad) / 2
+            box = (
+                int(max(0.0, det.x - half_w) * img_w),
+                int(max(0.0, det.y - half_h) * img_h),
+                int(min(1.0, det.x + half_w) * img_w),
+                int(min(1.0, det.y + half_h) * img_h),
+            )
+            if box[2] <= box[0] or box[3] <= box[1]:
+                box = (0, 0, img_w, img_h)
+            region.crop_path = os.path.join(out_dir, f"region-{index}.jpg")
+            img.crop(box).save(region.crop_path, "JPEG", quality=90)
+
+
+def combine_items(items: Iterable[ObservationItem]) -> List[ObservationItem]:
+    """One item per product (canonical name + brand) across several crops.
+
+    Inventory takes one count per item from an observation, so the same
+    product seen in several crops must arrive as a single entry: quantities
+    are summed (a missing estimate counts as 1) and the highest confidence is
+    kept. zone_id survives only when every sighting came from the same zone.
+    """
+    combined: Dict[Tuple[str, str], ObservationItem] = {}
+    for item in items:
+        key = (item.name.lower().replace("  ", " ").strip(), (item.brand or "").strip().lower())
+        seen = combined.get(key)
+        if seen is None:
+            combined[key] = item
+            continue
+        combined[key] = seen.model_copy(update={
+            "quantity_estimate": (seen.quantity_estimate or 1) + (item.quantity_estimate or 1),
+            "confidence": max(seen.confidence, item.confidence),
+            "package_type": seen.package_type or item.package_type,
+            "expiry_date": seen.expiry_date or item.expiry_date,
+            "zone_id": seen.zone_id if seen.zone_id == item.zone_id else None,
+        })
+    return list(combined.values())
+
+
+def merge_outputs(plan: CascadePlan, region_outputs: List[VisionOutput]) -> VisionOutput:
+    """Combine local matches and per-crop LLM results into one observation."""
+    items = plan.local_items()
+    confidences = [m.confidence for m in plan.matches]
+    for region, output in zip(plan.regions, region_outputs):
+        items.extend(item.model_copy(update={"zone_id": region.zone_id}) for item in output.items)
+        confidences.append(output.scene_confidence)
+    return VisionOutput(
+        scene_confidence=round(sum(confidences) / len(confidences), 3) if confidences else 0.0,
+        items=combine_items(items),
+        notes=f"cascade: {len(plan.matches)} local, {len(region_outputs)} llm regions",
+    )
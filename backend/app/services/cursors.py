@@ -0,0 +1,39 @@
+"""Opaque keyset cursors for paginated listings.
+
+A cursor is the sort key of the last row a client received, as url-safe
+base64 JSON. Clients pass it back verbatim; the server turns it into a
+`WHERE (sort key) > (cursor)` filter, so each page costs the same no matter
+how deep into the listing it is.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List
+
+from fastapi import HTTPException
+
+
+def encode_cursor(*values: Any) -> str:
+    """Encode a row's sort key; datetimes become ISO strings."""
+    key = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(key, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, arity: int) -> List[Any]:
+    """Decode a cursor back into its sort key; a malformed cursor is a 400."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key = json.loads(raw)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(key, list) or len(key) != arity:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
+
+def parse_cursor_datetime(value: Any) -> datetime:
+    try:
+        return datetime.fromisoformat(value)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -0,0 +1,112 @@
+"""Keyset-paginated reads over inventory_events.
+
+Events are ordered by (created_at, id), matching ix_inventory_events_created_at_id.
+Paging backwards (newest first) uses `cursor`; tailing new events uses
+`since`, which returns events after the cursor oldest first so a client can
+poll with the next_cursor of its last `since` response.
+
+created_at is stamped by the app when the event is built, not when its
+transaction commits, so an event can become visible after a newer one. A tail
+therefore only hands out events older than EVENT_TAIL_GRACE_SECONDS and never
+moves its cursor past that horizon; an event whose transaction commits more
+than the grace period after it was stamped can still be missed.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db.models import InventoryEvent, InventoryItem
+from app.services.cursors import decode_cursor, encode_cursor, parse_cursor_datetime
+
+
+def event_cursor(event: InventoryEvent) -> str:
+    return encode_cursor(event.created_at, event.id)
+
+
+def _tail_horizon() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=settings.EVENT_TAIL_GRACE_SECONDS)
+
+
+def tail_cursor(newest: Optional[InventoryEvent]) -> str:
+    """Where to start tailing after reading the newest-first page headed by `newest`.
+
+    Capped at the grace horizon: events inside the grace period come back
+    again on the first `since` poll (clients dedupe by id) rather than risk
+    skipping one that commits late.
+    """
+    horizon = _tail_horizon()
+    if newest is not None and newest.created_at <= horizon:
+        return event_cursor(newest)
+    return encode_cursor(horizon, "")
+
+
+def _decode(cursor: str):
+    created_at, event_id = decode_cursor(cursor, 2)
+    return parse_cursor_datetime(created_at), event_id
+
+
+def filtered_events(
+    db: Session,
+    item_id: Optional[str] = None,
+    event_type: Optional[str] = None,
+    capture_id: Optional[str] = None,
+):
+    query = db.query(InventoryEvent)
+    if item_id:
+        query = query.filter(InventoryEvent.item_id == item_id)
+    if event_type:
+        query = query.filter(InventoryEvent.event_type == event_type)
+    if capture_id:
+        query = query.filter(InventoryEvent.capture_id == capture_id)
+    return query
+
+
+def page_events(
+    query,
+    limit: int,
+    cursor: Optional[str] = None,
+    since: Optional[str] = None,
+) -> Tuple[List[InventoryEvent], Optional[str], bool]:
+    """One page of events: (events, next_cursor, has_more).
+
+    With `since`, next_cursor is always set (the cursor passed in when nothing
+    new arrived) so tailing clients can keep polling with it, and only events
+    older than the grace horizon are returned.
+    """
+    if since is not None:
+        created_at, event_id = _decode(since)
+        query = query.filter(
+            or_(
+                InventoryEvent.created_at > created_at,
+                and_(InventoryEvent.created_at == created_at, InventoryEvent.id > event_id),
+            ),
+            InventoryEvent.created_at <= _tail_horizon(),
+        ).order_by(InventoryEvent.created_at.asc(), InventoryEvent.id.asc())
+    else:
+        if cursor is not None:
+            created_at, event_id = _decode(cursor)
+            query = query.filter(or_(
+                InventoryEvent.created_at < created_at,
+                and_(InventoryEvent.created_at == created_at, InventoryEvent.id < event_id),
+            ))
+        query = query.order_by(InventoryEvent.created_at.desc(), InventoryEvent.id.desc())
+
+    events = query.limit(limit + 1).all()
+    has_more = len(events) > limit
+    events = events[:limit]
+    if since is not None:
+        return events, (event_cursor(events[-1]) if events else since), has_more
+    return events, (event_cursor(events[-1]) if has_more else None), has_more
+
+
+def item_names(db: Session, events: Iterable[InventoryEvent]) -> Dict[str, str]:
+    """Canonical names for the events' items, in one IN query."""
+    ids = {event.item_id for event in events}
+    if not ids:
+        return {}
+    return dict(
+        db.query(InventoryItem.id, InventoryItem.canonical_name).filter(InventoryItem.id.in_(ids))
+    )
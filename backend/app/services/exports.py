@@ -0,0 +1,114 @@
+"""Streaming export helpers (CSV, NDJSON, JSON) with optional gzip.
+
+Rows come from a query iterated with yield_per, so the database hands them
+over in batches of EXPORT_BATCH_SIZE (a server-side cursor on PostgreSQL) and
+each row is encoded and sent as soon as it is read: memory stays flat and the
+first bytes go out before the query is exhausted.
+"""
+import csv
+import io
+import itertools
+import json
+import zlib
+from datetime import datetime
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+from fastapi.responses import StreamingResponse
+
+from app.config import settings
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+# Flush encoded output once it reaches this many bytes
+_CHUNK_BYTES = 64 * 1024
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def iter_query(query) -> Iterator:
+    """Iterate a query in batches rather than loading it with .all().
+
+    Lazy: the query only runs once the response starts pulling rows.
+    """
+    yield from query.yield_per(settings.EXPORT_BATCH_SIZE)
+
+
+def _buffered(pieces: Iterable[str]) -> Iterator[bytes]:
+    """Batch small pieces into ~64 KiB chunks; the first piece goes out at once."""
+    buf: List[str] = []
+    size = 0
+    first = True
+    for piece in pieces:
+        buf.append(piece)
+        size += len(piece)
+        if first or size >= _CHUNK_BYTES:
+            yield "".join(buf).encode("utf-8")
+            buf, size, first = [], 0, False
+    if buf:
+        yield "".join(buf).encode("utf-8")
+
+
+def csv_lines(header: List[str], rows: Iterable[List[Any]]) -> Iterator[str]:
+    """Encode the header, then one CSV line per row."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    for row in itertools.chain([header], rows):
+        writer.writerow(row)
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate(0)
+
+
+def ndjson_lines(records: Iterable[dict]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record, default=_json_default) + "\n"
+
+
+def json_document(key: str, records: Iterable[dict], trailer: Optional[Callable[[int], dict]] = None) -> Iterator[str]:
+    """Stream `{"<key>": [...], **trailer(count)}` one record at a time."""
+    yield "{" + json.dumps(key) + ":["
+    count = 0
+    for record in records:
+        yield ("," if count else "") + json.dumps(record, default=_json_default)
+        count += 1
+    yield "]"
+    for name, value in (trailer(count) if trailer else {}).items():
+        yield "," + json.dumps(name) + ":" + json.dumps(value, default=_json_default)
+    yield "}"
+
+
+def _gzipped(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    first = True
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if first:
+            # Don't let zlib sit on the header while the query warms up
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            first = False
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(
+    pieces: Iterable[str],
+    fmt: str,
+    filename: Optional[str] = None,
+    compress: bool = False,
+) -> StreamingResponse:
+    """Stream encoded text pieces, as a download when filename is given, gzipped on request."""
+    body = _buffered(pieces)
+    headers = {"Content-Disposition": f"attachment; filename={filename}"} if filename else {}
+    if compress:
+        body = _gzipped(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=MEDIA_TYPES[fmt], headers=headers)
@@ -0,0 +1,256 @@
+"""HTTP delivery of stored images: validators, conditional GET and byte ranges.
+
+Capture and inventory image routes resolve their file once and remember it in
+a small per-process LRU (so repeat hits skip the DB). Responses carry a strong
+ETag (SHA-256 of the bytes, memoized per path/mtime/size) and Last-Modified,
+answer If-None-Match / If-Modified-Since with 304, and honour single
+"bytes=" ranges with 206. Starlette's FileResponse does neither at the
+version we pin. When IMAGE_ACCEL_REDIRECT_PREFIX is set, the body is handed
+to nginx via X-Accel-Redirect so it is served with sendfile instead of Python.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Iterator, Mapping, Optional, Tuple
+
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+
+from app.config import settings
+from app.services.vision_cache import file_sha256
+
+logger = logging.getLogger("pantry-api.image_delivery")
+
+_CHUNK_SIZE = 64 * 1024
+
+
+class ImagePathCache:
+    """LRU of (kind, id) -> resolved absolute image path with a TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is None:
+                return None
+            stored_at, path = entry
+            if time.monotonic() - stored_at >= self.ttl_seconds:
+                del self._entries[(kind, key)]
+                return None
+            self._entries.move_to_end((kind, key))
+            return path
+
+    def put(self, kind: str, key: str, path: str) -> None:
+        with self._lock:
+            self._entries[(kind, key)] = (time.monotonic(), path)
+            self._entries.move_to_end((kind, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, kind: str, key: str) -> None:
+        with self._lock:
+            self._entries.pop((kind, key), None)
+
+
+class _DigestMemo:
+    """SHA-256 per (path, mtime_ns, size), so each file is hashed once."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def digest(self, path: str, stat: os.stat_result) -> str:
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value
+        value = file_sha256(path)
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+
+def resolve_image_path(kind: str, key: str, resolve: Callable[[], str]) -> str:
+    """Cached absolute path for an image; `resolve` runs (and may raise) on a miss.
+
+    A cached path whose file has since disappeared (retention, reprocessing)
+    is dropped and resolved again.
+    """
+    cache = get_image_path_cache()
+    path = cache.get(kind, key)
+    if path is not None and os.path.exists(path):
+        return path
+    path = resolve()
+    cache.put(kind, key, path)
+    return path
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def _not_modified(headers: Mapping[str, str], etag: str, mtime: float) -> bool:
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) for a single "bytes=" range.
+
+    Returns None when the header should be ignored (other units, several
+    ranges) and raises ValueError when the range is unsatisfiable.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first == "":
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                raise ValueError("empty suffix range")
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        raise ValueError(f"malformed range {header!r}")
+    if start >= size or end < start:
+        raise ValueError(f"unsatisfiable range {header!r}")
+    return start, min(end, size - 1)
+
+
+def _range_applies(headers: Mapping[str, str], etag: str, last_modified: str) -> bool:
+    if_range = headers.get("if-range")
+    return if_range is None or if_range.strip() in (etag, last_modified)
+
+
+def _iter_file(path: str, start: int, length: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _accel_location(path: str) -> Optional[str]:
+    prefix = settings.IMAGE_ACCEL_REDIRECT_PREFIX
+    if not prefix:
+        return None
+    from app.services.storage import get_storage_manager
+
+    root = os.path.realpath(get_storage_manager().storage_path)
+    real = os.path.realpath(path)
+    if os.path.commonpath([root, real]) != root:
+        return None
+    return prefix.rstrip("/") + "/" + os.path.relpath(real, root).replace(os.sep, "/")
+
+
+def image_response(
+    path: str,
+    request_headers: Mapping[str, str],
+    immutable: bool = False,
+    media_type: str = "image/jpeg",
+) -> Response:
+    """Response for an image file honouring conditional and range requests.
+
+    Blocking (stat + first-time hashing); call from a threadpool.
+    """
+    stat = os.stat(path)
+    etag = f'"{get_digest_memo().digest(path, stat)}"'
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": (
+            f"public, max-age={settings.IMAGE_CACHE_MAX_AGE}, immutable"
+            if immutable else "public, no-cache"
+        ),
+        "Accept-Ranges": "bytes",
+    }
+
+    if _not_modified(request_headers, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    accel = _accel_location(path)
+    if accel is not None:
+        # nginx serves the bytes (and any Range) from the internal location
+        headers["X-Accel-Redirect"] = accel
+        return Response(media_type=media_type, headers=headers)
+
+    byte_range = None
+    range_header = request_headers.get("range")
+    if range_header and _range_applies(request_headers, etag, last_modified):
+        try:
+            byte_range = parse_range(range_header, stat.st_size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{stat.st_size}"
+            return Response(status_code=416, headers=headers)
+
+    start, end = byte_range if byte_range else (0, stat.st_size - 1)
+    length = max(end - start + 1, 0)
+    headers["Content-Length"] = str(length)
+    status_code = 200
+    if byte_range:
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    return StreamingResponse(
+        _iter_file(path, start, length),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+# Global instances
+_image_path_cache = None
+_digest_memo = None
+
+
+def get_image_path_cache() -> ImagePathCache:
+    """Get or create the per-process image path cache."""
+    global _image_path_cache
+    if _image_path_cache is None:
+        _image_path_cache = ImagePathCache(
+            settings.IMAGE_PATH_CACHE_SIZE,
+            settings.IMAGE_PATH_CACHE_TTL_SECONDS,
+        )
+    return _image_path_cache
+
+
+def get_digest_memo() -> _DigestMemo:
+    global _digest_memo
+    if _digest_memo is None:
+        _digest_memo = _DigestMemo(settings.IMAGE_PATH_CACHE_SIZE)
+    return _digest_memo
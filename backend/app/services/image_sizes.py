@@ -0,0 +1,145 @@
+"""Resized image derivatives for the dashboard.
+
+The image routes take ?size=thumb|medium|full. Thumb and medium JPEGs are
+generated on first request, or by the worker after a capture is processed.
+They are cached under storage/derivatives/<size>/. The cache key is the
+source path, mtime and size, so a replaced file gets a fresh derivative.
+The cache is held to IMAGE_DERIVATIVE_BUDGET_MB by evicting the least
+recently served files.
+"""
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from app.config import settings
+
+logger = logging.getLogger("pantry-api.image_sizes")
+
+IMAGE_SIZES = ("thumb", "medium", "full")
+
+
+def max_dimension(size: str) -> Optional[int]:
+    if size == "thumb":
+        return settings.IMAGE_THUMB_SIZE
+    if size == "medium":
+        return settings.IMAGE_MEDIUM_SIZE
+    return None
+
+
+class DerivativeCache:
+    """On-disk LRU of resized JPEGs with a byte budget."""
+
+    def __init__(self, root: Path, budget_bytes: int):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self._used_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def get(self, source_path: str, size: str) -> str:
+        """Path of `source_path` at `size`, generating the derivative if needed.
+
+        "full" (or a failed resize) returns the source itself.
+        """
+        dimension = max_dimension(size)
+        if dimension is None:
+            return source_path
+
+        stat = os.stat(source_path)
+        key = hashlib.sha256(
+            f"{os.path.abspath(source_path)}:{stat.st_mtime_ns}:{stat.st_size}:{dimension}".encode("utf-8")
+        ).hexdigest()
+        target = self.root / size / key[:2] / f"{key}.jpg"
+
+        if target.exists():
+            try:
+                os.utime(target)  # mark as recently used for eviction
+            except OSError:
+                pass
+            return str(target)
+
+        try:
+            written = self._render(source_path, target, dimension)
+        except Exception as e:
+            logger.warning("Image resize failed, serving original", extra={
+                "path": source_path,
+                "size": size,
+                "error": str(e),
+            })
+            return source_path
+        self._account(written)
+        return str(target)
+
+    def _render(self, source_path: str, target: Path, dimension: int) -> int:
+        from PIL import Image, ImageOps
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f"{target.name}.{os.getpid()}-{threading.get_ident()}.part")
+        try:
+            with Image.open(source_path) as img:
+                img = ImageOps.exif_transpose(img).convert("RGB")
+                img.thumbnail((dimension, dimension), Image.LANCZOS)
+                img.save(tmp, "JPEG", quality=settings.IMAGE_DERIVATIVE_QUALITY, optimize=True)
+            os.replace(tmp, target)
+        finally:
+            tmp.unlink(missing_ok=True)
+        return target.stat().st_size
+
+    def _account(self, written: int) -> None:
+        with self._lock:
+            if self._used_bytes is None:
+                self._used_bytes = sum(f.stat().st_size for f in self._files())
+            else:
+                self._used_bytes += written
+            if self._used_bytes > self.budget_bytes:
+                self._evict()
+
+    def _files(self):
+        return (f for f in self.root.rglob("*.jpg") if f.is_file())
+
+    def _evict(self) -> None:
+        """Drop least recently used derivatives until 90% of the budget (lock held)."""
+        target = int(self.budget_bytes * 0.9)
+        entries = []
+        for f in self._files():
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, f))
+        entries.sort()
+        used = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, f in entries:
+            if used <= target:
+                break
+            f.unlink(missing_ok=True)
+            used -= size
+            evicted += 1
+        self._used_bytes = used
+        logger.info("Derivative cache evicted", extra={"evicted": evicted, "used_bytes": used})
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "used_bytes": self._used_bytes,
+                "budget_bytes": self.budget_bytes,
+            }
+
+
+# Global instance
+_derivative_cache = None
+
+
+def get_derivative_cache() -> DerivativeCache:
+    """Get or create the per-process derivative cache."""
+    global _derivative_cache
+    if _derivative_cache is None:
+        from app.services.storage import get_storage_manager
+        _derivative_cache = DerivativeCache(
+            get_storage_manager().storage_path / "derivatives",
+            settings.IMAGE_DERIVATIVE_BUDGET_MB * 1024 * 1024,
+        )
+    return _derivative_cache
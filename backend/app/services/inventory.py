@@ -7,6 +7,7 @@ from app.db.models import (
     Observation,
 )
 from app.models.schemas import VisionOutput
+from app.services.shopping import sync_shopping_items
 
 class InventoryManager:
     """Manages inventory state transitions and delta calculations"""
@@ -32,6 +33,7 @@ class InventoryManager:
             scene_confidence_override: Override scene confidence if needed
         """
         scene_conf = scene_confidence_override or vision_output.scene_confidence
+        touched = set()
 
         for item_data in vision_output.items:
             if item_data.confidence < self.CONFIDENCE_THRESHOLD:
@@ -84,7 +86,9 @@ class InventoryManager:
                 },
             )
             self.db.add(event)
+            touched.add(inv_item.id)
 
+        sync_shopping_items(self.db, touched)
         self.db.commit()
 
     def mark_stale(self) -> None:
@@ -139,6 +143,7 @@ class InventoryManager:
             details={"notes": notes},
         )
         self.db.add(event)
+        sync_shopping_items(self.db, [inv_item.id])
         self.db.commit()
 
         return inv_item
@@ -0,0 +1,66 @@
+"""Perceptual-hash near-duplicate detection for fixed shelf cameras.
+
+A fixed camera mostly re-photographs an unchanged shelf. Each device keeps the
+dHash of its last analyzed frame; a new frame within a small Hamming distance
+of it is treated as unchanged and skips the paid vision call.
+"""
+import logging
+from typing import Optional
+
+from app.config import settings
+
+logger = logging.getLogger("pantry-worker.near_duplicate")
+
+# 8x8 gradient grid -> 64-bit hash
+HASH_SIZE = 8
+
+
+def dhash(image_path: str, hash_size: int = HASH_SIZE) -> Optional[str]:
+    """Compute the difference hash of an image as a hex string.
+
+    Returns None if the image cannot be decoded (the caller then analyzes it
+    normally).
+    """
+    try:
+        from PIL import Image
+
+        with Image.open(image_path) as img:
+            return dhash_image(img, hash_size)
+    except Exception as e:
+        logger.warning("Perceptual hash failed", extra={"path": image_path, "error": str(e)})
+        return None
+
+
+def dhash_image(img, hash_size: int = HASH_SIZE) -> str:
+    """Difference hash of an already-open PIL image (or crop)."""
+    from PIL import Image
+
+    # One column wider than tall so each row yields hash_size comparisons
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{value:0{hash_size * hash_size // 4}x}"
+
+
+def hamming_distance(a: str, b: str) -> int:
+    """Number of differing bits between two hex hashes."""
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def threshold_for(device) -> int:
+    """Per-device distance threshold, falling back to NEAR_DUPLICATE_THRESHOLD (0 disables)."""
+    threshold = getattr(device, "near_duplicate_threshold", None)
+    return settings.NEAR_DUPLICATE_THRESHOLD if threshold is None else threshold
+
+
+def match_previous_frame(device, frame_hash: Optional[str]) -> Optional[int]:
+    """Return the distance to the device's last analyzed frame if it is a near-duplicate."""
+    if device is None or not frame_hash or not device.last_frame_hash or not device.last_observation_id:
+        return None
+    distance = hamming_distance(frame_hash, device.last_frame_hash)
+    return distance if distance < threshold_for(device) else None
@@ -0,0 +1,118 @@
+"""Vision preprocessing.
+
+Before an image goes to a provider it is downscaled to a maximum dimension,
+re-encoded as JPEG or WebP, and stripped of EXIF (orientation is applied
+first). The derivative is written next to the original as
+<stem>.vision-<max>q<quality>.<ext> and reused by later analyses.
+Originals are content-addressed and never modified, so a derivative cannot
+go stale. Changing the profile simply produces a new one.
+
+The OpenAI `detail` level is chosen per trigger type. Low-detail frames are
+also downscaled to the 512px the provider would use anyway.
+"""
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict
+
+from app.config import settings
+
+logger = logging.getLogger("pantry-worker.preprocess")
+
+DERIVATIVE_MARKER = ".vision-"
+LOW_DETAIL_MAX_DIMENSION = 512
+
+# format setting -> (PIL format, extension, mime type)
+_FORMATS = {
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+    "webp": ("WEBP", "webp", "image/webp"),
+}
+
+
+@dataclass
+class VisionImage:
+    """The file actually sent to the provider, with its mime type and detail level."""
+    path: str
+    mime_type: str
+    detail: str = "high"
+
+
+def mime_type_for(path: str) -> str:
+    suffix = Path(path).suffix.lower()
+    if suffix == ".webp":
+        return "image/webp"
+    if suffix == ".png":
+        return "image/png"
+    return "image/jpeg"
+
+
+def detail_for_trigger(trigger_type: str) -> str:
+    """Detail level for a capture trigger from VISION_DETAIL_BY_TRIGGER (e.g. "manual:high,timer:low")."""
+    mapping: Dict[str, str] = {}
+    for entry in settings.VISION_DETAIL_BY_TRIGGER.split(","):
+        trigger, _, detail = entry.partition(":")
+        if trigger.strip() and detail.strip():
+            mapping[trigger.strip().lower()] = detail.strip().lower()
+    return mapping.get((trigger_type or "").lower(), mapping.get("default", "high"))
+
+
+def profile_tag(detail: str = "high") -> str:
+    """Identifies the derivative settings (part of the vision cache key)."""
+    if not settings.VISION_PREPROCESS_ENABLED:
+        return f"original-{detail}"
+    max_dim = LOW_DETAIL_MAX_DIMENSION if detail == "low" else settings.VISION_MAX_DIMENSION
+    return f"{max_dim}q{settings.VISION_IMAGE_QUALITY}-{settings.VISION_IMAGE_FORMAT.lower()}-{detail}"
+
+
+def is_derivative(path: Path) -> bool:
+    return DERIVATIVE_MARKER in path.name
+
+
+def vision_derivative(image_path: str, detail: str = "high") -> VisionImage:
+    """Return the vision-optimized derivative of an image, creating it on first use.
+
+    Falls back to the original when preprocessing is disabled or the image
+    can't be decoded. Raises FileNotFoundError if the original is missing.
+    """
+    if not settings.VISION_PREPROCESS_ENABLED:
+        return VisionImage(image_path, mime_type_for(image_path), detail)
+
+    pil_format, ext, mime_type = _FORMATS.get(settings.VISION_IMAGE_FORMAT.lower(), _FORMATS["jpeg"])
+    max_dim = LOW_DETAIL_MAX_DIMENSION if detail == "low" else settings.VISION_MAX_DIMENSION
+    quality = settings.VISION_IMAGE_QUALITY
+    original = Path(image_path)
+    target = original.with_name(f"{original.stem}{DERIVATIVE_MARKER}{max_dim}q{quality}.{ext}")
+    if target.exists():
+        return VisionImage(str(target), mime_type, detail)
+
+    from PIL import Image, ImageOps
+
+    tmp = target.with_name(f"{target.name}.{os.getpid()}-{threading.get_ident()}.part")
+    try:
+        with Image.open(original) as img:
+            img = ImageOps.exif_transpose(img).convert("RGB")
+            img.thumbnail((max_dim, max_dim), Image.LANCZOS)
+            # No exif= argument: metadata is not carried into the derivative
+            img.save(tmp, pil_format, quality=quality)
+        os.replace(tmp, target)
+    except FileNotFoundError:
+        if not original.exists():
+            raise
+        logger.warning("Vision derivative write failed, sending original", extra={"path": image_path})
+        return VisionImage(image_path, mime_type_for(image_path), detail)
+    except Exception as e:
+        tmp.unlink(missing_ok=True)
+        logger.warning("Vision preprocessing failed, sending original", extra={
+            "path": image_path,
+            "error": str(e),
+        })
+        return VisionImage(image_path, mime_type_for(image_path), detail)
+
+    logger.info("Vision derivative created", extra={
+        "path": str(target),
+        "original_bytes": original.stat().st_size,
+        "derivative_bytes": target.stat().st_size,
+    })
+    return VisionImage(str(target), mime_type, detail)
@@ -1,46 +1,146 @@
-"""Shopping list service — shared recompute + query logic (DRY for route & worker)."""
+"""Shopping list service — shared recompute + query logic (DRY for route & worker).
+
+The list is kept current incrementally: whatever changes an item's count or
+par level calls sync_shopping_items() for just those items, in the same
+transaction. recompute_shopping_list() is the periodic consistency sweep.
+"""
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import and_, exists, or_, update
 from sqlalchemy.orm import Session
 
 from app.db.models import InventoryState, ShoppingListItem as ShoppingListItemModel
 
+# Rows this service owns; voice and meal-plan rows are left for the user to resolve
+_PAR_REASON = "below par"
+
+
+def _needed(par_level, count_estimate) -> int:
+    if par_level is None:
+        return 0
+    return max(0, int(par_level) - int(count_estimate or 0))
+
+
+def _apply(db: Session, wanted: dict, open_rows: dict) -> int:
+    """Reconcile unresolved rows with what par levels call for.
+
+    wanted maps (item_id, location_id) -> needed (0 = nothing needed);
+    open_rows maps the same key -> (row id, needed, reason). Returns rows written.
+    """
+    inserts, updates, resolve = [], [], []
+    for key, needed in wanted.items():
+        row = open_rows.get(key)
+        if needed > 0:
+            if row is None:
+                inserts.append(ShoppingListItemModel(
+                    item_id=key[0], location_id=key[1], needed=needed, reason=_PAR_REASON,
+                ))
+            elif row[1] != needed or not row[2]:
+                updates.append({"id": row[0], "needed": needed, "reason": row[2] or _PAR_REASON})
+        elif row is not None and row[2] == _PAR_REASON:
+            resolve.append(row[0])
+
+    if inserts:
+        db.add_all(inserts)
+    if updates:
+        db.execute(update(ShoppingListItemModel), updates)
+    if resolve:
+        db.query(ShoppingListItemModel).filter(ShoppingListItemModel.id.in_(resolve)).update(
+            {ShoppingListItemModel.resolved_at: datetime.utcnow()}, synchronize_session=False,
+        )
+    return len(inserts) + len(updates) + len(resolve)
+
+
+def sync_shopping_items(db: Session, item_ids: Iterable[str]) -> int:
+    """Upsert or resolve the shopping rows of just these items. Caller commits.
+
+    Returns the number of shopping rows written.
+    """
+    item_ids = {i for i in item_ids if i}
+    if not item_ids:
+        return 0
+    # Sessions don't autoflush: make the caller's pending count/par changes visible
+    db.flush()
+
+    wanted = {
+        (item_id, location_id): _needed(par_level, count)
+        for item_id, location_id, par_level, count in
+        db.query(
+            InventoryState.item_id, InventoryState.location_id,
+            InventoryState.par_level, InventoryState.count_estimate,
+        ).filter(InventoryState.item_id.in_(item_ids))
+    }
+    open_rows = {
+        (item_id, location_id): (row_id, needed, reason)
+        for row_id, item_id, location_id, needed, reason in
+        db.query(
+            ShoppingListItemModel.id, ShoppingListItemModel.item_id, ShoppingListItemModel.location_id,
+            ShoppingListItemModel.needed, ShoppingListItemModel.reason,
+        ).filter(
+            ShoppingListItemModel.item_id.in_(item_ids),
+            ShoppingListItemModel.resolved_at.is_(None),
+        )
+    }
+    # Open rows with no matching state (state deleted or moved) need nothing
+    for key in open_rows:
+        wanted.setdefault(key, 0)
+    return _apply(db, wanted, open_rows)
+
 
 def recompute_shopping_list(db: Session) -> int:
-    """Add/update shopping list entries for items below par. Returns count of created/updated."""
-    states = db.query(InventoryState).all()
-
-    created_or_updated = 0
-    for state in states:
-        if state.par_level is None:
-            continue
-        needed = max(0, int(state.par_level) - int(state.count_estimate or 0))
-        if needed <= 0:
-            continue
-
-        existing = (
-            db.query(ShoppingListItemModel)
-            .filter(
-                ShoppingListItemModel.item_id == state.item_id,
-                ShoppingListItemModel.location_id == state.location_id,
-                ShoppingListItemModel.resolved_at.is_(None),
-            )
-            .first()
+    """Full consistency sweep over every par-tracked item. Returns rows created/updated/resolved.
+
+    One outer-joined SELECT pairs each state with its unresolved row, a second
+    finds unresolved rows left without a state; the differences are then
+    written in bulk.
+    """
+    Row = ShoppingListItemModel
+    pairs = (
+        db.query(
+            InventoryState.item_id, InventoryState.location_id,
+            InventoryState.par_level, InventoryState.count_estimate,
+            Row.id, Row.needed, Row.reason,
         )
-        if existing:
-            existing.needed = needed
-            existing.reason = existing.reason or "below par"
-        else:
-            db.add(
-                ShoppingListItemModel(
-                    item_id=state.item_id,
-                    location_id=state.location_id,
-                    needed=needed,
-                    reason="below par",
-                )
-            )
-        created_or_updated += 1
+        .outerjoin(Row, and_(
+            Row.item_id == InventoryState.item_id,
+            or_(
+                Row.location_id == InventoryState.location_id,
+                and_(Row.location_id.is_(None), InventoryState.location_id.is_(None)),
+            ),
+            Row.resolved_at.is_(None),
+        ))
+        .filter(or_(InventoryState.par_level.isnot(None), Row.id.isnot(None)))
+        .all()
+    )
+
+    wanted, open_rows = {}, {}
+    for item_id, location_id, par_level, count, row_id, row_needed, reason in pairs:
+        key = (item_id, location_id)
+        wanted[key] = _needed(par_level, count)
+        if row_id is not None:
+            open_rows[key] = (row_id, row_needed, reason)
+
+    # Open rows whose state is gone (deleted or moved) never show up above: they need nothing
+    orphans = db.query(Row.id, Row.item_id, Row.location_id, Row.needed, Row.reason).filter(
+        Row.item_id.isnot(None),
+        Row.resolved_at.is_(None),
+        ~exists().where(
+            InventoryState.item_id == Row.item_id,
+            or_(
+                InventoryState.location_id == Row.location_id,
+                and_(InventoryState.location_id.is_(None), Row.location_id.is_(None)),
+            ),
+        ),
+    )
+    for row_id, item_id, location_id, row_needed, reason in orphans:
+        key = (item_id, location_id)
+        wanted[key] = 0
+        open_rows[key] = (row_id, row_needed, reason)
 
+    written = _apply(db, wanted, open_rows)
     db.commit()
-    return created_or_updated
+    return written
 
 
 def add_voice_item(db: Session, item_name: str, quantity: int = 1) -> dict:
@@ -1,15 +1,42 @@
 """Storage management and image retention policies."""
 
+import hashlib
+import io
 import logging
 import os
+import shutil
+import tempfile
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Optional
+from typing import BinaryIO, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
 
 from app.config import settings
+from app.exceptions import UnsupportedImageTypeError, UploadTooLargeError
 
 logger = logging.getLogger(__name__)
 
+# Chunk size used when hashing and copying uploads
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Session.info key holding blob digests to release once the session commits
+_PENDING_RELEASES = "storage_pending_blob_releases"
+
+
+@dataclass
+class StagedUpload:
+    """A hashed upload not yet committed to the store."""
+    # Temp copy in the staging area; None when the blob was already stored
+    path: Optional[Path]
+    size: int
+    sha256: str
+    # Where the bytes were hashed from (re-read if the stored copy vanished)
+    source: Optional[BinaryIO] = None
+
 
 class StorageManager:
     """Manages image storage and retention policies."""
@@ -23,16 +50,22 @@ class StorageManager:
         """Initialize storage manager."""
         self.storage_path = Path(settings.STORAGE_PATH or "./storage")
         self.images_path = self.storage_path / "images"
+        # Staging area for in-flight uploads; same filesystem so rename is atomic
+        self.tmp_path = self.storage_path / "tmp"
         
         # Ensure directories exist
         self.images_path.mkdir(parents=True, exist_ok=True)
+        self.tmp_path.mkdir(parents=True, exist_ok=True)
         
         logger.info(f"Storage manager initialized at {self.storage_path}")
     
     @staticmethod
     def get_image_filename(device_id: str, capture_id: str) -> str:
         """
-        Generate standardized image filename.
+        Generate legacy per-capture image filename.
+        
+        New uploads are content-addressed (see get_blob_relative_path); this
+        layout is only used to resolve images stored before that change.
         
         Args:
             device_id: Device identifier
@@ -45,7 +78,7 @@ class StorageManager:
     
     def get_image_path(self, device_id: str, capture_id: str) -> Path:
         """
-        Get full path to image file.
+        Get full path to a legacy per-capture image file.
         
         Args:
             device_id: Device identifier
@@ -57,19 +90,37 @@ class StorageManager:
         filename = self.get_image_filename(device_id, capture_id)
         return self.images_path / filename
     
+    @staticmethod
+    def get_blob_relative_path(digest: str) -> str:
+        """
+        Relative path of a content-addressed image blob.
+        
+        Blobs are fanned out by the first two hex digits of the SHA-256 to keep
+        directories small.
+        
+        Args:
+            digest: Hex SHA-256 of the image bytes
+            
+        Returns:
+            Relative path for storage in DB
+        """
+        return f"images/sha256/{digest[:2]}/{digest}.jpg"
+    
     def save_image(
         self,
         device_id: str,
         capture_id: str,
         image_data: bytes,
+        db: Session,
     ) -> str:
         """
-        Save image to storage.
+        Save image bytes to the content-addressed store.
         
         Args:
-            device_id: Device identifier
-            capture_id: Capture identifier
+            device_id: Device identifier (for logging)
+            capture_id: Capture identifier (for logging)
             image_data: Image bytes (JPEG)
+            db: Session the blob reference is recorded in (caller commits)
             
         Returns:
             Relative path to image
@@ -77,35 +128,201 @@ class StorageManager:
         Raises:
             IOError: If save fails
         """
-        try:
-            image_path = self.get_image_path(device_id, capture_id)
+        staged = self.stage_upload(io.BytesIO(image_data), max_bytes=max(len(image_data), 1))
+        relative_path = self.commit_staged(staged, db)
+        logger.info(f"Saved image for {device_id}/{capture_id}: {relative_path} ({staged.size} bytes)")
+        return relative_path
+    
+    @staticmethod
+    def validate_content_type(content_type: Optional[str]) -> None:
+        """
+        Reject uploads whose content type is not in ALLOWED_IMAGE_TYPES.
+        
+        Args:
+            content_type: MIME type reported by the client
             
-            # Write image
-            with open(image_path, "wb") as f:
-                f.write(image_data)
+        Raises:
+            UnsupportedImageTypeError: If the type is not allowed
+        """
+        mime = (content_type or "").split(";")[0].strip().lower()
+        if mime not in settings.ALLOWED_IMAGE_TYPES:
+            raise UnsupportedImageTypeError(content_type or "unknown")
+    
+    def stage_upload(
+        self,
+        source: BinaryIO,
+        max_bytes: Optional[int] = None,
+    ) -> StagedUpload:
+        """
+        Hash an upload where it already is, writing it to staging only if new.
+        
+        The source (normally the spooled file Starlette parsed the form into)
+        is read once to hash and size-check it in place. If that blob is
+        already stored nothing is written; otherwise it is written once to a
+        temp file that commit_staged() renames into the store.
+        
+        Blocking; call from a threadpool when serving requests. The caller
+        must hand the result to commit_staged() or discard_staged().
+        
+        Args:
+            source: Seekable file-like object positioned at the start of the upload
+            max_bytes: Size limit (defaults to MAX_IMAGE_SIZE)
             
-            # Return relative path for storage in DB
-            relative_path = f"images/{self.get_image_filename(device_id, capture_id)}"
-            logger.info(f"Saved image: {relative_path} ({len(image_data)} bytes)")
+        Returns:
+            StagedUpload with size, SHA-256 and temp path (None if deduplicated)
             
-            return relative_path
+        Raises:
+            UploadTooLargeError: If the stream exceeds max_bytes
+            IOError: If the write fails
+        """
+        limit = max_bytes or settings.MAX_IMAGE_SIZE
+        digest = hashlib.sha256()
+        size = 0
+        while True:
+            chunk = source.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > limit:
+                raise UploadTooLargeError(limit)
+            digest.update(chunk)
+        staged = StagedUpload(path=None, size=size, sha256=digest.hexdigest(), source=source)
+        if not (self.storage_path / self.get_blob_relative_path(staged.sha256)).exists():
+            staged.path = self._write_staging(source)
+        return staged
+    
+    def _write_staging(self, source: BinaryIO) -> Path:
+        """Copy a hashed upload to a temp file in the staging area."""
+        source.seek(0)
+        fd, tmp_name = tempfile.mkstemp(dir=self.tmp_path, suffix=".part")
+        tmp_path = Path(tmp_name)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(source, out, UPLOAD_CHUNK_SIZE)
+            return tmp_path
+        except Exception as e:
+            self.discard_staged(tmp_path)
+            logger.error(f"Failed to stage upload: {str(e)}")
+            raise IOError(f"Failed to stage upload: {str(e)}")
+    
+    def commit_staged(self, staged: StagedUpload, db: Session) -> str:
+        """
+        Move a staged upload into the content-addressed store.
+        
+        Adds a reference to the blob first, then places the file only if no
+        identical blob is already on disk (the duplicate is discarded). The
+        reference is flushed in the caller's transaction.
+        
+        Args:
+            staged: Result of stage_upload()
+            db: Session the blob reference is recorded in (caller commits)
             
+        Returns:
+            Relative path to image
+        """
+        relative_path = self.get_blob_relative_path(staged.sha256)
+        try:
+            self._add_blob_reference(db, staged.sha256, relative_path, staged.size)
+            full_path = self.storage_path / relative_path
+            if full_path.exists():
+                self.discard_staged(staged.path)
+                logger.info(f"Deduplicated image: {relative_path}")
+            else:
+                if staged.path is None:
+                    # The stored copy was deleted after staging checked for it
+                    staged.path = self._write_staging(staged.source)
+                full_path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(staged.path, full_path)
+                logger.info(f"Stored image: {relative_path} ({staged.size} bytes)")
+            return relative_path
         except Exception as e:
-            logger.error(f"Failed to save image {device_id}/{capture_id}: {str(e)}")
+            self.discard_staged(staged.path)
+            logger.error(f"Failed to commit image {staged.sha256}: {str(e)}")
             raise IOError(f"Failed to save image: {str(e)}")
     
-    def delete_image(self, image_path: str) -> bool:
+    def discard_staged(self, staged_path: Optional[Path]) -> None:
+        """Remove a staged upload that will not be committed."""
+        if staged_path is None:
+            return
+        try:
+            Path(staged_path).unlink(missing_ok=True)
+        except Exception as e:
+            logger.warning(f"Failed to remove staged upload {staged_path}: {str(e)}")
+    
+    @staticmethod
+    def _add_blob_reference(db: Session, digest: str, relative_path: str, size: int) -> None:
+        """
+        Atomically increment a blob's ref count, creating the row on first use.
+        
+        The UPDATE (or INSERT) holds the row lock until the caller commits, so
+        the file check that follows cannot interleave with a release of the
+        same blob.
         """
-        Delete image file.
+        from app.db.models import ImageBlob
+        
+        def _increment() -> int:
+            return db.query(ImageBlob).filter(ImageBlob.sha256 == digest).update(
+                {ImageBlob.ref_count: ImageBlob.ref_count + 1},
+                synchronize_session=False,
+            )
+        
+        if _increment():
+            return
+        try:
+            with db.begin_nested():
+                db.add(ImageBlob(sha256=digest, path=relative_path, size_bytes=size, ref_count=1))
+        except IntegrityError:
+            # Another request inserted the same blob concurrently
+            _increment()
+    
+    def delete_image(self, image_path: str, db: Optional[Session] = None) -> bool:
+        """
+        Drop one reference to an image and delete the file once unused.
+        
+        Content-addressed blobs are ref-counted: the row is locked while the
+        count drops, and a blob left at zero is released only after the
+        caller commits (see _release_unused_blobs), so a concurrent ingest
+        can never add a reference to a file that is already gone. Images an
+        inventory item still shows are kept. Legacy per-capture files (no
+        blob row) are deleted directly.
         
         Args:
             image_path: Relative path to image
+            db: Session used to update the blob ref count (caller commits)
             
         Returns:
-            True if deleted, False if not found
+            True if the file was deleted (or will be, once db commits),
+            False if still referenced or not found
         """
         try:
+            if db is not None:
+                from app.db.models import ImageBlob
+                
+                blob = (
+                    db.query(ImageBlob)
+                    .filter(ImageBlob.path == image_path)
+                    .with_for_update()
+                    .populate_existing()
+                    .first()
+                )
+                if blob is not None:
+                    blob.ref_count = max(blob.ref_count - 1, 0)
+                    db.flush()
+                    if blob.ref_count > 0:
+                        logger.info(f"Image still referenced ({blob.ref_count}): {image_path}")
+                        return False
+                    if self._shown_by_item(db, image_path):
+                        logger.info(f"Image still shown by an inventory item: {image_path}")
+                        return False
+                    # The row stays at zero until commit; the file goes after that
+                    self._release_after_commit(db, blob.sha256)
+                    return True
+                if self._shown_by_item(db, image_path):
+                    logger.info(f"Image still shown by an inventory item: {image_path}")
+                    return False
+            
             full_path = self.storage_path / image_path
+            self.delete_derivatives(full_path)
             
             if full_path.exists():
                 full_path.unlink()
@@ -119,6 +336,78 @@ class StorageManager:
             logger.error(f"Failed to delete image {image_path}: {str(e)}")
             return False
     
+    @staticmethod
+    def _shown_by_item(db: Session, image_path: str) -> bool:
+        """Whether an inventory item still points at this image."""
+        from app.db.models import InventoryItem
+        
+        return db.query(InventoryItem.id).filter(InventoryItem.image_path == image_path).first() is not None
+    
+    def _release_after_commit(self, db: Session, digest: str) -> None:
+        """Queue a zero-ref blob for release once db's transaction commits."""
+        if _PENDING_RELEASES not in db.info:
+            bind = db.get_bind()
+            
+            @event.listens_for(db, "after_commit")
+            def _released(session):
+                self._release_unused_blobs(bind, session.info.pop(_PENDING_RELEASES, set()))
+                session.info[_PENDING_RELEASES] = set()
+            
+            @event.listens_for(db, "after_rollback")
+            def _dropped(session):
+                # The decrements were rolled back with the transaction
+                session.info[_PENDING_RELEASES] = set()
+            
+            db.info[_PENDING_RELEASES] = set()
+        db.info[_PENDING_RELEASES].add(digest)
+    
+    def _release_unused_blobs(self, bind, digests) -> None:
+        """
+        Delete blobs that are still unused now that their release committed.
+        
+        Each row is re-read under a row lock: an ingest that re-referenced
+        the blob in the meantime (count above zero) or an item now showing it
+        keeps the file. The unlink happens while the lock is held, so an
+        ingest waiting on the row sees either the file or no row at all (and
+        then writes the file again).
+        """
+        from app.db.models import ImageBlob
+        
+        for digest in digests:
+            session = Session(bind=bind)
+            try:
+                blob = (
+                    session.query(ImageBlob)
+                    .filter(ImageBlob.sha256 == digest)
+                    .with_for_update()
+                    .first()
+                )
+                if blob is None or blob.ref_count > 0 or self._shown_by_item(session, blob.path):
+                    session.rollback()
+                    continue
+                full_path = self.storage_path / blob.path
+                self.delete_derivatives(full_path)
+                full_path.unlink(missing_ok=True)
+                session.delete(blob)
+                session.commit()
+                logger.info(f"Deleted image: {blob.path}")
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Failed to release blob {digest}: {str(e)}")
+            finally:
+                session.close()
+    
+    @staticmethod
+    def delete_derivatives(full_path: Path) -> int:
+        """Remove the vision derivatives cached next to an original."""
+        from app.services.preprocess import DERIVATIVE_MARKER
+
+        removed = 0
+        for derivative in full_path.parent.glob(f"{full_path.stem}{DERIVATIVE_MARKER}*"):
+            derivative.unlink(missing_ok=True)
+            removed += 1
+        return removed
+    
     def get_image_size(self, image_path: str) -> int:
         """
         Get image file size in bytes.
@@ -145,21 +434,38 @@ class StorageManager:
         """
         Get storage statistics.
         
+        Originals and the vision derivatives cached next to them are counted
+        separately, so file_count is the number of stored images.
+        
         Returns:
-            Dictionary with total_size, file_count, oldest_file, newest_file
+            Dictionary with total_size, file_count, oldest_file, newest_file,
+            derivative_size_mb, derivative_count
         """
+        from app.services.preprocess import is_derivative
+        
         try:
             total_size = 0
             file_count = 0
+            derivative_size = 0
+            derivative_count = 0
             oldest_time = None
             newest_time = None
             
-            for image_file in self.images_path.glob("*.jpg"):
+            for image_file in self.images_path.rglob("*"):
                 try:
-                    file_size = image_file.stat().st_size
-                    file_mtime = datetime.fromtimestamp(image_file.stat().st_mtime)
+                    if not image_file.is_file():
+                        continue
+                    file_stat = image_file.stat()
+                    
+                    if is_derivative(image_file):
+                        derivative_size += file_stat.st_size
+                        derivative_count += 1
+                        continue
+                    if image_file.suffix != ".jpg":
+                        continue
                     
-                    total_size += file_size
+                    file_mtime = datetime.fromtimestamp(file_stat.st_mtime)
+                    total_size += file_stat.st_size
                     file_count += 1
                     
                     if oldest_time is None or file_mtime < oldest_time:
@@ -176,6 +482,8 @@ class StorageManager:
                 "file_count": file_count,
                 "oldest_file": oldest_time.isoformat() if oldest_time else None,
                 "newest_file": newest_time.isoformat() if newest_time else None,
+                "derivative_size_mb": derivative_size / (1024 * 1024),
+                "derivative_count": derivative_count,
             }
             
         except Exception as e:
@@ -185,6 +493,8 @@ class StorageManager:
                 "file_count": 0,
                 "oldest_file": None,
                 "newest_file": None,
+                "derivative_size_mb": 0,
+                "derivative_count": 0,
             }
     
     def cleanup_orphaned_images(self) -> int:
@@ -199,32 +509,42 @@ class StorageManager:
             Number of orphaned images deleted
         """
         # Import here to avoid circular dependency
-        from sqlalchemy.orm import Session
         from app.db.database import SessionLocal
-        from app.db.models import Capture
+        from app.db.models import Capture, ImageBlob, InventoryItem
+        from app.services.preprocess import is_derivative
         
         deleted_count = 0
         
         try:
             db = SessionLocal()
             
-            # Get all image files
-            image_files = list(self.images_path.glob("*.jpg"))
+            # A blob may be shared by several captures/items; any reference keeps it
+            referenced = {
+                path for (path,) in db.query(Capture.image_path).distinct() if path
+            }
+            referenced.update(
+                path for (path,) in db.query(InventoryItem.image_path).distinct() if path
+            )
+            
+            # Get all image files (legacy flat files and content-addressed blobs)
+            image_files = list(self.images_path.rglob("*.jpg"))
             logger.info(f"Scanning {len(image_files)} image files for orphans...")
             
             for image_file in image_files:
-                filename = image_file.name
+                relative_path = image_file.relative_to(self.storage_path).as_posix()
                 
-                # Check if this image exists in DB
-                capture = db.query(Capture).filter(
-                    Capture.image_path.like(f"%{filename}")
-                ).first()
+                if is_derivative(image_file):
+                    continue  # removed together with their original
                 
-                if not capture:
-                    logger.warning(f"Orphaned image found: {filename}")
-                    self.delete_image(f"images/{filename}")
-                    deleted_count += 1
+                if relative_path not in referenced:
+                    logger.warning(f"Orphaned image found: {relative_path}")
+                    db.query(ImageBlob).filter(ImageBlob.path == relative_path).delete(
+                        synchronize_session=False
+                    )
+                    if self.delete_image(relative_path):
+                        deleted_count += 1
             
+            db.commit()
             logger.info(f"Cleanup complete: {deleted_count} orphaned images deleted")
             
         except Exception as e:
@@ -0,0 +1,121 @@
+"""Delta sync: the rows that changed since a client's cursor.
+
+Reads change_log (see app/db/change_log.py) after the cursor's seq, folds it
+to the latest op per row, and loads the surviving rows with one IN query per
+table. A client starts with no cursor (gets a fresh cursor and reset=true,
+meaning "do one full fetch"), then polls with the cursor it was last given.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db.change_log import DELETE, SYNCED_TABLES
+from app.db.models import (
+    Capture,
+    ChangeLog,
+    InventoryFlag,
+    InventoryItem,
+    InventoryState,
+    ShoppingListItem,
+)
+from app.services.cursors import decode_cursor, encode_cursor
+
+_MODELS = {
+    "inventory_items": InventoryItem,
+    "inventory_state": InventoryState,
+    "shopping_list_items": ShoppingListItem,
+    "inventory_flags": InventoryFlag,
+    "captures": Capture,
+}
+
+# Worker-internal or bulky columns clients never render
+_EXCLUDED = {
+    "captures": {"pipeline_checkpoint", "lease_until"},
+}
+
+
+def _row(table: str, obj) -> dict:
+    skip = _EXCLUDED.get(table, ())
+    return {c.name: getattr(obj, c.key) for c in obj.__table__.columns if c.name not in skip}
+
+
+def _decode_seq(cursor: str) -> int:
+    (seq,) = decode_cursor(cursor, 1)
+    if not isinstance(seq, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return seq
+
+
+def changes_since(db: Session, since: Optional[str], limit: Optional[int] = None) -> dict:
+    limit = limit or settings.SYNC_MAX_CHANGES
+    first_seq, last_seq = db.query(func.min(ChangeLog.seq), func.max(ChangeLog.seq)).one()
+    last_seq = last_seq or 0
+
+    if since is None:
+        return {"cursor": encode_cursor(last_seq), "reset": True, "has_more": False, "changes": {}}
+    seq = _decode_seq(since)
+    # Entries the client hasn't seen were pruned (or the cursor is from another database)
+    if seq > last_seq or (first_seq is not None and seq < first_seq - 1):
+        return {"cursor": encode_cursor(last_seq), "reset": True, "has_more": False, "changes": {}}
+
+    entries = (
+        db.query(ChangeLog.seq, ChangeLog.entity, ChangeLog.entity_id, ChangeLog.op)
+        .filter(ChangeLog.seq > seq)
+        .order_by(ChangeLog.seq)
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest = {}
+    for _, entity, entity_id, op in entries:
+        if entity in SYNCED_TABLES:
+            latest[(entity, entity_id)] = op
+
+    upserts, deletes = defaultdict(list), defaultdict(list)
+    for (entity, entity_id), op in latest.items():
+        (deletes if op == DELETE else upserts)[entity].append(entity_id)
+
+    changes = {}
+    for table in SYNCED_TABLES:
+        model = _MODELS[table]
+        rows = []
+        ids = upserts.get(table, [])
+        if ids:
+            rows = db.query(model).filter(model.id.in_(ids)).all()
+        found = {row.id for row in rows}
+        # Stamped as changed but gone by now: deleted since
+        gone = deletes.get(table, []) + [i for i in ids if i not in found]
+        if rows or gone:
+            changes[table] = {"upserted": [_row(table, row) for row in rows], "deleted": gone}
+
+    return {
+        "cursor": encode_cursor(entries[-1][0] if entries else seq),
+        "reset": False,
+        "has_more": has_more,
+        "changes": changes,
+    }
+
+
+def prune_change_log(db: Session) -> int:
+    """Drop entries older than SYNC_LOG_RETENTION_HOURS, always keeping the newest.
+
+    Clients whose cursor falls before the oldest kept entry are told to reset.
+    """
+    newest = db.query(func.max(ChangeLog.seq)).scalar()
+    if newest is None:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(hours=settings.SYNC_LOG_RETENTION_HOURS)
+    deleted = (
+        db.query(ChangeLog)
+        .filter(ChangeLog.created_at < cutoff, ChangeLog.seq < newest)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
@@ -1,24 +1,81 @@
 """Multi-provider vision analysis with structured logging."""
 import base64
+import hashlib
 import json
 import logging
 import os
-import urllib.error
-import urllib.request
-from typing import Optional
+import threading
+from typing import List, Optional
+from app.config import settings
 from app.models.schemas import VisionOutput
-from app.exceptions import VisionAnalysisError
+from app.exceptions import VisionAnalysisError, VisionBatchMismatchError, VisionImageError, VisionRateLimitError
+from app.services.vision_cache import file_sha256, get_vision_cache, make_cache_key, prompt_hash
+from app.services.vision_failover import pause_attempt_clock, start_attempt_clock
+from app.services.vision_rate import get_rate_scheduler, retry_after_seconds
+from app.services.preprocess import VisionImage, mime_type_for, profile_tag, vision_derivative
 
 logger = logging.getLogger("pantry-worker.vision")
 
+# Environment read by VisionAnalyzer; a change to any of these rebuilds the analyzer
+_CONFIG_ENV_VARS = (
+    "VISION_PROVIDER", "VISION_PROVIDER_CHAIN",
+    "HERMES_VISION_URL", "HERMES_API_KEY", "HERMES_MODEL",
+    "OPENAI_API_KEY", "OPENAI_MODEL",
+    "NVIDIA_NIM_API_KEY", "NVIDIA_MODEL",
+    "OLLAMA_HOST", "OLLAMA_MODEL",
+    "OPENCLAW_VISION_URL", "OPENCLAW_VISION_MODEL",
+    "OPENCLAW_GATEWAY_TOKEN", "OPENCLAW_GATEWAY_TOKEN_FILE",
+)
+
+# Per-process connection pools shared by every analyzer, so tasks reuse
+# keep-alive connections instead of paying a TCP/TLS handshake per capture.
+_httpx_client = None
+_requests_session = None
+_pool_lock = threading.Lock()
+
+
+def _shared_httpx_client():
+    """httpx client (OpenAI-compatible providers) with a bounded keep-alive pool."""
+    global _httpx_client
+    with _pool_lock:
+        if _httpx_client is None:
+            import httpx
+            _httpx_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=settings.VISION_HTTP_POOL_SIZE,
+                    max_keepalive_connections=settings.VISION_HTTP_POOL_SIZE,
+                ),
+            )
+        return _httpx_client
+
+
+def _shared_requests_session():
+    """requests session (Ollama / OpenClaw) with a bounded keep-alive pool."""
+    global _requests_session
+    with _pool_lock:
+        if _requests_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            _requests_session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=settings.VISION_HTTP_POOL_SIZE,
+                pool_maxsize=settings.VISION_HTTP_POOL_SIZE,
+            )
+            _requests_session.mount("http://", adapter)
+            _requests_session.mount("https://", adapter)
+        return _requests_session
+
 
 class VisionAnalyzer:
     """Multi-provider vision API handler for pantry image analysis."""
 
-    def __init__(self, api_key: str = None, provider: str = None):
+    def __init__(self, api_key: str = None, provider: str = None, request_timeout: Optional[float] = None):
         self.provider = provider or os.getenv("VISION_PROVIDER", "openai").lower()
         self.api_key = api_key or self._get_api_key()
         self.max_retries = 3
+        # Upper bound on one HTTP request (set by the failover chain); None keeps client defaults
+        self.request_timeout = request_timeout
+        self._usage = threading.local()
 
         logger.info("Initializing vision analyzer", extra={"provider": self.provider})
 
@@ -38,6 +95,16 @@ class VisionAnalyzer:
         else:
             raise ValueError(f"Unsupported vision provider: {self.provider}")
 
+    def _http_timeout(self, default: float) -> float:
+        return min(default, self.request_timeout) if self.request_timeout else default
+
+    def _openai_options(self) -> dict:
+        """Shared pool, plus a capped timeout and no SDK retries when a failover chain bounds each attempt."""
+        options = {"http_client": _shared_httpx_client()}
+        if self.request_timeout:
+            options.update(timeout=self.request_timeout, max_retries=0)
+        return options
+
     def _get_api_key(self) -> str:
         if self.provider in ("hermes", "hermes-gateway"):
             key = os.getenv("HERMES_API_KEY") or os.getenv("OPENAI_API_KEY")
@@ -77,7 +144,7 @@ class VisionAnalyzer:
         try:
             from openai import OpenAI
             base_url = os.getenv("HERMES_VISION_URL") or None
-            self.client = OpenAI(api_key=self.api_key, base_url=base_url) if base_url else OpenAI(api_key=self.api_key)
+            self.client = OpenAI(api_key=self.api_key, base_url=base_url, **self._openai_options())
             self.model = os.getenv("HERMES_MODEL", "gpt-4-vision-preview")
             logger.info("Hermes vision provider initialized", extra={"model": self.model, "base_url": base_url or "openai"})
         except ImportError:
@@ -89,6 +156,7 @@ class VisionAnalyzer:
             "http://172.16.1.1:18790/analyze",
         )
         self.model = os.getenv("OPENCLAW_VISION_MODEL", "openai/gpt-5.4-mini")
+        self.http = _shared_requests_session()
         logger.info("OpenClaw vision provider initialized", extra={
             "model": self.model,
             "vision_url": self.vision_url,
@@ -97,7 +165,7 @@ class VisionAnalyzer:
     def _init_openai(self):
         try:
             from openai import OpenAI
-            self.client = OpenAI(api_key=self.api_key)
+            self.client = OpenAI(api_key=self.api_key, **self._openai_options())
             self.model = os.getenv("OPENAI_MODEL", "gpt-5")
             logger.info("OpenAI client initialized", extra={"model": self.model})
         except ImportError:
@@ -109,6 +177,7 @@ class VisionAnalyzer:
             self.client = OpenAI(
                 api_key=os.getenv("NVIDIA_NIM_API_KEY"),
                 base_url="https://integrate.api.nvidia.com/v1",
+                **self._openai_options(),
             )
             self.model = os.getenv("NVIDIA_MODEL", "moonshotai/kimi-k2.5")
             logger.info("NVIDIA NIM client initialized", extra={"model": self.model})
@@ -120,20 +189,199 @@ class VisionAnalyzer:
         self.model = "mock"
         logger.info("Mock vision provider initialized (no-op)")
 
-    def analyze_image(self, image_path: str) -> VisionOutput:
+    # Providers that accept several images in one OpenAI-compatible chat request
+    BATCH_PROVIDERS = ("hermes", "hermes-gateway", "openai", "nvidia")
+
+    @property
+    def supports_batch(self) -> bool:
+        return self.provider in self.BATCH_PROVIDERS
+
+    def analyze_image(
+        self,
+        image_path: str,
+        image_sha256: Optional[str] = None,
+        use_cache: bool = True,
+        detail: str = "high",
+    ) -> VisionOutput:
+        """Analyze an image, serving repeat requests from the vision result cache.
+
+        Args:
+            image_path: Absolute path to the image
+            image_sha256: Content digest if already known (Capture.image_sha256)
+            use_cache: False forces a fresh provider call (the result is still cached)
+            detail: Provider detail level (see preprocess.detail_for_trigger)
+        """
+        slot = self._cache_slot(image_path, image_sha256, detail)
+        if use_cache:
+            cached = self._cache_get(slot)
+            if cached is not None:
+                return cached
+
+        result = self._analyze(self._prepare_image(image_path, detail))
+        self._cache_put(slot, result)
+        return result
+
+    def analyze_images(
+        self,
+        image_paths: List[str],
+        image_sha256s: Optional[List[Optional[str]]] = None,
+        use_cache: bool = True,
+        details: Optional[List[str]] = None,
+    ) -> List[VisionOutput]:
+        """Analyze several images, one VisionOutput per path in input order.
+
+        Cache misses are sent VISION_BATCH_SIZE at a time in a single chat
+        request sharing one prompt. Providers without multi-image support get
+        one call per image.
+        """
+        image_sha256s = image_sha256s or [None] * len(image_paths)
+        details = details or ["high"] * len(image_paths)
+        if not self.supports_batch or len(image_paths) < 2:
+            return [
+                self.analyze_image(path, image_sha256=digest, use_cache=use_cache, detail=detail)
+                for path, digest, detail in zip(image_paths, image_sha256s, details)
+            ]
+
+        results: List[Optional[VisionOutput]] = [None] * len(image_paths)
+        slots = [
+            self._cache_slot(path, digest, detail)
+            for path, digest, detail in zip(image_paths, image_sha256s, details)
+        ]
+        if use_cache:
+            results = [self._cache_get(slot) for slot in slots]
+
+        pending = [i for i, result in enumerate(results) if result is None]
+        size = max(1, settings.VISION_BATCH_SIZE)
+        for start in range(0, len(pending), size):
+            chunk = pending[start:start + size]
+            outputs = self._analyze_batch([self._prepare_image(image_paths[i], details[i]) for i in chunk])
+            for i, output in zip(chunk, outputs):
+                results[i] = output
+                self._cache_put(slots[i], output)
+        return results
+
+    def analyze_zones(self, crops: list, use_cache: bool = True, detail: str = "high") -> VisionOutput:
+        """Analyze zone crops (see app.services.zone_crops) concurrently, merged with zone ids."""
+        from app.services.zone_crops import analyze_zone_crops
+        return analyze_zone_crops(self, crops, use_cache=use_cache, detail=detail)
+
+    def _prepare_image(self, image_path: str, detail: str) -> VisionImage:
+        """Downscaled, re-encoded, EXIF-free derivative to send (cached next to the original)."""
+        if self.provider in ("mock", "none"):
+            return VisionImage(image_path, mime_type_for(image_path), detail)
+        try:
+            return vision_derivative(image_path, detail)
+        except FileNotFoundError:
+            logger.error("Image file not found", extra={"path": image_path})
+            raise VisionImageError(f"Image file not found: {image_path}")
+
+    def _encode_image(self, image: VisionImage) -> str:
+        with open(image.path, "rb") as f:
+            return base64.b64encode(f.read()).decode("utf-8")
+
+    def _cache_slot(self, image_path: str, image_sha256: Optional[str], detail: str = "high") -> Optional[tuple]:
+        """(cache_key, image_sha256, prompt_version) for an image, or None when not cached.
+
+        The prompt version covers the preprocessing profile, so changing the
+        derivative size/format/detail doesn't serve results for other inputs.
+        """
+        if not settings.VISION_CACHE_ENABLED or self.provider in ("mock", "none"):
+            return None
+        try:
+            image_sha256 = image_sha256 or file_sha256(image_path)
+        except FileNotFoundError:
+            logger.error("Image file not found", extra={"path": image_path})
+            raise VisionImageError(f"Image file not found: {image_path}")
+        prompt_version = prompt_hash(self._build_prompt() + profile_tag(detail))
+        cache_key = make_cache_key(image_sha256, self.provider, self.model, prompt_version)
+        return cache_key, image_sha256, prompt_version
+
+    def _cache_get(self, slot: Optional[tuple]) -> Optional[VisionOutput]:
+        if slot is None:
+            return None
+        try:
+            cached = get_vision_cache().get(slot[0])
+        except Exception as e:
+            logger.warning("Vision cache lookup failed", extra={"error": str(e)})
+            return None
+        if cached is not None:
+            logger.info("Vision cache hit", extra={
+                "provider": self.provider,
+                "image_sha256": slot[1],
+            })
+        return cached
+
+    def _cache_put(self, slot: Optional[tuple], result: VisionOutput) -> None:
+        if slot is None:
+            return
+        cache_key, image_sha256, prompt_version = slot
+        try:
+            get_vision_cache().put(
+                cache_key, result, image_sha256, self.provider, self.model, prompt_version,
+            )
+        except Exception as e:
+            logger.warning("Vision cache store failed", extra={"error": str(e)})
+
+    def _analyze(self, image: VisionImage) -> VisionOutput:
         logger.info("Analyzing image", extra={
             "provider": self.provider,
-            "image_path": image_path,
+            "image_path": image.path,
+            "detail": image.detail,
         })
+        return self._rate_limited(lambda: self._dispatch(image))
+
+    def _rate_limited(self, call, images: int = 1):
+        """Run a provider call once the shared RPM/TPM buckets have capacity.
+
+        A provider rate-limit response pauses the provider for every worker
+        (Retry-After) and the call waits its turn again, up to max_retries.
+        """
+        if self.provider in ("mock", "none"):
+            return call()
+        scheduler = get_rate_scheduler()
+        estimated = images * settings.VISION_TOKENS_PER_IMAGE
+        for attempt in range(1, self.max_retries + 1):
+            # Time spent queueing for our own budget isn't the provider's latency
+            pause_attempt_clock()
+            scheduler.acquire(self.provider, estimated)
+            start_attempt_clock()
+            self._usage.tokens = None
+            try:
+                result = call()
+            except VisionRateLimitError as e:
+                scheduler.pause(self.provider, e.retry_after)
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning("Provider rate limited, waiting for capacity", extra={
+                    "provider": self.provider,
+                    "retry_after": e.retry_after,
+                    "attempt": attempt,
+                })
+                continue
+            if self._usage.tokens:
+                scheduler.settle(self.provider, estimated, self._usage.tokens)
+            return result
+
+    def _record_usage(self, response) -> Optional[int]:
+        """Remember reported token usage for the rate scheduler; returns it for logging."""
+        usage = getattr(response, "usage", None)
+        total = getattr(usage, "total_tokens", None)
+        if isinstance(total, int):
+            self._usage.tokens = total
+            return total
+        return None
+
+    def _dispatch(self, image: VisionImage) -> VisionOutput:
+        image_path = image.path
         try:
             if self.provider in ("hermes", "hermes-gateway", "openai"):
-                return self._analyze_openai(image_path)
+                return self._analyze_openai(image)
             if self.provider in ("openclaw", "openclaw-gateway"):
-                return self._analyze_openclaw(image_path)
+                return self._analyze_openclaw(image)
             if self.provider == "nvidia":
-                return self._analyze_nvidia(image_path)
+                return self._analyze_nvidia(image)
             if self.provider == "ollama":
-                return self._analyze_ollama(image_path)
+                return self._analyze_ollama(image)
             if self.provider in ("mock", "none"):
                 with open(image_path, "rb"):
                     pass
@@ -141,48 +389,49 @@ class VisionAnalyzer:
                 return VisionOutput(scene_confidence=0.0, items=[], notes="mock provider: no analysis performed")
         except FileNotFoundError:
             logger.error("Image file not found", extra={"path": image_path})
-            raise VisionAnalysisError(f"Image file not found: {image_path}")
+            raise VisionImageError(f"Image file not found: {image_path}")
+        except VisionAnalysisError:
+            raise
         except Exception as e:
             logger.exception("Unexpected analysis error", extra={"error": str(e)})
             raise VisionAnalysisError(f"Unexpected error: {str(e)}")
 
-    def _analyze_openclaw(self, image_path: str) -> VisionOutput:
+    def _analyze_openclaw(self, image: VisionImage) -> VisionOutput:
+        import requests
         try:
-            with open(image_path, "rb") as f:
-                image_data = base64.b64encode(f.read()).decode("utf-8")
+            image_data = self._encode_image(image)
 
             payload = {"model": self.model, "image_base64": image_data, "prompt": self._build_prompt()}
-            req = urllib.request.Request(
+            resp = self.http.post(
                 self.vision_url,
-                data=json.dumps(payload).encode("utf-8"),
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                },
-                method="POST",
+                json=payload,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=self._http_timeout(int(os.getenv("OPENCLAW_TIMEOUT", "120"))),
             )
-            with urllib.request.urlopen(req, timeout=int(os.getenv("OPENCLAW_TIMEOUT", "120"))) as resp:
-                result = json.loads(resp.read().decode("utf-8"))
+            if resp.status_code == 429:
+                logger.warning("OpenClaw vision rate limit hit")
+                raise VisionRateLimitError("OpenClaw vision rate limited", retry_after=retry_after_seconds(resp))
+            if resp.status_code >= 400:
+                body = resp.text[:500]
+                logger.error("OpenClaw vision HTTP error", extra={"status": resp.status_code, "body": body})
+                raise VisionAnalysisError(f"OpenClaw vision HTTP error {resp.status_code}: {body}")
+            result = resp.json()
 
             response_text = result["text"]
             logger.info("OpenClaw vision response received", extra={"model": result.get("model")})
             return self._parse_response(response_text)
-        except urllib.error.HTTPError as e:
-            body = e.read().decode("utf-8", errors="replace")[:500]
-            logger.error("OpenClaw vision HTTP error", extra={"status": e.code, "body": body})
-            raise VisionAnalysisError(f"OpenClaw vision HTTP error {e.code}: {body}")
-        except urllib.error.URLError as e:
-            logger.error("OpenClaw vision network error", extra={"error": str(e)})
-            raise VisionAnalysisError(f"OpenClaw vision network error: {str(e)}")
-        except (KeyError, IndexError, json.JSONDecodeError) as e:
+        except (KeyError, IndexError, ValueError) as e:
+            # Also catches requests' JSONDecodeError (a ValueError)
             logger.error("OpenClaw vision response parse error", extra={"error": str(e)})
             raise VisionAnalysisError(f"OpenClaw vision response parse error: {str(e)}")
+        except requests.exceptions.RequestException as e:
+            logger.error("OpenClaw vision network error", extra={"error": str(e)})
+            raise VisionAnalysisError(f"OpenClaw vision network error: {str(e)}")
 
-    def _analyze_openai(self, image_path: str) -> VisionOutput:
+    def _analyze_openai(self, image: VisionImage) -> VisionOutput:
         from openai import APIError, APIConnectionError, RateLimitError
         try:
-            with open(image_path, "rb") as f:
-                image_data = base64.b64encode(f.read()).decode("utf-8")
+            image_data = self._encode_image(image)
             response = self.client.chat.completions.create(
                 model=self.model,
                 max_tokens=1024,
@@ -190,30 +439,29 @@ class VisionAnalyzer:
                     {
                         "role": "user",
                         "content": [
-                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_data}", "detail": "high"}},
+                            {"type": "image_url", "image_url": {"url": f"data:{image.mime_type};base64,{image_data}", "detail": image.detail}},
                             {"type": "text", "text": self._build_prompt()}
                         ],
                     }
                 ],
             )
             response_text = response.choices[0].message.content
-            logger.info("OpenAI response received", extra={"tokens": response.usage.total_tokens if hasattr(response, 'usage') and response.usage else None})
+            logger.info("OpenAI response received", extra={"tokens": self._record_usage(response)})
             return self._parse_response(response_text)
         except (APIConnectionError, ConnectionError) as e:
             logger.error("OpenAI network error", extra={"error": str(e)})
             raise VisionAnalysisError(f"Network error: {str(e)}")
-        except RateLimitError:
+        except RateLimitError as e:
             logger.warning("OpenAI rate limit hit")
-            raise VisionAnalysisError("Rate limit exceeded. Please try again later.")
+            raise VisionRateLimitError("Rate limit exceeded. Please try again later.", retry_after=retry_after_seconds(getattr(e, "response", None)))
         except APIError as e:
             logger.error("OpenAI API error", extra={"error": str(e), "status": e.status_code if hasattr(e, 'status_code') else None})
             raise VisionAnalysisError(f"OpenAI API error: {str(e)}")
 
-    def _analyze_nvidia(self, image_path: str) -> VisionOutput:
+    def _analyze_nvidia(self, image: VisionImage) -> VisionOutput:
         from openai import APIError, APIConnectionError, RateLimitError
         try:
-            with open(image_path, "rb") as f:
-                image_data = base64.b64encode(f.read()).decode("utf-8")
+            image_data = self._encode_image(image)
             response = self.client.chat.completions.create(
                 model=self.model,
                 max_tokens=1024,
@@ -222,46 +470,117 @@ class VisionAnalyzer:
                     {
                         "role": "user",
                         "content": [
-                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_data}", "detail": "high"}},
+                            {"type": "image_url", "image_url": {"url": f"data:{image.mime_type};base64,{image_data}", "detail": image.detail}},
                             {"type": "text", "text": self._build_prompt()}
                         ],
                     }
                 ],
             )
             response_text = response.choices[0].message.content
-            logger.info("NVIDIA response received")
+            logger.info("NVIDIA response received", extra={"tokens": self._record_usage(response)})
             return self._parse_response(response_text)
         except (APIConnectionError, ConnectionError) as e:
             logger.error("NVIDIA network error", extra={"error": str(e)})
             raise VisionAnalysisError(f"Network error: {str(e)}")
-        except RateLimitError:
+        except RateLimitError as e:
             logger.warning("NVIDIA rate limit hit")
-            raise VisionAnalysisError("Rate limit exceeded.")
+            raise VisionRateLimitError("Rate limit exceeded.", retry_after=retry_after_seconds(getattr(e, "response", None)))
         except APIError as e:
             logger.error("NVIDIA API error", extra={"error": str(e)})
             raise VisionAnalysisError(f"NVIDIA API error: {str(e)}")
 
+    def _analyze_batch(self, images: List[VisionImage]) -> List[VisionOutput]:
+        """One multi-image request; falls back to per-image calls if the reply doesn't line up."""
+        if len(images) == 1:
+            return [self._analyze(images[0])]
+        logger.info("Analyzing image batch", extra={
+            "provider": self.provider,
+            "batch_size": len(images),
+        })
+        try:
+            return self._rate_limited(lambda: self._analyze_openai_batch(images), images=len(images))
+        except FileNotFoundError as e:
+            logger.error("Image file not found", extra={"path": e.filename})
+            raise VisionImageError(f"Image file not found: {e.filename}")
+        except VisionBatchMismatchError as e:
+            logger.warning("Batch response unusable, analyzing images individually", extra={
+                "batch_size": len(images),
+                "error": str(e),
+            })
+            return [self._analyze(image) for image in images]
+
+    def _analyze_openai_batch(self, images: List[VisionImage]) -> List[VisionOutput]:
+        from openai import APIError, APIConnectionError, RateLimitError
+        image_paths = [image.path for image in images]
+        content = [{"type": "text", "text": self._build_batch_prompt(len(images))}]
+        for index, image in enumerate(images, start=1):
+            image_data = self._encode_image(image)
+            content.append({"type": "text", "text": f"Image {index}:"})
+            content.append({"type": "image_url", "image_url": {"url": f"data:{image.mime_type};base64,{image_data}", "detail": image.detail}})
+        kwargs = {"temperature": 0.0} if self.provider == "nvidia" else {}
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                max_tokens=1024 * len(image_paths),
+                messages=[{"role": "user", "content": content}],
+                **kwargs,
+            )
+            response_text = response.choices[0].message.content
+            logger.info("Batch response received", extra={
+                "batch_size": len(image_paths),
+                "tokens": self._record_usage(response),
+            })
+            return self._parse_batch_response(response_text, len(image_paths))
+        except (APIConnectionError, ConnectionError) as e:
+            logger.error("Batch network error", extra={"error": str(e)})
+            raise VisionAnalysisError(f"Network error: {str(e)}")
+        except RateLimitError as e:
+            logger.warning("Batch rate limit hit")
+            raise VisionRateLimitError("Rate limit exceeded. Please try again later.", retry_after=retry_after_seconds(getattr(e, "response", None)))
+        except APIError as e:
+            logger.error("Batch API error", extra={"error": str(e), "status": e.status_code if hasattr(e, 'status_code') else None})
+            raise VisionAnalysisError(f"API error: {str(e)}")
+
+    def _parse_batch_response(self, response_text: str, count: int) -> List[VisionOutput]:
+        """Parse {"results": [...]} into exactly `count` outputs, in image order."""
+        if not response_text or not response_text.strip():
+            raise VisionBatchMismatchError("Empty batch response from vision API")
+        if "```json" in response_text:
+            response_text = response_text.split("```json")[1].split("```")[0].strip()
+        elif "```" in response_text:
+            response_text = response_text.split("```")[1].split("```")[0].strip()
+        try:
+            parsed = json.loads(response_text)
+            results = parsed.get("results") if isinstance(parsed, dict) else parsed
+            if not isinstance(results, list) or len(results) != count:
+                raise VisionBatchMismatchError(f"Expected {count} batch results, got {len(results) if isinstance(results, list) else 'none'}")
+            return [VisionOutput(**result) for result in results]
+        except VisionBatchMismatchError:
+            raise
+        except (json.JSONDecodeError, TypeError, ValueError) as e:
+            raise VisionBatchMismatchError(f"Invalid batch response: {str(e)}")
+
     def _init_ollama(self):
-        import requests
         self.ollama_host = os.getenv("OLLAMA_HOST", "http://localhost:11434")
         self.model = os.getenv("OLLAMA_MODEL", "llava:latest")
+        self.http = _shared_requests_session()
+        # Runs once per analyzer; analyzers are reused per worker (see get_vision_analyzer)
         try:
-            response = requests.get(f"{self.ollama_host}/api/tags", timeout=5)
+            response = self.http.get(f"{self.ollama_host}/api/tags", timeout=5)
             response.raise_for_status()
             logger.info("Ollama connected", extra={"model": self.model, "host": self.ollama_host})
         except Exception as e:
             logger.warning("Ollama connection test failed", extra={"error": str(e)})
 
-    def _analyze_ollama(self, image_path: str) -> VisionOutput:
+    def _analyze_ollama(self, image: VisionImage) -> VisionOutput:
         import requests
         try:
-            with open(image_path, "rb") as f:
-                image_base64 = base64.b64encode(f.read()).decode("utf-8")
+            image_base64 = self._encode_image(image)
             prompt = self._build_prompt()
-            response = requests.post(
+            response = self.http.post(
                 f"{self.ollama_host}/api/generate",
                 json={"model": self.model, "prompt": prompt, "images": [image_base64], "stream": False},
-                timeout=120,
+                timeout=self._http_timeout(120),
             )
             response.raise_for_status()
             result = response.json()
@@ -378,3 +697,46 @@ Rules:
 - Return expiry_date as YYYY-MM-DD only if clearly readable, otherwise null
 - If an item has expired (date in the past), note it in the notes field
 - If you cannot identify any items, return {"scene_type": "unknown", "scene_confidence": 0, "items": [], "notes": "no identifiable items"}"""
+
+
+    def _build_batch_prompt(self, count: int) -> str:
+        return (
+            f"You will receive {count} images, labelled Image 1 to Image {count}. "
+            "Analyze EACH image independently, following these instructions for every image:\n\n"
+            + self._build_prompt()
+            + "\n\nBATCH OUTPUT: respond with ONLY a JSON object of the form "
+            '{"results": [<result for Image 1>, <result for Image 2>, ...]} '
+            f"where each result uses exactly the single-image structure above. "
+            f"The results array MUST contain exactly {count} entries, in image order."
+        )
+
+# Per-process analyzer, rebuilt only when the provider configuration changes
+_analyzer = None
+_analyzer_fingerprint = None
+_analyzer_lock = threading.Lock()
+
+
+def _config_fingerprint() -> str:
+    return hashlib.sha256(
+        "\0".join(os.getenv(name, "") for name in _CONFIG_ENV_VARS).encode("utf-8")
+    ).hexdigest()
+
+
+def get_vision_analyzer() -> VisionAnalyzer:
+    """Get the process-wide VisionAnalyzer, re-initialising it if its config changed.
+
+    With more than one provider in VISION_PROVIDER_CHAIN this is a
+    FailoverVisionAnalyzer exposing the same interface.
+    """
+    global _analyzer, _analyzer_fingerprint
+    fingerprint = _config_fingerprint()
+    with _analyzer_lock:
+        if _analyzer is None or fingerprint != _analyzer_fingerprint:
+            chain = [p.strip().lower() for p in os.getenv("VISION_PROVIDER_CHAIN", "").split(",") if p.strip()]
+            if len(chain) > 1:
+                from app.services.vision_failover import build_failover_analyzer
+                _analyzer = build_failover_analyzer(chain)
+            else:
+                _analyzer = VisionAnalyzer(provider=chain[0] if chain else None)
+            _analyzer_fingerprint = fingerprint
+        return _analyzer
@@ -0,0 +1,176 @@
+"""Vision result cache.
+
+Parsed VisionOutput is cached by (image SHA-256, provider, model, prompt hash)
+so reprocessing a capture (admin reprocess, review approval, Celery retries)
+does not pay for the same provider call twice. A small in-process LRU sits in
+front of the vision_result_cache table; entries expire after
+VISION_CACHE_TTL_HOURS and the table is trimmed to VISION_CACHE_MAX_ENTRIES.
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.config import settings
+from app.models.schemas import VisionOutput
+
+logger = logging.getLogger("pantry-worker.vision_cache")
+
+_HASH_CHUNK_SIZE = 64 * 1024
+
+
+def file_sha256(path: str) -> str:
+    """Hex SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def prompt_hash(prompt: str) -> str:
+    """Short, stable version tag for a prompt (changes invalidate the cache)."""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def make_cache_key(image_sha256: str, provider: str, model: str, prompt_version: str) -> str:
+    return hashlib.sha256(
+        f"{image_sha256}:{provider}:{model}:{prompt_version}".encode("utf-8")
+    ).hexdigest()
+
+
+class VisionCache:
+    """Two-level cache: in-process LRU over the vision_result_cache table."""
+
+    def __init__(
+        self,
+        lru_size: int = settings.VISION_CACHE_LRU_SIZE,
+        ttl_hours: int = settings.VISION_CACHE_TTL_HOURS,
+        max_entries: int = settings.VISION_CACHE_MAX_ENTRIES,
+    ):
+        self.lru_size = lru_size
+        self.ttl = timedelta(hours=ttl_hours)
+        self.max_entries = max_entries
+        self._lru: "OrderedDict[str, tuple[datetime, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[VisionOutput]:
+        now = datetime.utcnow()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                created_at, payload = entry
+                if now - created_at < self.ttl:
+                    self._lru.move_to_end(key)
+                    self.hits += 1
+                    return VisionOutput(**payload)
+                del self._lru[key]
+
+        from app.db.session import SessionLocal
+        from app.db.models import VisionResultCache
+
+        db = SessionLocal()
+        try:
+            row = db.query(VisionResultCache).filter(VisionResultCache.cache_key == key).first()
+            if row is None:
+                self.misses += 1
+                return None
+            created_at = row.created_at.replace(tzinfo=None)
+            if now - created_at >= self.ttl:
+                db.delete(row)
+                db.commit()
+                self.misses += 1
+                return None
+            row.hit_count = (row.hit_count or 0) + 1
+            row.last_hit_at = now
+            payload = row.output_json
+            db.commit()
+        finally:
+            db.close()
+
+        self._remember(key, created_at, payload)
+        self.hits += 1
+        return VisionOutput(**payload)
+
+    def put(
+        self,
+        key: str,
+        result: VisionOutput,
+        image_sha256: str,
+        provider: str,
+        model: str,
+        prompt_version: str,
+    ) -> None:
+        from app.db.session import SessionLocal
+        from app.db.models import VisionResultCache
+
+        now = datetime.utcnow()
+        payload = result.model_dump(mode="json")
+        db = SessionLocal()
+        try:
+            db.merge(VisionResultCache(
+                cache_key=key,
+                image_sha256=image_sha256,
+                provider=provider,
+                model=model,
+                prompt_hash=prompt_version,
+                output_json=payload,
+                hit_count=0,
+                created_at=now,
+            ))
+            db.flush()
+            self._trim(db)
+            db.commit()
+        finally:
+            db.close()
+        self._remember(key, now, payload)
+
+    def _trim(self, db) -> None:
+        """Drop expired rows and the oldest rows beyond max_entries."""
+        from app.db.models import VisionResultCache
+
+        cutoff = datetime.utcnow() - self.ttl
+        db.query(VisionResultCache).filter(
+            VisionResultCache.created_at < cutoff
+        ).delete(synchronize_session=False)
+
+        overflow = db.query(VisionResultCache).count() - self.max_entries
+        if overflow > 0:
+            oldest = [
+                key for (key,) in db.query(VisionResultCache.cache_key)
+                .order_by(VisionResultCache.created_at.asc())
+                .limit(overflow)
+            ]
+            db.query(VisionResultCache).filter(
+                VisionResultCache.cache_key.in_(oldest)
+            ).delete(synchronize_session=False)
+
+    def _remember(self, key: str, created_at: datetime, payload: dict) -> None:
+        with self._lock:
+            self._lru[key] = (created_at, payload)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "lru_entries": len(self._lru),
+        }
+
+
+# Global instance
+_vision_cache = None
+
+
+def get_vision_cache() -> VisionCache:
+    """Get or create the per-process vision cache."""
+    global _vision_cache
+    if _vision_cache is None:
+        _vision_cache = VisionCache()
+    return _vision_cache
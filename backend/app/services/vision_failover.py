@@ -0,0 +1,325 @@
+"""Vision provider failover chain.
+
+VISION_PROVIDER_CHAIN (e.g. "hermes,openai,ollama") builds one VisionAnalyzer
+per provider, tried in order. Each provider has a circuit breaker: it opens
+after VISION_BREAKER_FAILURES consecutive failures or timeouts, and lets a
+single half-open probe through after VISION_BREAKER_RESET_SECONDS. With
+VISION_HEDGE_ENABLED a second request goes to the next provider once the
+first has run past its own latency percentile; the first success wins.
+
+Timeouts, breakers and latency only count time the provider request is
+actually in flight: an attempt's clock starts when a pool thread picks it up
+(not while it waits for a free thread), and VisionAnalyzer pauses it while it
+waits for our own rate budget. Errors that aren't the provider's fault
+(missing image, rate budget not granted in time) never trip a breaker.
+
+Timed-out threads can't be cancelled, so analyzers built for the chain cap
+their HTTP timeout at VISION_PROVIDER_TIMEOUT: a hung request gives its pool
+thread back soon after the attempt is abandoned.
+
+Breakers and latency windows are per worker process.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional
+
+from app.config import settings
+from app.exceptions import VisionAnalysisError, VisionCapacityError, VisionImageError
+from app.models.schemas import VisionOutput
+
+logger = logging.getLogger("pantry-worker.vision")
+
+# Hedging needs a baseline before it trusts a percentile
+_MIN_LATENCY_SAMPLES = 10
+_LATENCY_WINDOW = 100
+# How often to re-check attempts whose clock isn't running (queued, or paused on rate budget)
+_CAPACITY_POLL_SECONDS = 0.25
+
+
+class CircuitBreaker:
+    """Closed → open after repeated failures → half-open probe → closed."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now (claims the probe slot when half-open)."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                logger.info("Vision provider circuit half-open", extra={"provider": self.name})
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Vision provider circuit closed", extra={"provider": self.name})
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("Vision provider circuit opened", extra={
+                        "provider": self.name,
+                        "failures": self.failures,
+                    })
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Sliding window of successful call latencies (seconds)."""
+
+    def __init__(self, size: int = _LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < _MIN_LATENCY_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class _AttemptClock:
+    """When one failover attempt's provider request started (None: queued or paused)."""
+
+    def __init__(self):
+        self.started: Optional[float] = None
+
+
+_attempt = threading.local()
+
+
+def pause_attempt_clock() -> None:
+    """Stop the current attempt's clock (called before waiting on rate budget)."""
+    clock = getattr(_attempt, "clock", None)
+    if clock is not None:
+        clock.started = None
+
+
+def start_attempt_clock() -> None:
+    """(Re)start the current attempt's clock as the provider request goes out."""
+    clock = getattr(_attempt, "clock", None)
+    if clock is not None:
+        clock.started = time.monotonic()
+
+
+def _run_attempt(call: Callable, analyzer, clock: _AttemptClock):
+    # Time spent waiting for a free pool thread doesn't count against the provider
+    clock.started = time.monotonic()
+    _attempt.clock = clock
+    try:
+        return call(analyzer)
+    finally:
+        _attempt.clock = None
+
+
+# Provider calls run here so they can be timed out and hedged
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.VISION_HTTP_POOL_SIZE,
+                thread_name_prefix="vision-provider",
+            )
+        return _executor
+
+
+class FailoverVisionAnalyzer:
+    """Drop-in for VisionAnalyzer that spreads calls over an ordered provider chain."""
+
+    def __init__(self, analyzers: list):
+        if not analyzers:
+            raise ValueError("VISION_PROVIDER_CHAIN has no usable providers")
+        self.analyzers = analyzers
+        self.breakers = {
+            a.provider: CircuitBreaker(a.provider, settings.VISION_BREAKER_FAILURES, settings.VISION_BREAKER_RESET_SECONDS)
+            for a in analyzers
+        }
+        self.latency = {a.provider: LatencyTracker() for a in analyzers}
+        self.timeout = settings.VISION_PROVIDER_TIMEOUT
+        self.hedge_enabled = settings.VISION_HEDGE_ENABLED
+        self.hedge_percentile = settings.VISION_HEDGE_PERCENTILE
+
+    @property
+    def provider(self) -> str:
+        return self.analyzers[0].provider
+
+    @property
+    def model(self) -> str:
+        return self.analyzers[0].model
+
+    @property
+    def supports_batch(self) -> bool:
+        return self.analyzers[0].supports_batch
+
+    def analyze_image(
+        self,
+        image_path: str,
+        image_sha256: Optional[str] = None,
+        use_cache: bool = True,
+        detail: str = "high",
+    ) -> VisionOutput:
+        return self._call(
+            lambda a: a.analyze_image(image_path, image_sha256=image_sha256, use_cache=use_cache, detail=detail),
+            hedge=self.hedge_enabled,
+        )
+
+    def analyze_images(
+        self,
+        image_paths: List[str],
+        image_sha256s: Optional[List[Optional[str]]] = None,
+        use_cache: bool = True,
+        details: Optional[List[str]] = None,
+    ) -> List[VisionOutput]:
+        # Batches are throughput work: fail over, but don't double the spend by hedging
+        return self._call(
+            lambda a: a.analyze_images(image_paths, image_sha256s=image_sha256s, use_cache=use_cache, details=details),
+            hedge=False,
+        )
+
+    def analyze_zones(self, crops: list, use_cache: bool = True, detail: str = "high") -> VisionOutput:
+        # Each crop fails over (and hedges) on its own
+        from app.services.zone_crops import analyze_zone_crops
+        return analyze_zone_crops(self, crops, use_cache=use_cache, detail=detail)
+
+    def status(self) -> list:
+        return [
+            {
+                "provider": a.provider,
+                "state": self.breakers[a.provider].state,
+                "failures": self.breakers[a.provider].failures,
+                "p_latency": self.latency[a.provider].percentile(self.hedge_percentile),
+            }
+            for a in self.analyzers
+        ]
+
+    def _call(self, call: Callable, hedge: bool):
+        queue = list(self.analyzers)
+        running = {}
+        errors = []
+
+        def launch() -> bool:
+            while queue:
+                analyzer = queue.pop(0)
+                if self.breakers[analyzer.provider].allow():
+                    clock = _AttemptClock()
+                    running[_get_executor().submit(_run_attempt, call, analyzer, clock)] = (analyzer, clock)
+                    return True
+                errors.append(f"{analyzer.provider}: circuit open")
+            return False
+
+        launch()
+        while running:
+            now = time.monotonic()
+            started = [clock.started for _, clock in running.values() if clock.started is not None]
+            wait_for = min(s + self.timeout for s in started) - now if started else _CAPACITY_POLL_SECONDS
+            if len(started) < len(running):
+                wait_for = min(wait_for, _CAPACITY_POLL_SECONDS)
+            hedge_at = None
+            if hedge and queue and len(running) == 1:
+                (analyzer, clock), = running.values()
+                delay = self.latency[analyzer.provider].percentile(self.hedge_percentile)
+                if delay is not None and clock.started is not None:
+                    hedge_at = clock.started + delay
+                    wait_for = min(wait_for, hedge_at - now)
+
+            done, _ = wait(list(running), timeout=max(0.0, wait_for), return_when=FIRST_COMPLETED)
+            for future in done:
+                analyzer, clock = running.pop(future)
+                try:
+                    result = future.result()
+                except VisionImageError:
+                    # Same input for every provider: failing over can't help
+                    raise
+                except VisionCapacityError as e:
+                    # Our budget, not the provider's health: try the next one, breaker untouched
+                    errors.append(f"{analyzer.provider}: {e}")
+                    logger.warning("Vision rate budget unavailable, trying next", extra={
+                        "provider": analyzer.provider,
+                        "error": str(e),
+                    })
+                    continue
+                except Exception as e:
+                    self.breakers[analyzer.provider].record_failure()
+                    errors.append(f"{analyzer.provider}: {e}")
+                    logger.warning("Vision provider failed, trying next", extra={
+                        "provider": analyzer.provider,
+                        "error": str(e),
+                    })
+                    continue
+                self.breakers[analyzer.provider].record_success()
+                if clock.started is not None:
+                    self.latency[analyzer.provider].record(time.monotonic() - clock.started)
+                return result
+
+            now = time.monotonic()
+            for future, (analyzer, clock) in list(running.items()):
+                if clock.started is not None and now - clock.started >= self.timeout:
+                    # The thread can't be cancelled; its late result is discarded
+                    running.pop(future)
+                    self.breakers[analyzer.provider].record_failure()
+                    errors.append(f"{analyzer.provider}: timed out after {self.timeout}s")
+                    logger.warning("Vision provider timed out", extra={
+                        "provider": analyzer.provider,
+                        "timeout": self.timeout,
+                    })
+
+            if hedge_at is not None and running and now >= hedge_at and queue:
+                analyzer, clock = next(iter(running.values()))
+                logger.info("Hedging vision request to next provider", extra={
+                    "provider": analyzer.provider,
+                    "after_seconds": round(now - (clock.started or now), 3),
+                })
+                launch()
+            if not running:
+                launch()
+
+        raise VisionAnalysisError("All vision providers failed: " + "; ".join(errors))
+
+
+def build_failover_analyzer(chain: List[str]) -> FailoverVisionAnalyzer:
+    """Build the chain, skipping providers that are not configured (missing keys)."""
+    from app.services.vision import VisionAnalyzer
+
+    analyzers = []
+    for provider in chain:
+        try:
+            analyzers.append(VisionAnalyzer(provider=provider, request_timeout=settings.VISION_PROVIDER_TIMEOUT))
+        except ValueError as e:
+            logger.warning("Skipping unconfigured vision provider", extra={
+                "provider": provider,
+                "error": str(e),
+            })
+    return FailoverVisionAnalyzer(analyzers)
@@ -0,0 +1,230 @@
+"""Shared rate scheduler for vision provider calls.
+
+Every worker draws from the same per-provider token buckets in Redis before
+calling a provider: one for requests per minute (VISION_RPM_LIMIT) and one for
+tokens per minute (VISION_TPM_LIMIT, charged with an estimate up front and
+settled against the reported usage). A provider's Retry-After pauses the
+bucket for everyone. Workers sleep until capacity is available instead of
+failing into Celery's retry backoff.
+
+Falls back to in-process buckets when Redis is unavailable. A limit of 0
+disables that bucket (Retry-After pauses still apply).
+"""
+import logging
+import threading
+import time
+from typing import Optional
+
+from app.config import settings
+from app.exceptions import VisionCapacityError
+
+logger = logging.getLogger("pantry-worker.vision_rate")
+
+# Atomically refill both buckets, then take (1 request, N tokens) or report the wait.
+# KEYS: rpm bucket, tpm bucket, pause key. ARGV: rpm, tpm, token cost.
+# Returns milliseconds to wait (0 = granted).
+_ACQUIRE_SCRIPT = """
+local pause = redis.call('PTTL', KEYS[3])
+if pause > 0 then return pause end
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local wait = 0
+local levels = {}
+local specs = {{KEYS[1], tonumber(ARGV[1]), 1}, {KEYS[2], tonumber(ARGV[2]), tonumber(ARGV[3])}}
+
+for i, spec in ipairs(specs) do
+  local key, capacity, cost = spec[1], spec[2], spec[3]
+  if capacity > 0 then
+    cost = math.min(cost, capacity)
+    local state = redis.call('HMGET', key, 'level', 'ts')
+    local level = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    local rate = capacity / 60000.0
+    level = math.min(capacity, level + (now - ts) * rate)
+    levels[i] = level
+    if level < cost then
+      wait = math.max(wait, math.ceil((cost - level) / rate))
+    end
+  end
+end
+if wait > 0 then return wait end
+
+for i, spec in ipairs(specs) do
+  local key, capacity, cost = spec[1], spec[2], spec[3]
+  if capacity > 0 then
+    cost = math.min(cost, capacity)
+    redis.call('HSET', key, 'level', levels[i] - cost, 'ts', now)
+    redis.call('PEXPIRE', key, 120000)
+  end
+end
+return 0
+"""
+
+
+class _Bucket:
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.level = capacity
+        self.ts = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.ts) * self.capacity / 60.0)
+        self.ts = now
+
+
+class ProviderRateScheduler:
+    """Redis token buckets (RPM + TPM) per provider, with an in-memory fallback."""
+
+    def __init__(
+        self,
+        rpm: int = settings.VISION_RPM_LIMIT,
+        tpm: int = settings.VISION_TPM_LIMIT,
+        max_wait: float = settings.VISION_RATE_MAX_WAIT,
+    ):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_wait = max_wait
+        self._redis = None
+        self._redis_attempted = False
+        self._script = None
+        self._mem: dict = {}
+        self._paused_until: dict = {}
+        self._lock = threading.Lock()
+
+    def _get_redis(self):
+        if self._redis_attempted:
+            return self._redis
+        self._redis_attempted = True
+        try:
+            import redis
+            self._redis = redis.from_url(
+                settings.REDIS_URL,
+                socket_connect_timeout=2,
+                socket_timeout=2,
+                decode_responses=True,
+            )
+            self._redis.ping()
+            self._script = self._redis.register_script(_ACQUIRE_SCRIPT)
+        except Exception as e:
+            logger.warning("Redis rate scheduler unavailable, using in-process buckets", extra={"error": str(e)})
+            self._redis = None
+        return self._redis
+
+    def acquire(self, provider: str, tokens: int = 0) -> float:
+        """Block until one request and `tokens` tokens are available; returns seconds waited."""
+        started = time.monotonic()
+        while True:
+            wait = self._try_acquire(provider, tokens)
+            if wait <= 0:
+                waited = time.monotonic() - started
+                if waited > 0.05:
+                    logger.info("Vision rate capacity acquired", extra={
+                        "provider": provider,
+                        "waited_seconds": round(waited, 2),
+                    })
+                return waited
+            if time.monotonic() - started + wait > self.max_wait:
+                raise VisionCapacityError(
+                    f"Rate limit capacity for {provider} not available within {self.max_wait}s"
+                )
+            time.sleep(wait)
+
+    def settle(self, provider: str, estimated: int, actual: int) -> None:
+        """Correct the TPM bucket once the provider reports real token usage."""
+        if not self.tpm or not actual:
+            return
+        delta = estimated - actual  # positive: refund
+        r = self._get_redis()
+        if r:
+            try:
+                r.hincrbyfloat(f"vision:rate:{provider}:tpm", "level", delta)
+                return
+            except Exception as e:
+                logger.warning("Redis rate settle failed", extra={"error": str(e)})
+        with self._lock:
+            bucket = self._mem.get((provider, "tpm"))
+            if bucket is not None:
+                bucket.level = min(bucket.capacity, bucket.level + delta)
+
+    def pause(self, provider: str, seconds: Optional[float]) -> None:
+        """Stop all workers calling `provider` for `seconds` (from Retry-After)."""
+        seconds = seconds if seconds and seconds > 0 else settings.VISION_RATE_DEFAULT_PAUSE
+        logger.warning("Vision provider paused", extra={"provider": provider, "seconds": seconds})
+        r = self._get_redis()
+        if r:
+            try:
+                r.set(f"vision:rate:{provider}:pause", "1", px=int(seconds * 1000))
+                return
+            except Exception as e:
+                logger.warning("Redis rate pause failed", extra={"error": str(e)})
+        with self._lock:
+            self._paused_until[provider] = time.monotonic() + seconds
+
+    def _try_acquire(self, provider: str, tokens: int) -> float:
+        """Seconds to wait before retrying, or 0 if capacity was taken."""
+        r = self._get_redis()
+        if r:
+            try:
+                wait_ms = self._script(
+                    keys=[
+                        f"vision:rate:{provider}:rpm",
+                        f"vision:rate:{provider}:tpm",
+                        f"vision:rate:{provider}:pause",
+                    ],
+                    args=[self.rpm, self.tpm, tokens],
+                )
+                return int(wait_ms) / 1000.0
+            except Exception as e:
+                logger.warning("Redis rate acquire failed, falling back", extra={"error": str(e)})
+
+        now = time.monotonic()
+        with self._lock:
+            paused = self._paused_until.get(provider, 0) - now
+            if paused > 0:
+                return paused
+            wanted = []
+            for name, capacity, cost in (("rpm", self.rpm, 1), ("tpm", self.tpm, tokens)):
+                if capacity > 0:
+                    bucket = self._mem.setdefault((provider, name), _Bucket(capacity))
+                    bucket.refill(now)
+                    wanted.append((bucket, min(cost, capacity)))
+            wait = max(
+                [(cost - bucket.level) * 60.0 / bucket.capacity for bucket, cost in wanted if bucket.level < cost],
+                default=0.0,
+            )
+            if wait > 0:
+                return wait
+            for bucket, cost in wanted:
+                bucket.level -= cost
+            return 0.0
+
+
+def retry_after_seconds(response) -> Optional[float]:
+    """Retry-After (or retry-after-ms) from a provider HTTP response, if present."""
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+# Global instance
+_scheduler = None
+
+
+def get_rate_scheduler() -> ProviderRateScheduler:
+    """Get or create the per-process rate scheduler."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = ProviderRateScheduler()
+    return _scheduler
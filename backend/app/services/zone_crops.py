@@ -0,0 +1,95 @@
+"""Zone-cropped vision requests.
+
+A device with configured zones sends one crop per zone instead of the full
+frame. Crops come from the normalized Zone.x/y/width/height. A zone whose
+crop hash is still within the near-duplicate threshold of its last analyzed
+crop is not sent. Crops are analyzed concurrently in a bounded pool, and the
+results merge into one VisionOutput whose items carry their zone_id.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List
+
+from app.config import settings
+from app.models.schemas import VisionOutput
+from app.services.cascade import combine_items
+from app.services.near_duplicate import dhash_image, hamming_distance
+
+logger = logging.getLogger("pantry-worker.zone_crops")
+
+
+@dataclass
+class ZoneCrop:
+    zone_id: str
+    path: str
+    frame_hash: str
+
+
+def crop_zones(image_path: str, zones: list, out_dir: str) -> List[ZoneCrop]:
+    """Write one JPEG per zone into out_dir."""
+    from PIL import Image
+
+    crops = []
+    with Image.open(image_path) as img:
+        img = img.convert("RGB")
+        img_w, img_h = img.size
+        for zone in zones:
+            box = (
+                int(max(0.0, zone.x) * img_w),
+                int(max(0.0, zone.y) * img_h),
+                int(min(1.0, zone.x + zone.width) * img_w),
+                int(min(1.0, zone.y + zone.height) * img_h),
+            )
+            if box[2] <= box[0] or box[3] <= box[1]:
+                logger.warning("Skipping empty zone", extra={"zone_id": zone.id})
+                continue
+            crop = img.crop(box)
+            path = os.path.join(out_dir, f"zone-{zone.id}.jpg")
+            crop.save(path, "JPEG", quality=90)
+            crops.append(ZoneCrop(zone_id=zone.id, path=path, frame_hash=dhash_image(crop)))
+    return crops
+
+
+def zone_changed(crop: ZoneCrop, zone, threshold: int) -> bool:
+    """Whether a zone's pixels moved past the near-duplicate threshold since it was last analyzed."""
+    if threshold <= 0 or not zone.last_frame_hash:
+        return True
+    return hamming_distance(crop.frame_hash, zone.last_frame_hash) >= threshold
+
+
+def analyze_zone_crops(analyzer, crops: List[ZoneCrop], use_cache: bool = True, detail: str = "high") -> VisionOutput:
+    """Analyze crops concurrently with `analyzer` and merge them, tagging items with zone_id.
+
+    A product seen in several zones comes back as one item with the quantities
+    summed; zone_items keeps what each zone showed.
+    """
+    if not crops:
+        return VisionOutput(scene_confidence=0.0, items=[], notes="zones: none changed", zone_items={})
+
+    workers = max(1, min(len(crops), settings.VISION_ZONE_CONCURRENCY))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vision-zone") as pool:
+        outputs = list(pool.map(
+            lambda crop: analyzer.analyze_image(crop.path, use_cache=use_cache, detail=detail),
+            crops,
+        ))
+
+    items = []
+    zone_items = {}
+    for crop, output in zip(crops, outputs):
+        zone_items[crop.zone_id] = [item.name for item in output.items]
+        for item in output.items:
+            items.append(item.model_copy(update={"zone_id": crop.zone_id}))
+    logger.info("Zone crops analyzed", extra={
+        "zones": len(crops),
+        "items": len(items),
+        "concurrency": workers,
+    })
+    return VisionOutput(
+        scene_type=next((o.scene_type for o in outputs if o.scene_type), None),
+        scene_confidence=round(sum(o.scene_confidence for o in outputs) / len(outputs), 3),
+        items=combine_items(items),
+        notes="zones: " + ", ".join(crop.zone_id for crop in crops),
+        zone_items=zone_items,
+    )
@@ -2,21 +2,72 @@
 import json
 import logging
 import os
+import tempfile
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional, Tuple, Union
+from app.config import settings
 from app.models.schemas import VisionOutput
 from app.exceptions import VisionAnalysisError
-from app.services.vision import VisionAnalyzer
+from app.services.vision import VisionAnalyzer, get_vision_analyzer
 from app.services.barcode_detector import detect_barcodes
-from app.services.barcode import lookup_barcode
+from app.services.barcode import BarcodeProduct, lookup_barcode
+from app.services.near_duplicate import dhash, match_previous_frame, threshold_for
+from app.services.cascade import CascadePlan, crop_regions, merge_outputs, plan_cascade
+from app.services.preprocess import detail_for_trigger
+from app.services.zone_crops import crop_zones, zone_changed
+from app.workers.claims import claim_capture
 
 logger = logging.getLogger("pantry-worker")
 
 
+def _utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """Comparable form of a timestamp whether or not the backend kept its tzinfo."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+# Pipeline stages in order. Capture.pipeline_stage holds the last one completed
+# and Capture.pipeline_checkpoint its results, so a retry resumes after it.
+PIPELINE_STAGES = ("load", "preprocess", "barcode", "vision", "persist", "notify")
+
+
+@dataclass
+class PreparedCapture:
+    """A loaded capture whose image is waiting on vision analysis."""
+    capture: Any
+    device: Any
+    image_path: str
+    frame_hash: Optional[str]
+    cascade: Optional[CascadePlan] = None
+    region_outputs: List[VisionOutput] = field(default_factory=list)
+    zones: list = field(default_factory=list)
+    zone_hashes: dict = field(default_factory=dict)
+    # Barcode detection + lookups running alongside vision; joined before persist
+    barcode_scan: Optional[Future] = None
+
+    @property
+    def sends_crops(self) -> bool:
+        """Cascade and zone-crop captures make their own requests (not full-frame batchable)."""
+        return self.cascade is not None or bool(self.zones)
+
+
 class CaptureProcessor:
     """Process a captured image through the vision pipeline."""
 
     def __init__(self):
+        self._stage_pool = ThreadPoolExecutor(
+            max_workers=max(1, settings.CAPTURE_STAGE_WORKERS),
+            thread_name_prefix="capture-stage",
+        )
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Pick up the shared analyzer (rebuilt by get_vision_analyzer on config change)."""
         try:
-            self.vision = VisionAnalyzer()
+            self.vision = get_vision_analyzer()
         except ValueError as e:
             if os.getenv("PYTEST_CURRENT_TEST"):
                 logger.warning("Vision analyzer unavailable in test context", extra={"error": str(e)})
@@ -24,208 +75,741 @@ class CaptureProcessor:
             else:
                 raise
 
-    def process_capture(self, capture_id: str) -> bool:
+    def process_capture(self, capture_id: str, use_cache: bool = True, reprocess: bool = False) -> bool:
+        """Run a capture through the pipeline.
+
+        use_cache=False is a deliberate re-analysis: it bypasses both the vision
+        result cache and near-duplicate suppression, and (like reprocess=True)
+        may reopen a capture that already finished.
+        """
         from app.db.session import SessionLocal
-        from app.db.models import Capture, Observation, InventoryItem, InventoryState, InventoryEvent
 
         logger.info("Starting capture processing", extra={"capture_id": capture_id})
 
         db = SessionLocal()
         try:
-            capture = db.query(Capture).filter(Capture.id == capture_id).first()
-            if not capture:
-                logger.error("Capture not found", extra={"capture_id": capture_id})
-                return False
-
-            capture.status = "analyzing"
-            db.commit()
-
-            image_path = capture.image_path
-            if not os.path.isabs(image_path):
-                from app.services.storage import get_storage_manager
-                mgr = get_storage_manager()
-                image_path = str(mgr.storage_path / image_path)
+            prepared = self._prepare_capture(db, capture_id, use_cache, reprocess=reprocess or not use_cache)
+            if not isinstance(prepared, PreparedCapture):
+                return prepared
 
-            if not os.path.exists(image_path):
-                logger.error("Image file not found", extra={
-                    "capture_id": capture_id,
-                    "image_path": image_path,
-                })
-                capture.status = "failed"
-                capture.error_message = f"Image file not found: {image_path}"
-                db.commit()
-                return False
+            result = self._run_vision(db, prepared, use_cache)
+            self._persist_result(db, prepared, result)
+            return True
 
-            # Run barcode detection on the image
-            barcodes = detect_barcodes(image_path)
-            if barcodes:
-                logger.info("Barcode(s) detected in capture image", extra={
-                    "capture_id": capture_id,
-                    "count": len(barcodes),
-                    "codes": [b.data for b in barcodes],
-                })
-                # Look up each detected barcode and create/update barcode lookup records
-                for bc in barcodes:
-                    try:
-                        product = lookup_barcode(bc.data)
-                        if product.found:
-                            logger.info("Barcode resolved to product", extra={
-                                "barcode": bc.data,
-                                "product": product.product_name,
-                            })
-                            # Check if item already in inventory
-                            from app.db.models import BarcodeLookup
-                            existing = db.query(BarcodeLookup).filter(
-                                BarcodeLookup.barcode == bc.data
-                            ).first()
-                            if not existing:
-                                bl = BarcodeLookup(
-                                    barcode=bc.data,
-                                    product_name=product.product_name,
-                                    brand=product.brand,
-                                    category=product.category,
-                                    package_type=product.package_type,
-                                    image_url=product.image_url,
-                                    source=product.source,
-                                )
-                                db.add(bl)
-                                db.commit()
-                    except Exception as bc_err:
-                        logger.warning("Barcode product lookup failed", extra={
-                            "barcode": bc.data,
-                            "error": str(bc_err),
-                        })
+        except VisionAnalysisError as e:
+            logger.error("Vision analysis failed", extra={
+                "capture_id": capture_id,
+                "error": str(e),
+            })
+            self._mark_failed(db, capture_id, f"Vision analysis error: {e}")
+            return False
 
-            # Run vision analysis
-            logger.info("Running vision analysis", extra={
+        except Exception as e:
+            logger.exception("Unexpected processing error", extra={
                 "capture_id": capture_id,
-                "provider": self.vision.provider,
-                "image_path": image_path,
+                "error": str(e),
             })
-            result: VisionOutput = self.vision.analyze_image(image_path)
+            self._mark_failed(db, capture_id, str(e))
+            return False
 
-            # Store observation
-            observation = Observation(
-                capture_id=capture.id,
-                raw_json=result.model_dump(mode="json"),
-                scene_confidence=result.scene_confidence,
-            )
-            db.add(observation)
-            db.flush()
+        finally:
+            db.close()
 
-            # Update inventory
-            items_updated = 0
-            for item_data in result.items:
-                name = (item_data.name or "").strip()
-                if not name:
-                    continue
-                qty = item_data.quantity_estimate or 1
-                conf = item_data.confidence or 0.5
-                if conf < 0.7:
-                    logger.info("Skipping low-confidence item", extra={
+    def process_captures_batch(self, capture_ids: List[str], use_cache: bool = True) -> List[str]:
+        """Run several captures through the pipeline with one batched vision call.
+
+        Each capture is still prepared, persisted and committed on its own, so
+        one bad frame never rolls back the rest. Returns the ids that completed.
+        """
+        from app.db.session import SessionLocal
+
+        logger.info("Starting batch capture processing", extra={"batch_size": len(capture_ids)})
+
+        db = SessionLocal()
+        try:
+            completed: List[str] = []
+            batch: List[PreparedCapture] = []
+            for capture_id in capture_ids:
+                try:
+                    prepared = self._prepare_capture(db, capture_id, use_cache)
+                except Exception as e:
+                    logger.exception("Unexpected processing error", extra={
                         "capture_id": capture_id,
-                        "item": name,
-                        "confidence": conf,
+                        "error": str(e),
                     })
+                    self._mark_failed(db, capture_id, str(e))
                     continue
+                if isinstance(prepared, PreparedCapture) and (prepared.sends_crops or self._reached(prepared.capture, "vision")):
+                    # Cascade / zone frames send their own crops, and resumed frames already
+                    # have their result; neither joins the full-frame batch
+                    try:
+                        self._persist_result(db, prepared, self._run_vision(db, prepared, use_cache))
+                        completed.append(capture_id)
+                    except VisionAnalysisError as e:
+                        self._mark_failed(db, capture_id, f"Vision analysis error: {e}")
+                    except Exception as e:
+                        logger.exception("Unexpected processing error", extra={
+                            "capture_id": capture_id,
+                            "error": str(e),
+                        })
+                        self._mark_failed(db, capture_id, str(e))
+                elif isinstance(prepared, PreparedCapture):
+                    batch.append(prepared)
+                elif prepared:
+                    completed.append(capture_id)
 
-                canonical = name.lower().replace("  ", " ").strip()
-                inv_item = db.query(InventoryItem).filter(
-                    InventoryItem.canonical_name == canonical
-                ).first()
-
-                if not inv_item:
-                    inv_item = InventoryItem(
-                        canonical_name=canonical,
-                        brand=item_data.brand,
-                        package_type=item_data.package_type or "other",
-                    )
-                    db.add(inv_item)
-                    db.flush()
+            if not batch:
+                return completed
 
-                # Propagate the capture image to the inventory item
-                # Always update to the latest capture so the photo stays fresh
-                inv_item.image_path = capture.image_path
+            logger.info("Running batched vision analysis", extra={
+                "provider": self.vision.provider,
+                "batch_size": len(batch),
+            })
+            try:
+                results = self.vision.analyze_images(
+                    [p.image_path for p in batch],
+                    image_sha256s=[p.capture.image_sha256 for p in batch],
+                    use_cache=use_cache,
+                    details=[detail_for_trigger(p.capture.trigger_type) for p in batch],
+                )
+            except VisionAnalysisError as e:
+                for p in batch:
+                    self._finish_barcodes(db, p)
+                logger.error("Batched vision analysis failed", extra={
+                    "capture_ids": [p.capture.id for p in batch],
+                    "error": str(e),
+                })
+                for p in batch:
+                    self._mark_failed(db, p.capture.id, f"Vision analysis error: {e}")
+                return completed
 
-                state = db.query(InventoryState).filter(
-                    InventoryState.item_id == inv_item.id
-                ).first()
+            for prepared, result in zip(batch, results):
+                capture_id = prepared.capture.id
+                try:
+                    self._finish_barcodes(db, prepared)
+                    self._checkpoint_vision(db, prepared, result)
+                    self._persist_result(db, prepared, result)
+                    completed.append(capture_id)
+                except Exception as e:
+                    logger.exception("Unexpected processing error", extra={
+                        "capture_id": capture_id,
+                        "error": str(e),
+                    })
+                    self._mark_failed(db, capture_id, str(e))
+            return completed
 
-                if state:
-                    delta = qty - (state.count_estimate or 0)
-                    state.count_estimate = qty
-                    state.confidence = conf
-                    state.last_seen_at = capture.captured_at
-                else:
-                    delta = qty
-                    state = InventoryState(
-                        item_id=inv_item.id,
-                        count_estimate=qty,
-                        confidence=conf,
-                        last_seen_at=capture.captured_at,
-                    )
-                    db.add(state)
+        finally:
+            db.close()
 
-                event = InventoryEvent(
-                    item_id=inv_item.id,
-                    capture_id=capture.id,
-                    event_type="seen",
-                    delta=delta,
-                    details={
-                        "confidence": conf,
-                        "trigger_type": capture.trigger_type,
-                    },
-                )
-                db.add(event)
-                items_updated += 1
+    def _prepare_capture(
+        self, db, capture_id: str, use_cache: bool, reprocess: bool = False,
+    ) -> Union["PreparedCapture", bool]:
+        """Claim a capture and run everything that precedes vision analysis.
 
-            # Update capture status
-            capture.status = "complete"
-            db.commit()
+        Returns a PreparedCapture when the image still needs analysis, or a bool
+        when processing already finished (True: near-duplicate or claimed by
+        another worker, False: failed).
+        """
+        from app.db.models import Capture
 
-            # Event-driven shopping-list notification (par-level check → Discord)
-            if items_updated > 0:
-                try:
-                    from app.workers.notify import notify_shopping_list
-                    notify_shopping_list.delay()
-                except Exception as notify_err:
-                    logger.warning("Failed to queue shopping-list notification", extra={
-                        "error": str(notify_err),
-                    })
+        capture = db.query(Capture).filter(Capture.id == capture_id).first()
+        if not capture:
+            logger.error("Capture not found", extra={"capture_id": capture_id})
+            return False
 
-            logger.info("Capture processed", extra={
+        reopened = capture.status in ("complete", "unchanged")
+        if not claim_capture(db, capture_id, reprocess=reprocess):
+            logger.info("Capture already claimed or finished, skipping", extra={
                 "capture_id": capture_id,
-                "items_found": len(result.items),
-                "items_updated": items_updated,
-                "scene_confidence": result.scene_confidence,
+                "status": capture.status,
             })
             return True
+        db.refresh(capture)
+        if reopened or not use_cache:
+            # Re-analysis (of a finished capture, or forced with use_cache=False) starts over
+            capture.pipeline_stage = None
+            capture.pipeline_checkpoint = None
+            db.commit()
+        elif capture.pipeline_stage:
+            logger.info("Resuming capture pipeline", extra={
+                "capture_id": capture_id,
+                "completed_stage": capture.pipeline_stage,
+            })
 
-        except VisionAnalysisError as e:
-            logger.error("Vision analysis failed", extra={
+        image_path = capture.image_path
+        if not os.path.isabs(image_path):
+            from app.services.storage import get_storage_manager
+            mgr = get_storage_manager()
+            image_path = str(mgr.storage_path / image_path)
+
+        if not os.path.exists(image_path):
+            logger.error("Image file not found", extra={
                 "capture_id": capture_id,
-                "error": str(e),
+                "image_path": image_path,
             })
             capture.status = "failed"
-            capture.error_message = f"Vision analysis error: {e}"
+            capture.error_message = f"Image file not found: {image_path}"
             db.commit()
             return False
 
+        # Near-duplicate suppression: a frame matching the device's last analyzed
+        # frame is linked to that observation instead of paying for analysis.
+        # Manual captures are explicit requests and always analyzed.
+        device = capture.device
+        if self._reached(capture, "preprocess"):
+            frame_hash = (capture.pipeline_checkpoint or {}).get("frame_hash")
+        else:
+            frame_hash = dhash(image_path)
+            self._checkpoint(db, capture, "preprocess", frame_hash=frame_hash)
+        if capture.trigger_type != "manual" and use_cache:
+            distance = match_previous_frame(device, frame_hash)
+            if distance is not None:
+                return self._mark_unchanged(db, capture, device, distance)
+
+        # Barcodes don't depend on vision: scan and look them up while it runs
+        barcode_scan = None
+        if not self._reached(capture, "barcode"):
+            barcode_scan = self._stage_pool.submit(self._scan_barcodes, capture_id, image_path)
+
+        # Local-first cascade (skipped for deliberate re-analysis, which wants the full frame)
+        cascade = None
+        if settings.VISION_CASCADE_ENABLED and use_cache:
+            try:
+                cascade = plan_cascade(db, capture.device_id, image_path)
+            except Exception as e:
+                logger.warning("Cascade planning failed, analyzing full frame", extra={
+                    "capture_id": capture_id,
+                    "error": str(e),
+                })
+        zones = []
+        if cascade is None and settings.VISION_ZONE_CROPS_ENABLED:
+            from app.services.zones import ZoneService
+            zones = ZoneService(db).get_zones_for_device(capture.device_id)
+        return PreparedCapture(
+            capture=capture, device=device, image_path=image_path, frame_hash=frame_hash,
+            cascade=cascade, zones=zones, barcode_scan=barcode_scan,
+        )
+
+    @staticmethod
+    def _reached(capture, stage: str) -> bool:
+        """Whether a previous attempt already completed `stage` for this capture."""
+        if not capture.pipeline_stage:
+            return False
+        return PIPELINE_STAGES.index(capture.pipeline_stage) >= PIPELINE_STAGES.index(stage)
+
+    @staticmethod
+    def _checkpoint(db, capture, stage: str, commit: bool = True, **results) -> None:
+        """Record `stage` as completed, merging its results into the checkpoint."""
+        checkpoint = dict(capture.pipeline_checkpoint or {})
+        checkpoint.update(results)
+        capture.pipeline_checkpoint = checkpoint
+        capture.pipeline_stage = stage
+        if commit:
+            db.commit()
+
+    def _run_vision(self, db, prepared: PreparedCapture, use_cache: bool) -> VisionOutput:
+        """The vision stage: reuse a checkpointed result, or analyze and checkpoint it."""
+        capture = prepared.capture
+        if self._reached(capture, "vision"):
+            checkpoint = capture.pipeline_checkpoint or {}
+            prepared.zone_hashes = checkpoint.get("zone_hashes") or {}
+            prepared.region_outputs = [VisionOutput(**o) for o in checkpoint.get("region_outputs") or []]
+            logger.info("Reusing checkpointed vision result", extra={"capture_id": capture.id})
+            return VisionOutput(**checkpoint["vision"])
+
+        logger.info("Running vision analysis", extra={
+            "capture_id": capture.id,
+            "provider": self.vision.provider,
+            "image_path": prepared.image_path,
+        })
+        try:
+            result = self._analyze_prepared(prepared, use_cache)
+        finally:
+            # Keep the barcode work even when vision fails, so a retry skips it
+            self._finish_barcodes(db, prepared)
+        self._checkpoint_vision(db, prepared, result)
+        return result
+
+    def _checkpoint_vision(self, db, prepared: PreparedCapture, result: VisionOutput) -> None:
+        self._checkpoint(
+            db, prepared.capture, "vision",
+            vision=result.model_dump(mode="json"),
+            zone_hashes=prepared.zone_hashes,
+            region_outputs=[o.model_dump(mode="json") for o in prepared.region_outputs],
+        )
+
+    def _analyze_prepared(self, prepared: PreparedCapture, use_cache: bool) -> VisionOutput:
+        """Full-frame analysis, the changed zone crops, or the cascade's unresolved crops."""
+        if prepared.zones:
+            return self._analyze_zones(prepared, use_cache)
+        plan = prepared.cascade
+        if plan is None:
+            return self.vision.analyze_image(
+                prepared.image_path,
+                image_sha256=prepared.capture.image_sha256,
+                use_cache=use_cache,
+                detail=detail_for_trigger(prepared.capture.trigger_type),
+            )
+        if plan.regions:
+            with tempfile.TemporaryDirectory(prefix="cascade-") as crop_dir:
+                crop_regions(prepared.image_path, plan.regions, crop_dir)
+                prepared.region_outputs = self.vision.analyze_images(
+                    [region.crop_path for region in plan.regions], use_cache=use_cache,
+                )
+        logger.info("Cascade resolved capture", extra={
+            "capture_id": prepared.capture.id,
+            "local_matches": len(plan.matches),
+            "llm_regions": len(plan.regions),
+        })
+        return merge_outputs(plan, prepared.region_outputs)
+
+    def _scan_barcodes(self, capture_id: str, image_path: str) -> List[Tuple[str, BarcodeProduct]]:
+        """Detect barcodes in the image and look them up in parallel.
+
+        Runs on the stage pool alongside vision, so it must not touch the session.
+        """
+        barcodes = detect_barcodes(image_path)
+        if not barcodes:
+            return []
+        codes = list(dict.fromkeys(b.data for b in barcodes))
+        logger.info("Barcode(s) detected in capture image", extra={
+            "capture_id": capture_id,
+            "count": len(barcodes),
+            "codes": codes,
+        })
+
+        def lookup(code: str) -> Tuple[str, Optional[BarcodeProduct]]:
+            try:
+                return code, lookup_barcode(code)
+            except Exception as bc_err:
+                logger.warning("Barcode product lookup failed", extra={
+                    "barcode": code,
+                    "error": str(bc_err),
+                })
+                return code, None
+
+        workers = max(1, min(len(codes), settings.BARCODE_LOOKUP_CONCURRENCY))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="barcode-lookup") as pool:
+            return list(pool.map(lookup, codes))
+
+    def _finish_barcodes(self, db, prepared: PreparedCapture) -> None:
+        """Join the barcode scan, cache any products it resolved and checkpoint the stage."""
+        from app.db.models import BarcodeLookup
+
+        if prepared.barcode_scan is None:
+            return
+        scan, prepared.barcode_scan = prepared.barcode_scan, None
+        try:
+            results = scan.result()
         except Exception as e:
-            logger.exception("Unexpected processing error", extra={
-                "capture_id": capture_id,
+            logger.warning("Barcode scan failed", extra={
+                "capture_id": prepared.capture.id,
                 "error": str(e),
             })
+            results = []
+
+        try:
+            found = [(code, product) for code, product in results if product is not None and product.found]
+            known = set()
+            if found:
+                known = {
+                    barcode for (barcode,) in
+                    db.query(BarcodeLookup.barcode).filter(BarcodeLookup.barcode.in_([c for c, _ in found]))
+                }
+            for code, product in found:
+                logger.info("Barcode resolved to product", extra={
+                    "barcode": code,
+                    "product": product.product_name,
+                })
+                if code not in known:
+                    db.add(BarcodeLookup(
+                        barcode=code,
+                        product_name=product.product_name,
+                        brand=product.brand,
+                        category=product.category,
+                        package_type=product.package_type,
+                        image_url=product.image_url,
+                        source=product.source,
+                    ))
+            self._checkpoint(db, prepared.capture, "barcode")
+        except Exception as e:
+            db.rollback()
+            logger.warning("Storing barcode lookups failed", extra={
+                "capture_id": prepared.capture.id,
+                "error": str(e),
+            })
+
+    def _analyze_zones(self, prepared: PreparedCapture, use_cache: bool) -> VisionOutput:
+        """Send only zones whose crop changed since that zone was last analyzed.
+
+        Manual captures and re-analysis send every zone.
+        """
+        force = not use_cache or prepared.capture.trigger_type == "manual"
+        threshold = threshold_for(prepared.device)
+        zones = {zone.id: zone for zone in prepared.zones}
+        with tempfile.TemporaryDirectory(prefix="zones-") as crop_dir:
+            crops = crop_zones(prepared.image_path, prepared.zones, crop_dir)
+            changed = [c for c in crops if force or zone_changed(c, zones[c.zone_id], threshold)]
+            logger.info("Zone crops selected", extra={
+                "capture_id": prepared.capture.id,
+                "zones": len(crops),
+                "changed": len(changed),
+            })
+            result = self.vision.analyze_zones(
+                changed, use_cache=use_cache, detail=detail_for_trigger(prepared.capture.trigger_type),
+            )
+        prepared.zone_hashes = {c.zone_id: c.frame_hash for c in changed}
+        return result
+
+    def _persist_result(self, db, prepared: "PreparedCapture", result: VisionOutput):
+        """Store the observation, update inventory and complete the capture (one commit).
+
+        Returns the new Observation.
+        """
+        from app.db.models import Observation
+
+        capture = prepared.capture
+        device = prepared.device
+
+        # Store observation
+        observation = Observation(
+            capture_id=capture.id,
+            raw_json=result.model_dump(mode="json"),
+            scene_confidence=result.scene_confidence,
+        )
+        db.add(observation)
+        items_updated, seen_item_ids = self._upsert_inventory(db, capture, result)
+        if items_updated > 0:
+            # Counts moved: bring just these items' shopping rows up to date
+            from app.services.shopping import sync_shopping_items
+            sync_shopping_items(db, seen_item_ids)
+
+        zone_item_ids = self._carry_unchanged_zones(db, prepared, result, seen_item_ids) if prepared.zones else None
+
+        # Remember this frame as the device's reference for near-duplicate checks.
+        # A zone pass where no zone changed observed nothing itself: keep the
+        # previous observation as the reference so later near-duplicates still
+        # refresh what is on the shelf. (A partial pass's checkpoint carries the
+        # unchanged zones' items over, so it stands for the whole shelf.)
+        if device is not None and prepared.frame_hash:
+            device.last_frame_hash = prepared.frame_hash
+            if not (prepared.zones and not prepared.zone_hashes):
+                device.last_observation_id = observation.id
+
+        if prepared.cascade is not None:
+            self._record_zone_detections(db, prepared, observation)
+        for zone in prepared.zones:
+            if zone.id in prepared.zone_hashes:
+                zone.last_frame_hash = prepared.zone_hashes[zone.id]
+
+        # Update capture status
+        capture.status = "complete"
+        self._checkpoint(
+            db, capture, "persist", observation_id=observation.id, seen_item_ids=seen_item_ids,
+            **({"zone_item_ids": zone_item_ids} if zone_item_ids is not None else {}),
+        )
+
+        if prepared.cascade is not None:
+            self._learn_zone_patterns(db, prepared)
+
+        # Dashboard grid tile, so the first page view doesn't pay for the resize
+        if settings.IMAGE_PREGENERATE_THUMBS:
             try:
+                from app.services.image_sizes import get_derivative_cache
+                get_derivative_cache().get(prepared.image_path, "thumb")
+            except Exception as thumb_err:
+                logger.warning("Thumbnail pre-generation failed", extra={
+                    "capture_id": capture.id,
+                    "error": str(thumb_err),
+                })
+
+        # Event-driven shopping-list notification (par-level check → Discord)
+        if items_updated > 0:
+            try:
+                from app.workers.notify import request_shopping_list_notify
+                request_shopping_list_notify()
+            except Exception as notify_err:
+                logger.warning("Failed to queue shopping-list notification", extra={
+                    "error": str(notify_err),
+                })
+        self._checkpoint(db, capture, "notify")
+
+        logger.info("Capture processed", extra={
+            "capture_id": capture.id,
+            "items_found": len(result.items),
+            "items_updated": items_updated,
+            "scene_confidence": result.scene_confidence,
+        })
+        return observation
+
+    def _carry_unchanged_zones(self, db, prepared: PreparedCapture, result: VisionOutput, seen_item_ids: List[str]) -> dict:
+        """Zone id -> item ids across the whole shelf after a zone pass.
+
+        Zones sent this time take the items vision applied from their crops.
+        Zones left out (crop unchanged) keep the reference observation's items,
+        and those items get their last_seen_at refreshed the way _mark_unchanged
+        does, since they are still on the shelf.
+        """
+        from app.db.models import Capture, InventoryItem, InventoryState, Observation
+
+        seen = set(seen_item_ids)
+        names = {
+            zone_id: [name.lower().replace("  ", " ").strip() for name in zone_names]
+            for zone_id, zone_names in (result.zone_items or {}).items()
+        }
+        wanted = {name for zone_names in names.values() for name in zone_names}
+        ids_by_name = {}
+        if wanted:
+            ids_by_name = dict(
+                db.query(InventoryItem.canonical_name, InventoryItem.id)
+                .filter(InventoryItem.canonical_name.in_(wanted))
+            )
+        sent = {
+            zone_id: list(dict.fromkeys(
+                ids_by_name[name] for name in zone_names if ids_by_name.get(name) in seen
+            ))
+            for zone_id, zone_names in names.items()
+        }
+
+        reference = None
+        device = prepared.device
+        if device is not None and device.last_observation_id:
+            reference = (
+                db.query(Capture.pipeline_checkpoint)
+                .join(Observation, Observation.capture_id == Capture.id)
+                .filter(Observation.id == device.last_observation_id)
+                .scalar()
+            )
+        zone_ids = {zone.id for zone in prepared.zones}
+        carried = {
+            zone_id: item_ids
+            for zone_id, item_ids in ((reference or {}).get("zone_item_ids") or {}).items()
+            if zone_id in zone_ids and zone_id not in sent
+        }
+        stale = {item_id for item_ids in carried.values() for item_id in item_ids} - seen
+        if stale:
+            db.query(InventoryState).filter(InventoryState.item_id.in_(stale)).update(
+                {InventoryState.last_seen_at: prepared.capture.captured_at}, synchronize_session=False,
+            )
+        return {**carried, **sent}
+
+    def _upsert_inventory(self, db, capture, result: VisionOutput) -> Tuple[int, List[str]]:
+        """Apply the detected items to inventory with a fixed number of queries.
+
+        Names are normalized up front; existing items and their states are loaded
+        with one IN query each, and new items, states and events go out in a
+        single flush (the caller commits).
+
+        With INVENTORY_SUPPRESS_UNCHANGED_EVENTS, a sighting whose count didn't
+        change writes no event; its last_seen_at/confidence are refreshed at most
+        every INVENTORY_LAST_SEEN_COALESCE_SECONDS, and the capture counts it in
+        suppressed_events. Returns (events written, ids of every item seen).
+        """
+        from app.db.models import InventoryItem, InventoryState, InventoryEvent
+
+        detected = []
+        for item_data in result.items:
+            name = (item_data.name or "").strip()
+            if not name:
+                continue
+            conf = item_data.confidence or 0.5
+            if conf < 0.7:
+                logger.info("Skipping low-confidence item", extra={
+                    "capture_id": capture.id,
+                    "item": name,
+                    "confidence": conf,
+                })
+                continue
+            canonical = name.lower().replace("  ", " ").strip()
+            detected.append((item_data, canonical, item_data.quantity_estimate or 1, conf))
+        if not detected:
+            db.flush()
+            return 0, []
+
+        names = list(dict.fromkeys(canonical for _, canonical, _, _ in detected))
+        items = {
+            item.canonical_name: item
+            for item in db.query(InventoryItem).filter(InventoryItem.canonical_name.in_(names))
+        }
+        for item_data, canonical, _, _ in detected:
+            if canonical not in items:
+                items[canonical] = InventoryItem(
+                    id=str(uuid.uuid4()),
+                    canonical_name=canonical,
+                    brand=item_data.brand,
+                    package_type=item_data.package_type or "other",
+                )
+                db.add(items[canonical])
+
+        states = {}
+        for state in db.query(InventoryState).filter(
+            InventoryState.item_id.in_([item.id for item in items.values()])
+        ):
+            states.setdefault(state.item_id, state)
+
+        suppress = settings.INVENTORY_SUPPRESS_UNCHANGED_EVENTS
+        coalesce = timedelta(seconds=settings.INVENTORY_LAST_SEEN_COALESCE_SECONDS)
+        seen_at = _utc_naive(capture.captured_at)
+        events = []
+        suppressed = 0
+        for item_data, canonical, qty, conf in detected:
+            inv_item = items[canonical]
+            state = states.get(inv_item.id)
+
+            if suppress and state is not None and qty == (state.count_estimate or 0):
+                # Unchanged sighting: no event, and only an occasional last-seen write
+                suppressed += 1
+                last_seen = _utc_naive(state.last_seen_at)
+                if last_seen is None or seen_at - last_seen >= coalesce:
+                    state.last_seen_at = capture.captured_at
+                    state.confidence = conf
+                    inv_item.image_path = capture.image_path
+                continue
+
+            # Propagate the capture image to the inventory item
+            # Always update to the latest capture so the photo stays fresh
+            inv_item.image_path = capture.image_path
+
+            if state:
+                delta = qty - (state.count_estimate or 0)
+                state.count_estimate = qty
+                state.confidence = conf
+                state.last_seen_at = capture.captured_at
+            else:
+                delta = qty
+                state = InventoryState(
+                    item_id=inv_item.id,
+                    count_estimate=qty,
+                    confidence=conf,
+                    last_seen_at=capture.captured_at,
+                )
+                states[inv_item.id] = state
+                db.add(state)
+
+            events.append(InventoryEvent(
+                item_id=inv_item.id,
+                capture_id=capture.id,
+                event_type="seen",
+                delta=delta,
+                details={
+                    "confidence": conf,
+                    "trigger_type": capture.trigger_type,
+                    **({"zone_id": item_data.zone_id} if item_data.zone_id else {}),
+                },
+            ))
+        db.add_all(events)
+        capture.suppressed_events = suppressed
+        db.flush()
+        return len(events), list(dict.fromkeys(items[canonical].id for _, canonical, _, _ in detected))
+
+    def _record_zone_detections(self, db, prepared: PreparedCapture, observation) -> None:
+        """Keep the cascade's detections (and local inferences) against the observation."""
+        from app.db.models import ZoneDetection
+
+        plan = prepared.cascade
+        rows = [(m.detection, m.zone_id, m.item.id, m.confidence) for m in plan.matches]
+        rows += [(r.detection, r.zone_id, None, None) for r in plan.regions]
+        for det, zone_id, item_id, inference_confidence in rows:
+            db.add(ZoneDetection(
+                observation_id=observation.id,
+                zone_id=zone_id,
+                detected_class=det.class_name,
+                confidence=det.confidence,
+                bbox_x=det.x,
+                bbox_y=det.y,
+                bbox_w=det.width,
+                bbox_h=det.height,
+                inferred_item_id=item_id,
+                inference_confidence=inference_confidence,
+            ))
+
+    def _learn_zone_patterns(self, db, prepared: PreparedCapture) -> None:
+        """Teach each zone what the LLM found in its crop, so next time it resolves locally."""
+        from app.db.models import InventoryItem
+        from app.services.zones import ZoneService
+
+        zone_service = ZoneService(db)
+        for region, output in zip(prepared.cascade.regions, prepared.region_outputs):
+            if region.zone_id is None:
+                continue
+            for item_data in output.items:
+                if (item_data.confidence or 0) < 0.7 or not (item_data.name or "").strip():
+                    continue
+                canonical = item_data.name.lower().replace("  ", " ").strip()
+                inv_item = db.query(InventoryItem).filter(InventoryItem.canonical_name == canonical).first()
+                if inv_item is None:
+                    continue
+                try:
+                    zone_service.update_pattern(
+                        region.zone_id, inv_item.id,
+                        quantity=item_data.quantity_estimate or 1,
+                        confidence=item_data.confidence,
+                    )
+                except Exception as e:
+                    db.rollback()
+                    logger.warning("Zone pattern update failed", extra={
+                        "zone_id": region.zone_id,
+                        "error": str(e),
+                    })
+
+    def _mark_failed(self, db, capture_id: str, message: str) -> None:
+        from app.db.models import Capture
+
+        try:
+            db.rollback()
+            capture = db.query(Capture).filter(Capture.id == capture_id).first()
+            if capture:
                 capture.status = "failed"
-                capture.error_message = str(e)
+                capture.error_message = message
                 db.commit()
-            except Exception:
-                pass
-            return False
+        except Exception:
+            pass
 
-        finally:
-            db.close()
+    def _mark_unchanged(self, db, capture, device, distance: int) -> bool:
+        """Complete a near-duplicate capture without calling the vision provider."""
+        from sqlalchemy import select
+        from app.db.models import Capture, Observation, InventoryEvent, InventoryState
+
+        capture.status = "unchanged"
+        capture.reference_observation_id = device.last_observation_id
+
+        # The shelf still holds what the reference frame showed: refresh last_seen_at
+        # so those items don't go stale, without writing new events. The reference
+        # capture's persist checkpoint lists every item it saw (events alone miss
+        # suppressed sightings); older captures fall back to their events.
+        reference = (
+            db.query(Capture.id, Capture.pipeline_checkpoint)
+            .join(Observation, Observation.capture_id == Capture.id)
+            .filter(Observation.id == device.last_observation_id)
+            .first()
+        )
+        checkpoint = (reference.pipeline_checkpoint or {}) if reference else {}
+        seen_item_ids = checkpoint.get("seen_item_ids")
+        if seen_item_ids is not None:
+            # A zone pass also stands for the zones it carried over unchanged
+            zone_item_ids = checkpoint.get("zone_item_ids") or {}
+            seen_item_ids = list(dict.fromkeys(
+                seen_item_ids + [item_id for item_ids in zone_item_ids.values() for item_id in item_ids]
+            ))
+        else:
+            seen_item_ids = select(InventoryEvent.item_id).where(
+                InventoryEvent.capture_id == (reference.id if reference else None)
+            )
+        refreshed = (
+            db.query(InventoryState)
+            .filter(InventoryState.item_id.in_(seen_item_ids))
+            .update({InventoryState.last_seen_at: capture.captured_at}, synchronize_session=False)
+        )
+        db.commit()
+
+        logger.info("Capture unchanged from previous frame, vision skipped", extra={
+            "capture_id": capture.id,
+            "device_id": capture.device_id,
+            "distance": distance,
+            "reference_observation_id": capture.reference_observation_id,
+            "items_refreshed": refreshed,
+        })
+        return True
 
     def process_pending_captures(self, limit: int = 50) -> int:
         """Process stored captures synchronously, mainly for maintenance/tests."""
@@ -245,8 +829,30 @@ class CaptureProcessor:
         finally:
             db.close()
 
+        # Deep backlog: amortise the prompt over several images per provider call
+        if self.vision.supports_batch and len(capture_ids) >= settings.VISION_BATCH_MIN_BACKLOG:
+            size = max(1, settings.VISION_BATCH_SIZE)
+            processed = 0
+            for start in range(0, len(capture_ids), size):
+                processed += len(self.process_captures_batch(capture_ids[start:start + size]))
+            return processed
+
         processed = 0
         for capture_id in capture_ids:
             if self.process_capture(capture_id):
                 processed += 1
         return processed
+
+
+# Per-worker-process instance (built on worker_process_init, reused across tasks)
+_processor = None
+
+
+def get_capture_processor() -> CaptureProcessor:
+    """Get or create the capture processor singleton for this process."""
+    global _processor
+    if _processor is None:
+        _processor = CaptureProcessor()
+    else:
+        _processor.refresh()
+    return _processor
@@ -39,9 +39,42 @@ celery_app.conf.beat_schedule = {
         "task": "app.workers.celery_app.enforce_image_retention",
         "schedule": crontab(hour=3, minute=0),  # daily at 03:00 UTC
     },
+    "reclaim-expired-capture-leases": {
+        "task": "app.workers.celery_app.reclaim_expired_leases",
+        "schedule": crontab(minute="*/5"),
+    },
+    "sweep-shopping-list": {
+        "task": "app.workers.notify.sweep_shopping_list",
+        "schedule": crontab(minute="*/30"),
+    },
+    "prune-sync-change-log": {
+        "task": "app.workers.celery_app.prune_sync_change_log",
+        "schedule": crontab(minute=15),  # hourly
+    },
 }
 
 
+from celery.signals import worker_process_init  # noqa: E402
+
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    """Per-process setup after fork.
+
+    Drops DB connections inherited from the parent and builds the capture
+    processor once, so every task reuses its analyzer and HTTP connection pool.
+    """
+    from app.db.session import engine
+    engine.dispose()
+    try:
+        from app.workers.capture import get_capture_processor
+        get_capture_processor()
+        logger.info("Capture processor initialized for worker process")
+    except Exception as e:
+        # Tasks will retry initialisation lazily
+        logger.error("Capture processor init failed", extra={"error": str(e)})
+
+
 class DatabaseTask(Task):
     """Task with database session management."""
 
@@ -68,19 +101,47 @@ class DatabaseTask(Task):
         super().on_success(retval, task_id, args, kwargs)
 
 
+def enqueue_capture(capture_id: str, use_cache: bool = True, reprocess: bool = False):
+    """Queue a capture for analysis unless it is already queued.
+
+    Returns the AsyncResult, or None when an enqueue is already pending.
+    Deliberate re-analysis (use_cache=False) always queues; the claim in the
+    worker still keeps it from running alongside another attempt.
+    """
+    from app.workers.claims import get_enqueue_dedup
+
+    marked = use_cache
+    if marked and not get_enqueue_dedup().mark(capture_id):
+        logger.info("Capture already queued, skipping", extra={"capture_id": capture_id})
+        return None
+    try:
+        return process_image_capture.delay(capture_id, use_cache=use_cache, reprocess=reprocess)
+    except Exception:
+        # Nothing was queued: drop the mark so the next enqueue is not skipped
+        if marked:
+            get_enqueue_dedup().clear(capture_id)
+        raise
+
+
 @celery_app.task(bind=True, base=DatabaseTask, max_retries=settings.MAX_RETRIES)
-def process_image_capture(self, capture_id: str) -> dict:
-    """Process a single image capture asynchronously."""
+def process_image_capture(self, capture_id: str, use_cache: bool = True, reprocess: bool = False) -> dict:
+    """Process a single image capture asynchronously.
+
+    use_cache=False forces a fresh vision call (deliberate re-analysis);
+    reprocess=True allows reopening a finished capture.
+    """
     from app.db.session import SessionLocal
     from app.db.models import Capture
-    from app.workers.capture import CaptureProcessor
+    from app.workers.capture import get_capture_processor
+    from app.workers.claims import get_enqueue_dedup
 
     logger.info("Processing capture", extra={"capture_id": capture_id})
+    get_enqueue_dedup().clear(capture_id)
     db = None
     try:
         db = SessionLocal()
-        processor = CaptureProcessor()
-        success = processor.process_capture(capture_id)
+        processor = get_capture_processor()
+        success = processor.process_capture(capture_id, use_cache=use_cache, reprocess=reprocess)
 
         if success:
             logger.info("Capture processed successfully", extra={"capture_id": capture_id})
@@ -109,28 +170,85 @@ def process_image_capture(self, capture_id: str) -> dict:
             db.close()
 
 
+@celery_app.task(bind=True, base=DatabaseTask, max_retries=settings.MAX_RETRIES)
+def process_capture_batch(self, capture_ids: list) -> dict:
+    """Process several captures with one batched vision request.
+
+    Captures that fail are re-queued individually so they get the normal
+    per-capture retry/backoff instead of retrying the whole batch.
+    """
+    from app.workers.capture import get_capture_processor
+    from app.workers.claims import get_enqueue_dedup
+
+    logger.info("Processing capture batch", extra={"batch_size": len(capture_ids)})
+    dedup = get_enqueue_dedup()
+    for capture_id in capture_ids:
+        dedup.clear(capture_id)
+    processor = get_capture_processor()
+    completed = processor.process_captures_batch(capture_ids)
+
+    failed = [capture_id for capture_id in capture_ids if capture_id not in completed]
+    for capture_id in failed:
+        try:
+            enqueue_capture(capture_id)
+        except Exception as e:
+            logger.error("Failed to re-queue capture", extra={
+                "capture_id": capture_id,
+                "error": str(e),
+            })
+    return {"completed": len(completed), "requeued": len(failed), "status": "completed"}
+
+
 @celery_app.task(bind=True, base=DatabaseTask, max_retries=settings.MAX_RETRIES)
 def process_pending_captures(self) -> dict:
-    """Process all pending image captures in batch."""
+    """Process all pending image captures in batch.
+
+    A backlog of VISION_BATCH_MIN_BACKLOG or more is queued as multi-image
+    batches (when the provider supports them); otherwise one task per capture.
+    """
     from app.db.session import SessionLocal
     from app.db.models import Capture
+    from app.workers.capture import get_capture_processor
+    from app.workers.claims import expired_lease_ids, get_enqueue_dedup
 
     db = None
     try:
         db = SessionLocal()
-        pending = db.query(Capture).filter(Capture.status == "stored").all()
+        stored = [
+            capture_id for (capture_id,) in
+            db.query(Capture.id)
+            .filter(Capture.status == "stored")
+            .order_by(Capture.created_at.asc())
+        ]
+        # Skip anything already waiting in the queue; abandoned leases are picked up again
+        dedup = get_enqueue_dedup()
+        pending = [
+            capture_id for capture_id in stored + expired_lease_ids(db)
+            if dedup.mark(capture_id)
+        ]
+        batched = (
+            len(pending) >= settings.VISION_BATCH_MIN_BACKLOG
+            and get_capture_processor().vision.supports_batch
+        )
+        size = max(1, settings.VISION_BATCH_SIZE) if batched else 1
         processed_count = 0
-        for capture in pending:
+        for start in range(0, len(pending), size):
+            chunk = pending[start:start + size]
             try:
-                process_image_capture.delay(capture.id)
-                processed_count += 1
+                if batched:
+                    process_capture_batch.delay(chunk)
+                else:
+                    process_image_capture.delay(chunk[0])
+                processed_count += len(chunk)
             except Exception as e:
                 logger.error("Failed to queue capture", extra={
-                    "capture_id": capture.id,
+                    "capture_ids": chunk,
                     "error": str(e),
                 })
-        logger.info("Batch queued", extra={"queued": processed_count})
-        return {"queued_count": processed_count, "status": "queued"}
+                for capture_id in chunk:
+                    dedup.clear(capture_id)
+        logger.info("Batch queued", extra={"queued": processed_count, "batched": batched})
+        return {"queued_count": processed_count, "batched": batched, "status": "queued"}
     except Exception as exc:
         logger.error("Batch processing error", extra={"error": str(exc)})
         raise self.retry(exc=exc, countdown=min(2 ** self.request.retries, 600))
@@ -139,6 +257,48 @@ def process_pending_captures(self) -> dict:
             db.close()
 
 
+@celery_app.task
+def reclaim_expired_leases() -> dict:
+    """Periodic task: re-queue captures whose worker died mid-analysis."""
+    from app.db.session import SessionLocal
+    from app.workers.claims import expired_lease_ids
+
+    db = SessionLocal()
+    try:
+        expired = expired_lease_ids(db)
+    finally:
+        db.close()
+
+    requeued = 0
+    for capture_id in expired:
+        try:
+            if enqueue_capture(capture_id) is not None:
+                requeued += 1
+        except Exception as e:
+            logger.error("Failed to re-queue expired capture", extra={
+                "capture_id": capture_id,
+                "error": str(e),
+            })
+    if expired:
+        logger.warning("Reclaimed expired capture leases", extra={"expired": len(expired), "requeued": requeued})
+    return {"expired": len(expired), "requeued": requeued, "status": "completed"}
+
+
+@celery_app.task
+def prune_sync_change_log() -> dict:
+    """Periodic task: drop /v1/sync change-log entries past SYNC_LOG_RETENTION_HOURS."""
+    from app.db.session import SessionLocal
+    from app.services.sync import prune_change_log
+
+    db = SessionLocal()
+    try:
+        deleted = prune_change_log(db)
+    finally:
+        db.close()
+    logger.info("Pruned sync change log", extra={"deleted": deleted})
+    return {"deleted": deleted, "status": "completed"}
+
+
 @celery_app.task(bind=True, base=DatabaseTask, max_retries=settings.MAX_RETRIES)
 def enforce_image_retention(self) -> dict:
     """Periodic task: enforce image retention policy (delete images older than IMAGE_RETENTION_DAYS)."""
@@ -0,0 +1,147 @@
+"""Capture claiming and enqueue de-duplication.
+
+A capture can be queued from several places (ingest, manual capture, the
+pending sweep, review approval, admin reprocessing). Two guards make sure
+each one is analyzed once:
+
+* enqueue_capture() sets a Redis key per capture id (SET NX with a TTL)
+  and skips the enqueue if one is already pending.
+* claim_capture() is a conditional UPDATE that flips the capture to
+  `analyzing` with a lease. Only one worker's UPDATE matches. A lease that
+  outlives CAPTURE_LEASE_SECONDS (crashed worker) can be claimed again and
+  is picked up by reclaim_expired_leases().
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import and_, or_
+
+from app.config import settings
+
+logger = logging.getLogger("pantry-worker.claims")
+
+CLAIMABLE_STATUSES = ("stored", "failed")
+# Deliberate reprocessing (admin re-analysis, review approval) may also reopen finished captures
+REPROCESSABLE_STATUSES = CLAIMABLE_STATUSES + ("complete", "unchanged")
+
+_DEDUP_PREFIX = "capture:enqueued:"
+
+
+def _lease_expired(now: datetime):
+    from app.db.models import Capture
+
+    # No lease on an analyzing row means it predates leases: treat as abandoned
+    return and_(
+        Capture.status == "analyzing",
+        or_(Capture.lease_until.is_(None), Capture.lease_until < now),
+    )
+
+
+def claim_capture(db, capture_id: str, reprocess: bool = False) -> bool:
+    """Atomically move a capture to `analyzing` under a fresh lease.
+
+    Returns False when another worker holds a live lease or the capture is
+    already finished (and this isn't a deliberate reprocess).
+    """
+    from app.db.models import Capture
+
+    now = datetime.utcnow()
+    statuses = REPROCESSABLE_STATUSES if reprocess else CLAIMABLE_STATUSES
+    claimed = (
+        db.query(Capture)
+        .filter(Capture.id == capture_id)
+        .filter(or_(Capture.status.in_(statuses), _lease_expired(now)))
+        .update(
+            {
+                Capture.status: "analyzing",
+                Capture.lease_until: now + timedelta(seconds=settings.CAPTURE_LEASE_SECONDS),
+            },
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return claimed == 1
+
+
+def expired_lease_ids(db, limit: int = 500) -> List[str]:
+    """Captures stuck in `analyzing` whose lease has run out."""
+    from app.db.models import Capture
+
+    return [
+        capture_id for (capture_id,) in
+        db.query(Capture.id)
+        .filter(_lease_expired(datetime.utcnow()))
+        .order_by(Capture.created_at.asc())
+        .limit(limit)
+    ]
+
+
+class EnqueueDedup:
+    """Per-capture "already queued" markers in Redis, with an in-memory fallback."""
+
+    def __init__(self):
+        self._redis = None
+        self._redis_attempted = False
+        self._mem: dict = {}
+        self._lock = threading.Lock()
+
+    def _get_redis(self):
+        if self._redis_attempted:
+            return self._redis
+        self._redis_attempted = True
+        try:
+            import redis
+            self._redis = redis.from_url(
+                settings.REDIS_URL,
+                socket_connect_timeout=2,
+                socket_timeout=2,
+                decode_responses=True,
+            )
+            self._redis.ping()
+        except Exception as e:
+            logger.warning("Redis enqueue dedup unavailable, using in-memory fallback", extra={"error": str(e)})
+            self._redis = None
+        return self._redis
+
+    def mark(self, capture_id: str) -> bool:
+        """Record a pending enqueue; False if one is already pending."""
+        ttl = settings.CAPTURE_ENQUEUE_DEDUP_SECONDS
+        r = self._get_redis()
+        if r:
+            try:
+                return bool(r.set(f"{_DEDUP_PREFIX}{capture_id}", "1", nx=True, ex=ttl))
+            except Exception as e:
+                logger.warning("Redis enqueue dedup failed, falling back", extra={"error": str(e)})
+        now = time.monotonic()
+        with self._lock:
+            expires = self._mem.get(capture_id)
+            if expires is not None and expires > now:
+                return False
+            self._mem[capture_id] = now + ttl
+            return True
+
+    def clear(self, capture_id: str) -> None:
+        r = self._get_redis()
+        if r:
+            try:
+                r.delete(f"{_DEDUP_PREFIX}{capture_id}")
+                return
+            except Exception as e:
+                logger.warning("Redis enqueue dedup clear failed", extra={"error": str(e)})
+        with self._lock:
+            self._mem.pop(capture_id, None)
+
+
+# Global instance
+_enqueue_dedup = None
+
+
+def get_enqueue_dedup() -> EnqueueDedup:
+    """Get or create the per-process enqueue dedup store."""
+    global _enqueue_dedup
+    if _enqueue_dedup is None:
+        _enqueue_dedup = EnqueueDedup()
+    return _enqueue_dedup
@@ -3,11 +3,24 @@
 Event-driven: fired by inventory changes (capture processed, count overridden).
 Posts to the configured Discord webhook ONLY when items are below par.
 No scheduler, no cron — pantry reacts to its own state.
+
+Triggers go through request_shopping_list_notify(), which debounces them: the
+first trigger in a NOTIFY_DEBOUNCE_SECONDS window schedules one run at the end
+of the window and later ones fold into it. Runs are single-flight (Redis lock)
+and skip the webhook when the rendered list is identical to the last one posted.
+
+Shopping rows themselves are maintained incrementally as counts change (see
+app.services.shopping); sweep_shopping_list re-derives them periodically.
 """
+import hashlib
 import json
 import os
+import threading
+import time
 import urllib.request
+import uuid
 
+from app.config import settings
 from app.log_config import setup_logging
 from app.workers.celery_app import celery_app
 from app.db.session import SessionLocal
@@ -17,6 +30,143 @@ logger = setup_logging("pantry-notify")
 
 WEBHOOK_URL = os.getenv("PANTRY_DISCORD_WEBHOOK", "").strip()
 
+_PENDING_KEY = "notify:shopping:pending"
+_LOCK_KEY = "notify:shopping:lock"
+_HASH_KEY = "notify:shopping:last_hash"
+_EMPTY_LIST_HASH = "empty"
+
+# Delete the lock only while it still holds our token; a run that outlived the
+# TTL must not release the lock a newer run has taken since
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class NotifyState:
+    """Debounce marker, run lock and last-posted hash in Redis, with an in-memory fallback."""
+
+    def __init__(self):
+        self._redis = None
+        self._redis_attempted = False
+        self._mem: dict = {}
+        self._lock = threading.Lock()
+
+    def _get_redis(self):
+        if self._redis_attempted:
+            return self._redis
+        self._redis_attempted = True
+        try:
+            import redis
+            self._redis = redis.from_url(
+                settings.REDIS_URL,
+                socket_connect_timeout=2,
+                socket_timeout=2,
+                decode_responses=True,
+            )
+            self._redis.ping()
+        except Exception as e:
+            logger.warning("Redis notify state unavailable, using in-memory fallback", extra={"error": str(e)})
+            self._redis = None
+        return self._redis
+
+    def set_once(self, key: str, value: str, ttl: float) -> bool:
+        """SET NX with a TTL; False if the key is already held."""
+        r = self._get_redis()
+        if r:
+            try:
+                return bool(r.set(key, value, nx=True, px=int(ttl * 1000)))
+            except Exception as e:
+                logger.warning("Redis notify state write failed, falling back", extra={"error": str(e)})
+        now = time.monotonic()
+        with self._lock:
+            held = self._mem.get(key)
+            if held is not None and (held[1] is None or held[1] > now):
+                return False
+            self._mem[key] = (value, now + ttl)
+            return True
+
+    def get(self, key: str):
+        r = self._get_redis()
+        if r:
+            try:
+                return r.get(key)
+            except Exception as e:
+                logger.warning("Redis notify state read failed, falling back", extra={"error": str(e)})
+        with self._lock:
+            held = self._mem.get(key)
+            if held is None or (held[1] is not None and held[1] <= time.monotonic()):
+                return None
+            return held[0]
+
+    def set(self, key: str, value: str) -> None:
+        r = self._get_redis()
+        if r:
+            try:
+                r.set(key, value)
+                return
+            except Exception as e:
+                logger.warning("Redis notify state write failed, falling back", extra={"error": str(e)})
+        with self._lock:
+            self._mem[key] = (value, None)
+
+    def delete(self, key: str) -> None:
+        r = self._get_redis()
+        if r:
+            try:
+                r.delete(key)
+                return
+            except Exception as e:
+                logger.warning("Redis notify state delete failed, falling back", extra={"error": str(e)})
+        with self._lock:
+            self._mem.pop(key, None)
+
+    def release(self, key: str, token: str) -> bool:
+        """Compare-and-delete: drop the key only if it still holds token."""
+        r = self._get_redis()
+        if r:
+            try:
+                return bool(r.eval(_RELEASE_SCRIPT, 1, key, token))
+            except Exception as e:
+                logger.warning("Redis notify lock release failed, falling back", extra={"error": str(e)})
+        with self._lock:
+            held = self._mem.get(key)
+            if held is None or held[0] != token:
+                return False
+            del self._mem[key]
+            return True
+
+
+# Global instance
+_notify_state = None
+
+
+def get_notify_state() -> NotifyState:
+    """Get or create the per-process notify state store."""
+    global _notify_state
+    if _notify_state is None:
+        _notify_state = NotifyState()
+    return _notify_state
+
+
+def request_shopping_list_notify() -> bool:
+    """Ask for a shopping-list recompute + notification, debounced.
+
+    Returns True when this call scheduled the run, False when it was folded
+    into one already pending.
+    """
+    window = settings.NOTIFY_DEBOUNCE_SECONDS
+    if not get_notify_state().set_once(_PENDING_KEY, "1", window + settings.NOTIFY_LOCK_SECONDS):
+        return False
+    try:
+        notify_shopping_list.apply_async(countdown=window)
+    except Exception:
+        get_notify_state().delete(_PENDING_KEY)
+        raise
+    return True
+
 
 def _post_webhook(payload: dict) -> bool:
     """Post a JSON payload to the Discord webhook. Returns True on 2xx."""
@@ -43,13 +193,27 @@ def _post_webhook(payload: dict) -> bool:
 
 @celery_app.task(bind=True, base=celery_app.Task, max_retries=3)
 def notify_shopping_list(self) -> dict:
-    """Recompute the shopping list; notify Discord if anything is below par."""
+    """Notify Discord of the shopping list if anything is below par.
+
+    Use request_shopping_list_notify() to trigger this; it debounces bursts.
+    """
+    state = get_notify_state()
+    token = self.request.id or uuid.uuid4().hex
+    if not state.set_once(_LOCK_KEY, token, settings.NOTIFY_LOCK_SECONDS):
+        # Another run is in flight and may have read the state before this trigger: go again later
+        logger.info("Shopping list notify already running, re-arming")
+        state.delete(_PENDING_KEY)
+        request_shopping_list_notify()
+        return {"status": "deferred"}
+    # Triggers from here on schedule a fresh run rather than folding into this one
+    state.delete(_PENDING_KEY)
+
     db = SessionLocal()
     try:
-        updated = recompute_shopping_list(db)
         items = get_unresolved_items(db)
 
         if not items:
+            state.set(_HASH_KEY, _EMPTY_LIST_HASH)
             logger.info("Shopping list empty — nothing below par, no notification")
             return {"status": "ok", "below_par": 0, "notified": False}
 
@@ -63,10 +227,18 @@ def notify_shopping_list(self) -> dict:
                 + "\n".join(lines)
             )
         }
+        list_hash = hashlib.sha256(payload["content"].encode("utf-8")).hexdigest()
+        if state.get(_HASH_KEY) == list_hash:
+            logger.info("Shopping list unchanged since last notification, not posting", extra={
+                "below_par": len(items),
+            })
+            return {"status": "ok", "below_par": len(items), "notified": False, "unchanged": True}
+
         notified = _post_webhook(payload)
+        if notified:
+            state.set(_HASH_KEY, list_hash)
         logger.info("Shopping list notify complete", extra={
             "below_par": len(items),
-            "recomputed": updated,
             "notified": notified,
         })
         return {"status": "ok", "below_par": len(items), "notified": notified}
@@ -75,3 +247,25 @@ def notify_shopping_list(self) -> dict:
         raise self.retry(exc=exc, countdown=min(2 ** self.request.retries, 60))
     finally:
         db.close()
+        state.release(_LOCK_KEY, token)
+
+
+@celery_app.task
+def sweep_shopping_list() -> dict:
+    """Periodic task: re-derive the shopping list from par levels in one pass.
+
+    Catches anything the incremental updates missed (bulk imports, direct DB
+    edits); notifies only when the sweep actually changed something.
+    """
+    db = SessionLocal()
+    try:
+        written = recompute_shopping_list(db)
+    finally:
+        db.close()
+    if written:
+        logger.warning("Shopping list sweep corrected drift", extra={"rows": written})
+        try:
+            request_shopping_list_notify()
+        except Exception as e:
+            logger.warning("Failed to queue shopping-list notification", extra={"error": str(e)})
+    return {"rows": written, "status": "completed"}
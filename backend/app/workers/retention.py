@@ -48,7 +48,8 @@ class RetentionPolicyEnforcer:
             
             # Find captures older than retention period
             old_captures = db.query(Capture).filter(
-                Capture.captured_at < cutoff_date
+                Capture.captured_at < cutoff_date,
+                Capture.image_path != "",
             ).all()
             
             logger.info(f"Found {len(old_captures)} captures to process")
@@ -58,14 +59,14 @@ class RetentionPolicyEnforcer:
                     # Get image size before deletion
                     image_size = self.storage_manager.get_image_size(capture.image_path)
                     
-                    # Delete image file
-                    if self.storage_manager.delete_image(capture.image_path):
+                    # Drop this capture's reference; the file goes once nothing else uses it
+                    if self.storage_manager.delete_image(capture.image_path, db=db):
                         freed_bytes += image_size
                         deleted_count += 1
                     
                     # Note: Don't delete the Capture record itself, just the image
                     # This preserves audit history and metadata
-                    capture.image_path = None  # Mark as image deleted
+                    capture.image_path = ""  # Mark as image deleted (column is NOT NULL)
                     db.add(capture)
                     
                 except Exception as e:
@@ -73,8 +74,8 @@ class RetentionPolicyEnforcer:
                     errors += 1
                     continue
             
-            # Commit all changes
-            if deleted_count > 0:
+            # Commit all changes (ref counts move even when no file was freed)
+            if old_captures:
                 db.commit()
             
             freed_mb = freed_bytes / (1024 * 1024)
@@ -129,6 +130,7 @@ class RetentionPolicyEnforcer:
             failed_captures = db.query(Capture).filter(
                 Capture.status == "failed",
                 Capture.created_at < cutoff_date,
+                Capture.image_path != "",
             ).all()
             
             logger.info(f"Found {len(failed_captures)} failed captures to clean")
@@ -137,11 +139,11 @@ class RetentionPolicyEnforcer:
                 try:
                     if capture.image_path:
                         image_size = self.storage_manager.get_image_size(capture.image_path)
-                        if self.storage_manager.delete_image(capture.image_path):
+                        if self.storage_manager.delete_image(capture.image_path, db=db):
                             freed_bytes += image_size
                             deleted_count += 1
                         
-                        capture.image_path = None
+                        capture.image_path = ""
                         db.add(capture)
                     
                 except Exception as e:
@@ -149,7 +151,7 @@ class RetentionPolicyEnforcer:
                     errors += 1
                     continue
             
-            if deleted_count > 0:
+            if failed_captures:
                 db.commit()
             
             freed_mb = freed_bytes / (1024 * 1024)
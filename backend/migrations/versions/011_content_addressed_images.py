@@ -0,0 +1,35 @@
+"""Content-addressed image blobs with reference counts
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "011"
+down_revision = "010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "image_blobs",
+        sa.Column("sha256", sa.String(length=64), nullable=False),
+        sa.Column("path", sa.String(), nullable=False),
+        sa.Column("size_bytes", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("ref_count", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("sha256"),
+        sa.UniqueConstraint("path"),
+    )
+    op.add_column("captures", sa.Column("image_sha256", sa.String(length=64), nullable=True))
+    op.create_index(op.f("ix_captures_image_sha256"), "captures", ["image_sha256"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_captures_image_sha256"), table_name="captures")
+    op.drop_column("captures", "image_sha256")
+    op.drop_table("image_blobs")
@@ -0,0 +1,31 @@
+"""Near-duplicate suppression: per-device frame hash and unchanged captures
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "012"
+down_revision = "011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("devices", sa.Column("last_frame_hash", sa.String(length=16), nullable=True))
+    op.add_column("devices", sa.Column("last_observation_id", sa.String(), nullable=True))
+    op.add_column("devices", sa.Column("near_duplicate_threshold", sa.Integer(), nullable=True))
+    op.add_column(
+        "captures",
+        sa.Column("reference_observation_id", sa.String(), sa.ForeignKey("observations.id"), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("captures", "reference_observation_id")
+    op.drop_column("devices", "near_duplicate_threshold")
+    op.drop_column("devices", "last_observation_id")
+    op.drop_column("devices", "last_frame_hash")
@@ -0,0 +1,38 @@
+"""Vision result cache
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "013"
+down_revision = "012"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "vision_result_cache",
+        sa.Column("cache_key", sa.String(length=64), nullable=False),
+        sa.Column("image_sha256", sa.String(length=64), nullable=False),
+        sa.Column("provider", sa.String(), nullable=False),
+        sa.Column("model", sa.String(), nullable=False),
+        sa.Column("prompt_hash", sa.String(length=16), nullable=False),
+        sa.Column("output_json", sa.JSON(), nullable=False),
+        sa.Column("hit_count", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("last_hit_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("cache_key"),
+    )
+    op.create_index(op.f("ix_vision_result_cache_image_sha256"), "vision_result_cache", ["image_sha256"], unique=False)
+    op.create_index(op.f("ix_vision_result_cache_created_at"), "vision_result_cache", ["created_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_vision_result_cache_created_at"), table_name="vision_result_cache")
+    op.drop_index(op.f("ix_vision_result_cache_image_sha256"), table_name="vision_result_cache")
+    op.drop_table("vision_result_cache")
@@ -0,0 +1,22 @@
+"""Zone crops: per-zone frame hash for change detection
+
+Revision ID: 014
+Revises: 013
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "014"
+down_revision = "013"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("zones", sa.Column("last_frame_hash", sa.String(length=16), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("zones", "last_frame_hash")
@@ -0,0 +1,24 @@
+"""Capture claiming: lease on analyzing captures
+
+Revision ID: 015
+Revises: 014
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "015"
+down_revision = "014"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("captures", sa.Column("lease_until", sa.DateTime(timezone=True), nullable=True))
+    op.create_index("ix_captures_status_lease_until", "captures", ["status", "lease_until"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_captures_status_lease_until", table_name="captures")
+    op.drop_column("captures", "lease_until")
@@ -0,0 +1,24 @@
+"""Capture pipeline checkpoints for resumable retries
+
+Revision ID: 016
+Revises: 015
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "016"
+down_revision = "015"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("captures", sa.Column("pipeline_stage", sa.String(), nullable=True))
+    op.add_column("captures", sa.Column("pipeline_checkpoint", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("captures", "pipeline_checkpoint")
+    op.drop_column("captures", "pipeline_stage")
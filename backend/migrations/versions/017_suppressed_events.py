@@ -0,0 +1,25 @@
+"""Count of suppressed zero-delta seen events per capture
+
+Revision ID: 017
+Revises: 016
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "017"
+down_revision = "016"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "captures",
+        sa.Column("suppressed_events", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("captures", "suppressed_events")
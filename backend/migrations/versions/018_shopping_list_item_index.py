@@ -0,0 +1,25 @@
+"""Index shopping list rows by item for incremental upserts
+
+Revision ID: 018
+Revises: 017
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+revision = "018"
+down_revision = "017"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_shopping_list_items_item_id_resolved_at",
+        "shopping_list_items",
+        ["item_id", "resolved_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_shopping_list_items_item_id_resolved_at", table_name="shopping_list_items")
@@ -0,0 +1,25 @@
+"""Composite (created_at, id) index for keyset-paginated inventory history
+
+Revision ID: 019
+Revises: 018
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+revision = "019"
+down_revision = "018"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_inventory_events_created_at_id",
+        "inventory_events",
+        ["created_at", "id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_inventory_events_created_at_id", table_name="inventory_events")
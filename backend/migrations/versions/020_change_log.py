@@ -0,0 +1,32 @@
+"""Change log backing the /v1/sync delta feed
+
+Revision ID: 020
+Revises: 019
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "020"
+down_revision = "019"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "change_log",
+        sa.Column("seq", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("entity", sa.String(), nullable=False),
+        sa.Column("entity_id", sa.String(), nullable=False),
+        sa.Column("op", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sqlite_autoincrement=True,
+    )
+    op.create_index("ix_change_log_created_at", "change_log", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_change_log_created_at", table_name="change_log")
+    op.drop_table("change_log")
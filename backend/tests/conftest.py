@@ -7,6 +7,7 @@ from sqlalchemy.pool import StaticPool
 from fastapi.testclient import TestClient
 
 from app.main import app
+from app.middleware.rate_limit import rate_limit_store
 from app.db.database import Base, get_db
 from app.db.models import Device
 from app.workers.celery_app import celery_app
@@ -49,6 +50,8 @@ def client(db):
         yield db
 
     app.dependency_overrides[get_db] = override_get_db
+    # Fixed-window ingest limits would otherwise carry over between tests
+    rate_limit_store._mem.clear()
 
     client = TestClient(app)
     yield client
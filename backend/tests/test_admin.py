@@ -13,6 +13,7 @@ def test_admin_stats_empty(client, db):
     assert "queue" in data
     assert "rate_limits" in data
     assert data["events"]["total"] == 0
+    assert data["near_duplicates"]["hit_rate"] == 0.0
 
 
 def test_admin_stats_with_captures(client, db):
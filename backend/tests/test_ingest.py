@@ -127,3 +127,414 @@ def test_ingest_updates_device_last_seen(client, db):
     assert device.last_seen_at is not None
     assert device.last_battery_v == 4.1
     assert device.last_rssi == -50
+
+
+def _make_device(db, token="test-token"):
+    from app.db.models import Device
+    from app.auth import TokenManager
+
+    device = Device(
+        id="test-device-001",
+        name="Test Camera",
+        token_hash=TokenManager.hash_token(token),
+    )
+    db.add(device)
+    db.commit()
+    return token
+
+
+def test_ingest_rejects_unsupported_type(client, db):
+    """Uploads outside ALLOWED_IMAGE_TYPES are refused with 415"""
+    token = _make_device(db)
+    response = client.post(
+        "/v1/ingest",
+        data={"device_id": "test-device-001", "token": token, "trigger_type": "door"},
+        files={"image": ("test.gif", BytesIO(b"GIF89a"), "image/gif")},
+    )
+    assert response.status_code == 415
+
+
+def test_ingest_rejects_oversized_upload(client, db, monkeypatch):
+    """Uploads larger than MAX_IMAGE_SIZE are refused with 413 and leave no capture"""
+    from app.config import settings
+    from app.db.models import Capture
+
+    token = _make_device(db)
+    monkeypatch.setattr(settings, "MAX_IMAGE_SIZE", 1024)
+    response = client.post(
+        "/v1/ingest",
+        data={"device_id": "test-device-001", "token": token, "trigger_type": "door"},
+        files={"image": ("big.jpg", BytesIO(b"x" * (200 * 1024)), "image/jpeg")},
+    )
+    assert response.status_code == 413
+    assert db.query(Capture).count() == 0
+
+
+def test_ingest_caps_chunked_upload_while_receiving(client, db, monkeypatch):
+    """A body sent without Content-Length is cut off with 413 once it passes the limit"""
+    import asyncio
+    from app.config import settings
+    from app.db.models import Capture
+    from app.main import app
+
+    token = _make_device(db)
+    monkeypatch.setattr(settings, "MAX_IMAGE_SIZE", 1024)
+    boundary = "pantryboundary"
+    head = "".join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+        for name, value in (("device_id", "test-device-001"), ("token", token), ("trigger_type", "door"))
+    ) + f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="big.jpg"\r\n' \
+        "Content-Type: image/jpeg\r\n\r\n"
+    chunks = [head.encode()] + [b"x" * (16 * 1024)] * 100 + [f"\r\n--{boundary}--\r\n".encode()]
+    received, sent = [], []
+
+    # Driven over raw ASGI: TestClient reads the whole request body before the app runs
+    async def receive():
+        await asyncio.sleep(0)
+        if len(received) == len(chunks):
+            return {"type": "http.disconnect"}
+        received.append(1)
+        return {"type": "http.request", "body": chunks[len(received) - 1], "more_body": len(received) < len(chunks)}
+
+    async def send(message):
+        sent.append((message, len(received)))
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/v1/ingest", "raw_path": b"/v1/ingest", "root_path": "",
+        "query_string": b"", "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+        "headers": [
+            (b"host", b"testserver"),
+            (b"transfer-encoding", b"chunked"),
+            (b"content-type", f"multipart/form-data; boundary={boundary}".encode()),
+        ],
+    }
+    asyncio.run(app(scope, receive, send))
+
+    start, read_before_response = sent[0]
+    assert start["status"] == 413
+    assert db.query(Capture).count() == 0
+    # Refused once the cap was passed (the disconnect listener drains a few more), not at the end
+    assert read_before_response < len(chunks) // 2
+
+
+def test_stage_upload_hashes_in_place_and_skips_stored_blobs(db):
+    """Staging writes a new blob once and writes nothing for one already stored"""
+    import uuid
+    from app.services.storage import get_storage_manager
+
+    mgr = get_storage_manager()
+    payload = b"\xff\xd8 staged in place " + uuid.uuid4().hex.encode()
+    first = mgr.stage_upload(BytesIO(payload))
+    assert first.path is not None and first.path.read_bytes() == payload
+    path = mgr.commit_staged(first, db)
+
+    second = mgr.stage_upload(BytesIO(payload))
+    assert second.path is None
+    assert mgr.commit_staged(second, db) == path
+    assert (mgr.storage_path / path).read_bytes() == payload
+    assert not list(mgr.tmp_path.glob("*.part"))
+
+
+def test_ingest_streams_image_to_storage(client, db):
+    """Stored image matches the uploaded bytes and no staging file is left behind"""
+    from app.db.models import Capture
+    from app.services.storage import get_storage_manager
+
+    token = _make_device(db)
+    payload = b"\xff\xd8" + b"jpeg" * 50000
+    response = client.post(
+        "/v1/ingest",
+        data={"device_id": "test-device-001", "token": token, "trigger_type": "door"},
+        files={"image": ("test.jpg", BytesIO(payload), "image/jpeg")},
+    )
+    assert response.status_code == 200
+
+    capture = db.query(Capture).filter_by(id=response.json()["capture_id"]).first()
+    mgr = get_storage_manager()
+    assert (mgr.storage_path / capture.image_path).read_bytes() == payload
+    assert not list(mgr.tmp_path.glob("*.part"))
+
+
+def test_ingest_deduplicates_identical_frames(client, db):
+    """Identical uploads share one content-addressed file with a ref count per capture"""
+    import hashlib
+    from app.db.models import Capture, ImageBlob
+    from app.services.storage import get_storage_manager
+
+    token = _make_device(db)
+    payload = b"\xff\xd8 same frame twice"
+    capture_ids = []
+    for _ in range(2):
+        response = client.post(
+            "/v1/ingest",
+            data={"device_id": "test-device-001", "token": token, "trigger_type": "timer"},
+            files={"image": ("test.jpg", BytesIO(payload), "image/jpeg")},
+        )
+        assert response.status_code == 200
+        capture_ids.append(response.json()["capture_id"])
+
+    digest = hashlib.sha256(payload).hexdigest()
+    captures = db.query(Capture).filter(Capture.id.in_(capture_ids)).all()
+    assert {c.image_sha256 for c in captures} == {digest}
+    assert len({c.image_path for c in captures}) == 1
+
+    blob = db.query(ImageBlob).filter_by(sha256=digest).one()
+    assert blob.ref_count == 2
+
+    # Releasing one reference keeps the file; releasing the last one removes it
+    mgr = get_storage_manager()
+    assert mgr.delete_image(blob.path, db=db) is False
+    assert (mgr.storage_path / blob.path).exists()
+    path = blob.path
+    assert mgr.delete_image(path, db=db) is True
+    # The file only goes once the release commits
+    assert (mgr.storage_path / path).exists()
+    db.commit()
+    assert not (mgr.storage_path / path).exists()
+    assert db.query(ImageBlob).filter_by(sha256=digest).count() == 0
+
+
+def test_released_blob_survives_new_references_and_item_images(client, db):
+    """A zero-ref blob is kept if re-referenced before commit or still shown by an item"""
+    import uuid
+    from app.db.models import ImageBlob, InventoryItem
+    from app.services.storage import get_storage_manager
+
+    mgr = get_storage_manager()
+
+    def _store():
+        staged = mgr.stage_upload(BytesIO(f"\xff\xd8 {uuid.uuid4()}".encode()))
+        path = mgr.commit_staged(staged, db)
+        db.commit()
+        return path
+
+    # An ingest re-references the blob after its last release, before commit
+    path = _store()
+    assert mgr.delete_image(path, db=db) is True
+    blob = db.query(ImageBlob).filter_by(path=path).one()
+    mgr._add_blob_reference(db, blob.sha256, path, blob.size_bytes)
+    db.commit()
+    assert (mgr.storage_path / path).exists()
+    assert db.query(ImageBlob).filter_by(path=path).one().ref_count == 1
+
+    # An inventory item still shows the image
+    path = _store()
+    db.add(InventoryItem(canonical_name=f"shown item {path}", image_path=path))
+    db.commit()
+    assert mgr.delete_image(path, db=db) is False
+    db.commit()
+    assert (mgr.storage_path / path).exists()
+
+    # A rolled-back release leaves the blob alone
+    path = _store()
+    assert mgr.delete_image(path, db=db) is True
+    db.rollback()
+    db.commit()
+    assert (mgr.storage_path / path).exists()
+    assert db.query(ImageBlob).filter_by(path=path).one().ref_count == 1
+
+
+def test_storage_stats_report_derivatives_separately(db, monkeypatch, tmp_path):
+    """Vision derivatives next to an original are not counted as stored images"""
+    from app.config import settings
+    from app.services.preprocess import vision_derivative
+    from app.services.storage import StorageManager
+
+    monkeypatch.setattr(settings, "STORAGE_PATH", str(tmp_path))
+    mgr = StorageManager()
+    path = mgr.commit_staged(mgr.stage_upload(BytesIO(_jpeg(1600, 1200))), db)
+    vision_derivative(str(mgr.storage_path / path), "high")
+    vision_derivative(str(mgr.storage_path / path), "low")
+
+    stats = mgr.get_storage_stats()
+    assert stats["file_count"] == 1
+    assert stats["total_size_mb"] * 1024 * 1024 == (mgr.storage_path / path).stat().st_size
+    assert stats["derivative_count"] == 2
+    assert stats["derivative_size_mb"] > 0
+
+
+def _jpeg(width=1200, height=900, shade=0):
+    from PIL import Image
+
+    buf = BytesIO()
+    Image.new("RGB", (width, height), (120 + shade, 80, 40)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def test_capture_image_serves_resized_derivatives(client, db):
+    """?size=thumb and ?size=medium are smaller than the original; full is the original"""
+    from PIL import Image
+
+    token = _make_device(db)
+    payload = _jpeg()
+    response = client.post(
+        "/v1/ingest",
+        data={"device_id": "test-device-001", "token": token, "trigger_type": "door"},
+        files={"image": ("test.jpg", BytesIO(payload), "image/jpeg")},
+    )
+    capture_id = response.json()["capture_id"]
+
+    full = client.get(f"/v1/captures/{capture_id}/image")
+    assert full.content == payload
+    for size, limit in (("thumb", 256), ("medium", 960)):
+        resized = client.get(f"/v1/captures/{capture_id}/image?size={size}")
+        assert resized.status_code == 200
+        assert max(Image.open(BytesIO(resized.content)).size) == limit
+    assert client.get(f"/v1/captures/{capture_id}/image?size=huge").status_code == 422
+
+
+def test_derivative_cache_evicts_least_recently_used(tmp_path):
+    """Going over budget drops the derivatives that were served longest ago"""
+    import os
+    from app.services.image_sizes import DerivativeCache
+
+    sources = []
+    for i in range(3):
+        path = tmp_path / f"src{i}.jpg"
+        path.write_bytes(_jpeg(shade=i * 40))
+        sources.append(str(path))
+
+    cache = DerivativeCache(tmp_path / "derivatives", budget_bytes=10**9)
+    first = cache.get(sources[0], "thumb")
+    one_size = os.path.getsize(first)
+    cache.budget_bytes = int(one_size * 2.5)
+    os.utime(first, (1, 1))
+    second = cache.get(sources[1], "thumb")
+    third = cache.get(sources[2], "thumb")
+
+    assert not os.path.exists(first)
+    assert os.path.exists(second) and os.path.exists(third)
+    assert cache.get(sources[0], "full") == sources[0]
+
+
+def test_capture_image_conditional_and_range_requests(client, db):
+    """Strong ETag + 304 on revalidation, 206 for a byte range, 416 past the end"""
+    import hashlib
+
+    token = _make_device(db)
+    payload = _jpeg(320, 240)
+    response = client.post(
+        "/v1/ingest",
+        data={"device_id": "test-device-001", "token": token, "trigger_type": "door"},
+        files={"image": ("test.jpg", BytesIO(payload), "image/jpeg")},
+    )
+    url = f"/v1/captures/{response.json()['capture_id']}/image"
+
+    first = client.get(url)
+    etag = first.headers["etag"]
+    assert etag == f'"{hashlib.sha256(payload).hexdigest()}"'
+    assert "immutable" in first.headers["cache-control"]
+    assert first.headers["last-modified"]
+
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(url, headers={"If-Modified-Since": first.headers["last-modified"]}).status_code == 304
+
+    partial = client.get(url, headers={"Range": "bytes=10-19"})
+    assert partial.status_code == 206
+    assert partial.content == payload[10:20]
+    assert partial.headers["content-range"] == f"bytes 10-19/{len(payload)}"
+
+    suffix = client.get(url, headers={"Range": "bytes=-5"})
+    assert suffix.content == payload[-5:]
+    stale = client.get(url, headers={"Range": "bytes=0-4", "If-Range": '"other"'})
+    assert stale.status_code == 200 and stale.content == payload
+    assert client.get(url, headers={"Range": f"bytes={len(payload)}-"}).status_code == 416
+
+    # Resized copies are not immutable: clients revalidate them by ETag
+    thumb = client.get(url, params={"size": "thumb"})
+    assert thumb.status_code == 200
+    assert "immutable" not in thumb.headers["cache-control"]
+    assert "no-cache" in thumb.headers["cache-control"]
+    revalidated = client.get(url, params={"size": "thumb"}, headers={"If-None-Match": thumb.headers["etag"]})
+    assert revalidated.status_code == 304
+
+
+def test_image_accel_redirect_hands_off_to_nginx(client, db, monkeypatch):
+    """With IMAGE_ACCEL_REDIRECT_PREFIX set the API returns headers only"""
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "IMAGE_ACCEL_REDIRECT_PREFIX", "/_storage/")
+    token = _make_device(db)
+    response = client.post(
+        "/v1/ingest",
+        data={"device_id": "test-device-001", "token": token, "trigger_type": "door"},
+        files={"image": ("test.jpg", BytesIO(_jpeg(64, 48)), "image/jpeg")},
+    )
+    assert response.status_code == 200, response.text
+    image = client.get(f"/v1/captures/{response.json()['capture_id']}/image")
+    assert image.headers["x-accel-redirect"].startswith("/_storage/images/sha256/")
+    assert image.content == b""
+
+
+def test_ingest_sheds_timer_captures_under_backlog(client, db, monkeypatch):
+    """Timer frames are throttled, then shed with Retry-After; door frames still flow"""
+    from app.config import settings
+    from app.db.models import Capture
+    from app.services import admission
+
+    monkeypatch.setattr(admission, "_ingest_admission", None)
+    monkeypatch.setattr(settings, "INGEST_LOAD_SAMPLE_SECONDS", 0)
+    monkeypatch.setattr(settings, "INGEST_MAX_BACKLOG", 10)
+    monkeypatch.setattr(settings, "INGEST_TIMER_RATE_LIMIT", 2)
+    monkeypatch.setattr(admission.IngestAdmission, "broker_depth", lambda self: None)
+    monkeypatch.setattr(admission.IngestAdmission, "pending_captures",
+                        staticmethod(lambda: db.query(Capture).filter(Capture.status == "stored").count()))
+    token = _make_device(db)
+
+    def backlog(n):
+        db.query(Capture).delete()
+        for i in range(n):
+            db.add(Capture(device_id="test-device-001", trigger_type="timer", captured_at=datetime.utcnow(),
+                           image_path=f"images/backlog{i}.jpg", status="stored"))
+        db.commit()
+
+    def ingest(trigger, shade, **kwargs):
+        return client.post(
+            "/v1/ingest",
+            data={"device_id": "test-device-001", "trigger_type": trigger},
+            files={"image": ("test.jpg", BytesIO(_jpeg(32, 24, shade=shade)), "image/jpeg")},
+            headers={"Authorization": f"Bearer {token}", "X-Trigger-Type": trigger},
+            **kwargs,
+        )
+
+    # 60% load: timer captures limited to the adaptive per-device rate (2 * 0.7 -> 1)
+    backlog(6)
+    assert ingest("timer", 1).status_code == 200
+    throttled = ingest("timer", 2)
+    assert throttled.status_code == 429
+    assert int(throttled.headers["Retry-After"]) > 0
+
+    # Full backlog: timer shed outright, door still admitted
+    backlog(10)
+    shed = ingest("timer", 3)
+    assert shed.status_code == 503
+    assert int(shed.headers["Retry-After"]) >= settings.INGEST_RETRY_AFTER_SECONDS
+    assert ingest("door", 4).status_code == 200
+
+    # Decided from the headers alone: a body that isn't even a form is never read
+    unread = client.post(
+        "/v1/ingest",
+        content=b"not a multipart body",
+        headers={"Authorization": f"Bearer {token}", "X-Trigger-Type": "timer",
+                 "Content-Type": "multipart/form-data; boundary=x"},
+    )
+    assert unread.status_code == 503
+
+    # Older firmware (trigger and token as form fields only) is still checked in the route
+    legacy = client.post(
+        "/v1/ingest",
+        data={"device_id": "test-device-001", "token": token, "trigger_type": "timer"},
+        files={"image": ("test.jpg", BytesIO(_jpeg(32, 24, shade=5)), "image/jpeg")},
+    )
+    assert legacy.status_code == 503
+
+    # A door header can't smuggle a timer capture past shedding
+    mismatched = client.post(
+        "/v1/ingest",
+        data={"device_id": "test-device-001", "trigger_type": "timer"},
+        files={"image": ("test.jpg", BytesIO(_jpeg(32, 24, shade=6)), "image/jpeg")},
+        headers={"Authorization": f"Bearer {token}", "X-Trigger-Type": "door"},
+    )
+    assert mismatched.status_code == 503
+    assert admission.get_ingest_admission().stats()["shed"] == 4
@@ -65,3 +65,271 @@ def test_inventory_history_empty(client):
     data = response.json()
     assert data["events"] == []
     assert data["total_events"] == 0
+
+
+def test_shopping_list_follows_overrides_and_sweep_repairs_drift(client, db):
+    """Count/par changes upsert or resolve only that item's row; the sweep fixes the rest"""
+    from app.db.models import ShoppingListItem
+    from app.services.shopping import recompute_shopping_list
+
+    client.post("/v1/inventory/override", json={"item_name": "rice", "count_estimate": 1, "par_level": 3})
+    rows = client.get("/v1/shopping-list").json()["items"]
+    assert [(r["item_name"], r["needed"]) for r in rows] == [("rice", 2)]
+
+    client.post("/v1/inventory/override", json={"item_name": "rice", "count_estimate": 4})
+    assert client.get("/v1/shopping-list").json()["items"] == []
+
+    # Changed behind the service's back: only the sweep notices
+    state = db.query(InventoryState).one()
+    state.count_estimate = 0
+    db.commit()
+    assert recompute_shopping_list(db) == 1
+    assert recompute_shopping_list(db) == 0
+    open_rows = db.query(ShoppingListItem).filter(ShoppingListItem.resolved_at.is_(None)).all()
+    assert [row.needed for row in open_rows] == [3]
+
+    # A state deleted behind the service's back leaves nothing for the join to find
+    db.delete(state)
+    db.commit()
+    assert recompute_shopping_list(db) == 1
+    assert client.get("/v1/shopping-list").json()["items"] == []
+
+
+def test_inventory_keyset_pages_and_filters(client, db):
+    """Cursor pages walk the whole list in name order; filters run in SQL"""
+    from app.db.models import Location
+
+    pantry = Location(name="pantry")
+    db.add(pantry)
+    names = ["apples", "beans", "coffee", "dates", "eggs"]
+    for i, name in enumerate(names):
+        item = InventoryItem(canonical_name=name, category="produce" if i % 2 == 0 else "dry", is_favorite=(name == "coffee"))
+        db.add(item)
+        db.flush()
+        db.add(InventoryState(
+            item_id=item.id, count_estimate=i, par_level=2, confidence=0.9,
+            location_id=pantry.id if name in ("beans", "eggs") else None,
+        ))
+    db.add(InventoryState(item_id=item.id, count_estimate=1, confidence=0.0))  # stale, never listed
+    db.commit()
+
+    seen, cursor = [], None
+    while True:
+        params = {"page_size": 2, **({"cursor": cursor} if cursor else {})}
+        data = client.get("/v1/inventory", params=params).json()
+        seen += [row["canonical_name"] for row in data["items"]]
+        cursor = data["next_cursor"]
+        if not cursor:
+            assert data["has_more"] is False
+            break
+    assert seen == names
+
+    def names_for(**params):
+        return [row["canonical_name"] for row in client.get("/v1/inventory", params=params).json()["items"]]
+
+    assert names_for(location="pantry") == ["beans", "eggs"]
+    assert names_for(category="produce") == ["apples", "coffee", "eggs"]
+    assert names_for(favorite=True) == ["coffee"]
+    assert names_for(below_par=True) == ["apples", "beans"]
+    assert client.get("/v1/inventory", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_exports_stream_csv_ndjson_and_gzip(client, db):
+    """Exports stream one line per row; gzip is opt-in and history keeps its JSON shape"""
+    import gzip
+    import json as jsonlib
+    from app.db.models import InventoryEvent
+
+    for name in ("rice", "beans"):
+        item = InventoryItem(canonical_name=name)
+        db.add(item)
+        db.flush()
+        db.add(InventoryState(item_id=item.id, count_estimate=2, confidence=0.9))
+        db.add(InventoryEvent(item_id=item.id, event_type="seen", delta=2))
+    db.commit()
+
+    response = client.get("/v1/inventory/export/csv")
+    lines = response.text.strip().splitlines()
+    assert lines[0].startswith("Item ID,Name") and [line.split(",")[1] for line in lines[1:]] == ["beans", "rice"]
+
+    with client.stream("GET", "/v1/inventory/export/csv", params={"compress": True}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        raw = b"".join(response.iter_raw())
+    assert gzip.decompress(raw).decode().strip().splitlines() == lines
+
+    rows = [jsonlib.loads(line) for line in client.get("/v1/inventory/export", params={"format": "ndjson"}).text.splitlines()]
+    assert sorted(r["canonical_name"] for r in rows) == ["beans", "rice"]
+    assert client.get("/v1/inventory/export").json()["items"][0]["count_estimate"] == 2
+
+    history = client.get("/v1/inventory/history").json()
+    assert history["total_events"] == 2 and {e["item_name"] for e in history["events"]} == {"beans", "rice"}
+    assert len(client.get("/v1/inventory/history", params={"format": "ndjson"}).text.splitlines()) == 2
+
+
+def test_history_keyset_pages_filters_and_tails(client, db):
+    """Cursor pages cover every event once; since= returns only newer events"""
+    from datetime import timedelta
+    from app.db.models import InventoryEvent
+
+    rice = InventoryItem(canonical_name="rice")
+    beans = InventoryItem(canonical_name="beans")
+    db.add_all([rice, beans])
+    db.flush()
+    base = datetime.utcnow() - timedelta(hours=1)
+    for i in range(5):
+        db.add(InventoryEvent(item_id=rice.id if i % 2 else beans.id, event_type="seen", delta=i,
+                              created_at=base + timedelta(minutes=i)))
+    db.commit()
+
+    first = client.get("/v1/inventory/history", params={"limit": 2}).json()
+    assert [e["delta"] for e in first["events"]] == [4, 3] and first["has_more"] is True
+    second = client.get("/v1/inventory/history", params={"limit": 2, "cursor": first["next_cursor"]}).json()
+    third = client.get("/v1/inventory/history", params={"limit": 2, "cursor": second["next_cursor"]}).json()
+    assert [e["delta"] for e in second["events"] + third["events"]] == [2, 1, 0]
+    assert third["next_cursor"] is None
+
+    only_rice = client.get("/v1/inventory/history", params={"limit": 10, "item_id": rice.id}).json()
+    assert {e["item_name"] for e in only_rice["events"]} == {"rice"} and only_rice["total_events"] == 2
+
+    tail = first["tail_cursor"]
+    assert client.get("/v1/inventory/history", params={"since": tail}).json()["events"] == []
+    db.add(InventoryEvent(item_id=rice.id, event_type="manual_override", delta=9, created_at=base + timedelta(minutes=30)))
+    db.commit()
+    new = client.get("/v1/inventory/history", params={"since": tail}).json()
+    assert [e["delta"] for e in new["events"]] == [9]
+    assert client.get("/v1/inventory/history", params={"since": new["next_cursor"]}).json()["events"] == []
+
+    recent = client.get("/v1/inventory/recent-changes", params={"limit": 3})
+    assert [e["delta"] for e in recent.json()] == [9, 4, 3]
+    older = client.get("/v1/inventory/recent-changes", params={"limit": 3, "cursor": recent.headers["x-next-cursor"]})
+    assert [e["delta"] for e in older.json()] == [2, 1, 0]
+
+
+def test_history_tail_holds_back_events_inside_grace_window(client, db, monkeypatch):
+    """An event stamped earlier but committed after a newer one is still delivered"""
+    from datetime import timedelta
+    from app.config import settings
+    from app.db.models import InventoryEvent
+
+    monkeypatch.setattr(settings, "EVENT_TAIL_GRACE_SECONDS", 10)
+    rice = InventoryItem(canonical_name="rice")
+    db.add(rice)
+    db.flush()
+    now = datetime.utcnow()
+    db.add(InventoryEvent(item_id=rice.id, event_type="seen", delta=1, created_at=now - timedelta(minutes=5)))
+    db.commit()
+    tail = client.get("/v1/inventory/history", params={"limit": 10}).json()["tail_cursor"]
+
+    # A fresh event is held back and the cursor does not move past it
+    db.add(InventoryEvent(item_id=rice.id, event_type="seen", delta=3, created_at=now))
+    db.commit()
+    held = client.get("/v1/inventory/history", params={"since": tail}).json()
+    assert held["events"] == [] and held["next_cursor"] == tail
+
+    # A slower transaction commits an event stamped before the one above
+    db.add(InventoryEvent(item_id=rice.id, event_type="seen", delta=2, created_at=now - timedelta(seconds=5)))
+    db.commit()
+    monkeypatch.setattr(settings, "EVENT_TAIL_GRACE_SECONDS", 0)
+    caught_up = client.get("/v1/inventory/history", params={"since": held["next_cursor"]}).json()
+    assert [e["delta"] for e in caught_up["events"]] == [2, 3]
+
+    # A first page headed by a fresh event starts the tail at the horizon instead
+    monkeypatch.setattr(settings, "EVENT_TAIL_GRACE_SECONDS", 10)
+    restart = client.get("/v1/inventory/history", params={"limit": 10}).json()["tail_cursor"]
+    monkeypatch.setattr(settings, "EVENT_TAIL_GRACE_SECONDS", 0)
+    again = client.get("/v1/inventory/history", params={"since": restart}).json()
+    assert [e["delta"] for e in again["events"]] == [2, 3]
+
+
+def test_sync_returns_only_rows_changed_since_cursor(client, db):
+    """Flushes and bulk statements both stamp the change log; deletes come back as ids"""
+    from app.db.models import ShoppingListItem
+    from app.services.shopping import sync_shopping_items
+
+    start = client.get("/v1/sync").json()
+    assert start["reset"] is True and start["changes"] == {}
+
+    rice = InventoryItem(canonical_name="rice")
+    beans = InventoryItem(canonical_name="beans")
+    db.add_all([rice, beans])
+    db.flush()
+    state = InventoryState(item_id=rice.id, count_estimate=0, par_level=2, confidence=0.9)
+    db.add(state)
+    sync_shopping_items(db, [rice.id])
+    db.commit()
+
+    first = client.get("/v1/sync", params={"since": start["cursor"]}).json()
+    assert first["reset"] is False
+    assert {r["canonical_name"] for r in first["changes"]["inventory_items"]["upserted"]} == {"rice", "beans"}
+    assert first["changes"]["shopping_list_items"]["upserted"][0]["needed"] == 2
+
+    # Nothing new: an empty delta and the same position
+    idle = client.get("/v1/sync", params={"since": first["cursor"]}).json()
+    assert idle["changes"] == {} and idle["cursor"] == first["cursor"]
+
+    state.count_estimate = 1
+    sync_shopping_items(db, [rice.id])  # bulk UPDATE by primary key
+    db.delete(beans)
+    db.commit()
+    delta = client.get("/v1/sync", params={"since": first["cursor"]}).json()["changes"]
+    assert set(delta) == {"inventory_items", "inventory_state", "shopping_list_items"}
+    assert delta["inventory_items"] == {"upserted": [], "deleted": [beans.id]}
+    assert delta["inventory_state"]["upserted"][0]["count_estimate"] == 1
+    assert delta["shopping_list_items"]["upserted"][0]["needed"] == 1
+    assert db.query(ShoppingListItem).count() == 1
+
+    assert client.get("/v1/sync", params={"since": "bogus"}).status_code == 400
+
+
+def test_sync_cursor_survives_writers_committing_out_of_order(tmp_path):
+    """A change flushed first but committed last is not skipped by a client polling in between
+
+    Needs a database with real concurrent writers: set TEST_DATABASE_URL to a
+    PostgreSQL database to exercise the stamping lock (SQLite serializes writers itself).
+    """
+    import os
+    import threading
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.db.database import Base
+    from app.services.sync import changes_since
+
+    url = os.getenv("TEST_DATABASE_URL", f"sqlite:///{tmp_path / 'sync.db'}")
+    engine = create_engine(url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    Sessions = sessionmaker(bind=engine)
+    reader = Sessions()
+    try:
+        cursor = changes_since(reader, None)["cursor"]
+        reader.rollback()
+
+        slow = Sessions()
+        slow.add(InventoryItem(canonical_name="rice"))
+        slow.flush()  # stamped first, still uncommitted
+
+        def fast_writer():
+            fast = Sessions()
+            fast.add(InventoryItem(canonical_name="beans"))
+            fast.commit()
+            fast.close()
+
+        fast = threading.Thread(target=fast_writer)
+        fast.start()
+        fast.join(timeout=0.5)
+
+        # Poll while the first writer is still open
+        between = changes_since(reader, cursor)
+        reader.rollback()
+        slow.commit()
+        slow.close()
+        fast.join()
+
+        seen = {r["canonical_name"] for r in between.get("changes", {}).get("inventory_items", {}).get("upserted", [])}
+        after = changes_since(reader, between["cursor"])
+        seen |= {r["canonical_name"] for r in after["changes"].get("inventory_items", {}).get("upserted", [])}
+        assert seen == {"rice", "beans"}
+    finally:
+        reader.close()
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
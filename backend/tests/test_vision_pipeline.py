@@ -1,5 +1,9 @@
 """Tests for vision pipeline improvements — confidence tuning and expiry OCR."""
 
+import json
+import os
+from unittest.mock import Mock
+
 from app.models.schemas import VisionOutput, ObservationItem
 
 
@@ -118,3 +122,298 @@ def test_vision_prompt_json_structure():
               "expiry_date", "notes"]
     for field in fields:
         assert field in prompt, f"Prompt missing field: {field}"
+
+
+def test_vision_cache_serves_repeat_analysis(db, monkeypatch, tmp_path):
+    """Second analysis of the same image is served from cache; use_cache=False bypasses it"""
+    from sqlalchemy.orm import sessionmaker
+    import app.db.session as worker_session
+    import app.services.vision_cache as vision_cache
+    from app.services.vision import VisionAnalyzer
+
+    monkeypatch.setattr(
+        worker_session, "SessionLocal",
+        sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind()),
+    )
+    monkeypatch.setattr(vision_cache, "_vision_cache", vision_cache.VisionCache())
+
+    image = tmp_path / "shelf.jpg"
+    image.write_bytes(b"\xff\xd8 shelf")
+
+    analyzer = VisionAnalyzer(provider="mock")
+    analyzer.provider, analyzer.model = "openai", "gpt-test"
+    calls = []
+
+    def fake_analyze(path):
+        calls.append(path)
+        return VisionOutput(scene_confidence=0.9, items=[ObservationItem(name="rice", confidence=0.9)])
+
+    analyzer._analyze = fake_analyze
+
+    first = analyzer.analyze_image(str(image))
+    second = analyzer.analyze_image(str(image))
+    assert len(calls) == 1
+    assert second.items[0].name == first.items[0].name == "rice"
+
+    # Persistent layer survives a cold LRU (new worker process)
+    monkeypatch.setattr(vision_cache, "_vision_cache", vision_cache.VisionCache())
+    analyzer.analyze_image(str(image))
+    assert len(calls) == 1
+
+    analyzer.analyze_image(str(image), use_cache=False)
+    assert len(calls) == 2
+
+
+def test_vision_analyzer_reused_until_config_changes(monkeypatch):
+    """get_vision_analyzer returns one instance per process and rebuilds on config change"""
+    import app.services.vision as vision
+
+    monkeypatch.setattr(vision, "_analyzer", None)
+    monkeypatch.setenv("VISION_PROVIDER", "mock")
+
+    first = vision.get_vision_analyzer()
+    assert vision.get_vision_analyzer() is first
+
+    monkeypatch.setenv("OPENAI_MODEL", "gpt-other")
+    assert vision.get_vision_analyzer() is not first
+
+
+def test_analyze_images_sends_one_request_per_batch(monkeypatch, tmp_path):
+    """N images go out in one chat request and come back as N outputs in order"""
+    from app.config import settings
+    from app.services.vision import VisionAnalyzer
+
+    monkeypatch.setattr(settings, "VISION_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "VISION_BATCH_SIZE", 4)
+    paths = []
+    for i in range(3):
+        image = tmp_path / f"shelf{i}.jpg"
+        image.write_bytes(b"\xff\xd8 shelf %d" % i)
+        paths.append(str(image))
+
+    analyzer = VisionAnalyzer(provider="mock")
+    analyzer.provider, analyzer.model = "openai", "gpt-test"
+    requests = []
+
+    def create(**kwargs):
+        content = kwargs["messages"][0]["content"]
+        requests.append(content)
+        count = sum(1 for part in content if part["type"] == "image_url")
+        results = [{"scene_confidence": 0.9, "items": [{"name": f"item {n}", "confidence": 0.9}]} for n in range(count)]
+        message = Mock(content=json.dumps({"results": results}))
+        return Mock(choices=[Mock(message=message)], usage=None)
+
+    analyzer.client = Mock()
+    analyzer.client.chat.completions.create = create
+
+    outputs = analyzer.analyze_images(paths)
+    assert len(requests) == 1
+    assert [o.items[0].name for o in outputs] == ["item 0", "item 1", "item 2"]
+
+    # A reply that doesn't line up with the images falls back to one call per image
+    analyzer.client.chat.completions.create = lambda **kw: Mock(
+        choices=[Mock(message=Mock(content='{"results": []}'))], usage=None,
+    )
+    singles = []
+    analyzer._analyze = lambda image: singles.append(image.path) or VisionOutput(scene_confidence=0.5, items=[])
+    assert len(analyzer.analyze_images(paths)) == 3
+    assert singles == paths
+
+
+def test_failover_chain_opens_breaker_and_hedges(monkeypatch):
+    """Failures fall through to the next provider, trip the breaker, and slow calls get hedged"""
+    import time
+    from app.config import settings
+    from app.exceptions import VisionAnalysisError
+    from app.services.vision_failover import FailoverVisionAnalyzer
+
+    monkeypatch.setattr(settings, "VISION_BREAKER_FAILURES", 2)
+    monkeypatch.setattr(settings, "VISION_BREAKER_RESET_SECONDS", 60)
+    calls = []
+
+    def provider(name, behaviour):
+        analyzer = Mock(provider=name, model=name, supports_batch=False)
+
+        def analyze_image(path, **kw):
+            calls.append(name)
+            return behaviour(name)
+        analyzer.analyze_image = analyze_image
+        return analyzer
+
+    def failing(name):
+        raise VisionAnalysisError("rate limited")
+
+    def ok(name):
+        return VisionOutput(scene_confidence=0.9, items=[], notes=name)
+
+    chain = FailoverVisionAnalyzer([provider("hermes", failing), provider("openai", ok)])
+    assert chain.analyze_image("a.jpg").notes == "openai"
+    assert chain.analyze_image("a.jpg").notes == "openai"
+    assert chain.breakers["hermes"].state == "open"
+
+    calls.clear()
+    assert chain.analyze_image("a.jpg").notes == "openai"
+    assert calls == ["openai"]
+
+    # Hedge: primary is far slower than its own p95, the backup answers first
+    def slow(name):
+        time.sleep(0.5)
+        return ok(name)
+
+    monkeypatch.setattr(settings, "VISION_HEDGE_ENABLED", True)
+    hedged = FailoverVisionAnalyzer([provider("hermes", slow), provider("openai", ok)])
+    for _ in range(10):
+        hedged.latency["hermes"].record(0.01)
+    started = time.monotonic()
+    assert hedged.analyze_image("a.jpg").notes == "openai"
+    assert time.monotonic() - started < 0.4
+
+
+def test_failover_ignores_rate_waits_and_local_errors(monkeypatch):
+    """Waiting for our own rate budget isn't a provider timeout; local errors don't trip breakers"""
+    import time
+    import pytest
+    from app.config import settings
+    from app.exceptions import VisionCapacityError, VisionImageError
+    from app.services.vision_failover import FailoverVisionAnalyzer, pause_attempt_clock, start_attempt_clock
+
+    monkeypatch.setattr(settings, "VISION_BREAKER_FAILURES", 1)
+
+    def provider(name, behaviour):
+        analyzer = Mock(provider=name, model=name, supports_batch=False)
+        analyzer.analyze_image = lambda path, **kw: behaviour(name)
+        return analyzer
+
+    def queued(name):
+        pause_attempt_clock()
+        time.sleep(0.3)  # rate budget wait, longer than the provider timeout
+        start_attempt_clock()
+        return VisionOutput(scene_confidence=0.9, items=[], notes=name)
+
+    chain = FailoverVisionAnalyzer([provider("hermes", queued)])
+    chain.timeout = 0.2
+    assert chain.analyze_image("a.jpg").notes == "hermes"
+    assert chain.breakers["hermes"].state == "closed"
+    assert chain.latency["hermes"]._samples[0] < 0.1
+
+    def no_budget(name):
+        raise VisionCapacityError("budget")
+
+    def missing(name):
+        raise VisionImageError("Image file not found: a.jpg")
+
+    ok = lambda name: VisionOutput(scene_confidence=0.9, items=[], notes=name)
+    chain = FailoverVisionAnalyzer([provider("hermes", no_budget), provider("openai", ok)])
+    assert chain.analyze_image("a.jpg").notes == "openai"
+    assert chain.breakers["hermes"].state == "closed"
+
+    chain = FailoverVisionAnalyzer([provider("hermes", missing), provider("openai", ok)])
+    with pytest.raises(VisionImageError):
+        chain.analyze_image("a.jpg")
+    assert chain.breakers["hermes"].state == "closed"
+
+
+def test_failover_clock_skips_pool_queue_and_caps_client_timeouts(monkeypatch):
+    """A fallback queued behind a hung thread isn't timed out before it runs; chain clients are capped"""
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from app.config import settings
+    from app.services import vision_failover
+    from app.services.vision import VisionAnalyzer
+    from app.services.vision_failover import FailoverVisionAnalyzer
+
+    monkeypatch.setattr(vision_failover, "_executor", ThreadPoolExecutor(max_workers=1))
+
+    def provider(name, behaviour):
+        analyzer = Mock(provider=name, model=name, supports_batch=False)
+        analyzer.analyze_image = lambda path, **kw: behaviour(name)
+        return analyzer
+
+    def hung(name):
+        time.sleep(0.8)  # holds the only pool thread well past the timeout
+        return VisionOutput(scene_confidence=0.9, items=[], notes=name)
+
+    ok = lambda name: VisionOutput(scene_confidence=0.9, items=[], notes=name)
+    chain = FailoverVisionAnalyzer([provider("hermes", hung), provider("openai", ok)])
+    chain.timeout = 0.3
+    assert chain.analyze_image("a.jpg").notes == "openai"
+    assert chain.breakers["openai"].failures == 0
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    capped = VisionAnalyzer(provider="openai", request_timeout=settings.VISION_PROVIDER_TIMEOUT)
+    assert capped.client.timeout == settings.VISION_PROVIDER_TIMEOUT
+    assert capped.client.max_retries == 0
+    assert capped._http_timeout(120) == min(120, settings.VISION_PROVIDER_TIMEOUT)
+
+
+def test_rate_scheduler_buckets_and_retry_after(monkeypatch):
+    """RPM/TPM buckets gate calls, usage is settled, and Retry-After pauses the provider"""
+    from app.exceptions import VisionRateLimitError
+    from app.services import vision_rate
+    from app.services.vision import VisionAnalyzer
+
+    scheduler = vision_rate.ProviderRateScheduler(rpm=2, tpm=3000, max_wait=5)
+    scheduler._redis_attempted = True  # in-process buckets
+
+    assert scheduler._try_acquire("openai", 1500) == 0
+    assert scheduler._try_acquire("openai", 1500) == 0
+    assert scheduler._try_acquire("openai", 1500) > 0  # both buckets drained
+    assert scheduler._try_acquire("ollama", 1500) == 0  # buckets are per provider
+
+    scheduler.settle("openai", 1500, 500)  # refund the over-estimate
+    assert scheduler._mem[("openai", "tpm")].level >= 1000
+
+    assert vision_rate.retry_after_seconds(Mock(headers={"retry-after": "7"})) == 7.0
+    scheduler.pause("ollama", 30)
+    assert scheduler._try_acquire("ollama", 0) > 29
+
+    # A provider 429 pauses everyone, then the call waits its turn and retries
+    monkeypatch.setattr(vision_rate, "_scheduler", vision_rate.ProviderRateScheduler(rpm=0, tpm=0))
+    vision_rate._scheduler._redis_attempted = True
+    analyzer = VisionAnalyzer(provider="mock")
+    analyzer.provider = "openai"
+    sleeps = []
+    monkeypatch.setattr(vision_rate.time, "sleep", sleeps.append)
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise VisionRateLimitError("slow down", retry_after=0.05)
+        return "ok"
+
+    assert analyzer._rate_limited(call) == "ok"
+    assert len(attempts) == 2
+    assert sleeps and 0 < sleeps[0] <= 0.05
+
+
+def test_vision_derivative_downscales_and_strips_exif(monkeypatch, tmp_path):
+    """The derivative is smaller, EXIF-free, cached next to the original, and detail follows the trigger"""
+    from PIL import Image
+    from app.config import settings
+    from app.services.preprocess import detail_for_trigger, vision_derivative
+
+    monkeypatch.setattr(settings, "VISION_MAX_DIMENSION", 800)
+    monkeypatch.setattr(settings, "VISION_IMAGE_FORMAT", "webp")
+    monkeypatch.setattr(settings, "VISION_DETAIL_BY_TRIGGER", "manual:high,timer:low")
+
+    original = tmp_path / "frame.jpg"
+    exif = Image.Exif()
+    exif[0x010F] = "ESP32-CAM"  # Make
+    Image.new("RGB", (2000, 1500), (120, 90, 60)).save(original, "JPEG", exif=exif.tobytes())
+
+    image = vision_derivative(str(original), detail_for_trigger("manual"))
+    assert image.path != str(original) and image.path.startswith(str(tmp_path))
+    assert image.mime_type == "image/webp" and image.detail == "high"
+    with Image.open(image.path) as derived:
+        assert max(derived.size) == 800
+        assert not derived.getexif()
+
+    mtime = os.path.getmtime(image.path)
+    assert vision_derivative(str(original)).path == image.path
+    assert os.path.getmtime(image.path) == mtime
+
+    low = vision_derivative(str(original), detail_for_trigger("timer"))
+    assert low.detail == "low"
+    with Image.open(low.path) as derived:
+        assert max(derived.size) == 512
@@ -4,6 +4,8 @@ import json
 from datetime import datetime
 from unittest.mock import Mock, patch
 
+import pytest
+
 from app.db.models import Capture, Device, Observation
 from app.models.schemas import VisionOutput, ObservationItem
 from app.workers.capture import CaptureProcessor
@@ -80,3 +82,687 @@ def test_process_pending_captures(db):
     count = processor.process_pending_captures(limit=5)
     assert isinstance(count, int)
     assert count >= 0
+
+
+def _bind_worker_session(db, monkeypatch):
+    """Point the worker's SessionLocal at the test database (and keep tasks off the broker)."""
+    from sqlalchemy.orm import sessionmaker
+    import app.db.session as worker_session
+    from app.workers.notify import notify_shopping_list
+
+    monkeypatch.setattr(notify_shopping_list, "apply_async", Mock())
+
+    monkeypatch.setattr(
+        worker_session, "SessionLocal",
+        sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind()),
+    )
+
+
+def _write_shelf_image(path, shade=0):
+    from PIL import Image, ImageDraw
+
+    img = Image.new("RGB", (160, 120), (200, 200, 200))
+    draw = ImageDraw.Draw(img)
+    for i in range(4):
+        draw.rectangle([10 + i * 38, 20, 38 + i * 38, 100], fill=(40 * i + shade, 80, 120))
+    img.save(path, "JPEG")
+    return str(path)
+
+
+def test_near_duplicate_frame_skips_vision(db, monkeypatch, tmp_path):
+    """A frame matching the device's last analyzed frame is marked unchanged"""
+    _bind_worker_session(db, monkeypatch)
+    device = Device(id="shelf-cam", name="Shelf", token_hash="hash")
+    db.add(device)
+    for i in range(2):
+        db.add(Capture(
+            id=f"frame-{i}",
+            device_id=device.id,
+            trigger_type="timer",
+            captured_at=datetime.fromisoformat("2026-01-15T10:00:00"),
+            image_path=_write_shelf_image(tmp_path / f"frame{i}.jpg"),
+            status="stored",
+        ))
+    db.commit()
+
+    processor = CaptureProcessor()
+    calls = []
+    original = processor.vision.analyze_image
+    monkeypatch.setattr(
+        processor.vision, "analyze_image",
+        lambda path, **kw: calls.append(path) or original(path, **kw),
+    )
+
+    assert processor.process_capture("frame-0")
+    assert processor.process_capture("frame-1")
+
+    db.expire_all()
+    device = db.query(Device).filter_by(id="shelf-cam").one()
+    second = db.query(Capture).filter_by(id="frame-1").one()
+    assert len(calls) == 1
+    assert device.last_frame_hash is not None
+    assert second.status == "unchanged"
+    assert second.reference_observation_id == device.last_observation_id
+
+
+def test_near_duplicate_of_pre_checkpoint_capture_refreshes_from_events(db, monkeypatch, tmp_path):
+    """A reference capture without seen_item_ids falls back to its events"""
+    from app.db.models import InventoryEvent, InventoryItem, InventoryState
+
+    _bind_worker_session(db, monkeypatch)
+    device = Device(id="shelf-cam", name="Shelf", token_hash="hash")
+    db.add(device)
+    for i in range(2):
+        db.add(Capture(
+            id=f"frame-{i}",
+            device_id=device.id,
+            trigger_type="timer",
+            captured_at=datetime.fromisoformat(f"2026-01-15T1{i}:00:00"),
+            image_path=_write_shelf_image(tmp_path / f"frame{i}.jpg"),
+            status="stored",
+        ))
+    db.commit()
+
+    processor = CaptureProcessor()
+    assert processor.process_capture("frame-0")
+    # Captured before persist checkpoints listed the items they saw
+    db.query(Capture).filter_by(id="frame-0").update({Capture.pipeline_checkpoint: None})
+    item = InventoryItem(canonical_name="legacy beans")
+    db.add(item)
+    db.flush()
+    db.add(InventoryState(item_id=item.id, count_estimate=1))
+    db.add(InventoryEvent(item_id=item.id, capture_id="frame-0", event_type="seen", delta=1))
+    db.commit()
+
+    assert processor.process_capture("frame-1")
+
+    db.expire_all()
+    assert db.query(Capture).filter_by(id="frame-1").one().status == "unchanged"
+    state = db.query(InventoryState).filter_by(item_id=item.id).one()
+    assert state.last_seen_at == datetime.fromisoformat("2026-01-15T11:00:00")
+
+
+def test_hamming_distance_and_threshold():
+    """Distance counts differing bits; threshold 0 disables suppression"""
+    from app.services.near_duplicate import hamming_distance, match_previous_frame
+
+    assert hamming_distance("ff00", "ff01") == 1
+    device = Mock(last_frame_hash="ff00", last_observation_id="obs", near_duplicate_threshold=2)
+    assert match_previous_frame(device, "ff01") == 1
+    device.near_duplicate_threshold = 0
+    assert match_previous_frame(device, "ff00") is None
+
+
+def test_process_captures_batch_commits_each_capture(db, monkeypatch, tmp_path):
+    """One batched vision call; a missing image fails only its own capture"""
+    _bind_worker_session(db, monkeypatch)
+    db.add(Device(id="pantry-cam", name="Pantry", token_hash="hash"))
+    for i in range(3):
+        db.add(Capture(
+            id=f"batch-{i}",
+            device_id="pantry-cam",
+            trigger_type="manual",
+            captured_at=datetime.fromisoformat("2026-01-15T10:00:00"),
+            image_path=_write_shelf_image(tmp_path / f"batch{i}.jpg", shade=i * 20),
+            status="stored",
+        ))
+    db.commit()
+    (tmp_path / "batch1.jpg").unlink()
+
+    processor = CaptureProcessor()
+    batches = []
+
+    def analyze_images(paths, **kw):
+        batches.append(paths)
+        return [VisionOutput(scene_confidence=0.9, items=[ObservationItem(name="rice", confidence=0.9)]) for _ in paths]
+
+    monkeypatch.setattr(processor.vision, "analyze_images", analyze_images)
+
+    completed = processor.process_captures_batch(["batch-0", "batch-1", "batch-2"])
+
+    db.expire_all()
+    assert completed == ["batch-0", "batch-2"]
+    assert len(batches) == 1 and len(batches[0]) == 2
+    statuses = {c.id: c.status for c in db.query(Capture).all()}
+    assert statuses == {"batch-0": "complete", "batch-1": "failed", "batch-2": "complete"}
+    assert db.query(Observation).count() == 2
+
+
+def test_cascade_resolves_learned_zones_locally(db, monkeypatch, tmp_path):
+    """Learned zones skip the LLM; only the unmatched region is cropped and sent"""
+    from app.config import settings
+    from app.db.models import InventoryItem, Zone, ZonePattern, ZoneDetection
+    from app.services import object_detection
+    from app.services.object_detection import Detection
+
+    _bind_worker_session(db, monkeypatch)
+    monkeypatch.setattr(settings, "VISION_CASCADE_ENABLED", True)
+    db.add(Device(id="zone-cam", name="Zones", token_hash="hash"))
+    db.add(Zone(id="left", device_id="zone-cam", name="Left", x=0.0, y=0.0, width=0.5, height=1.0))
+    db.add(Zone(id="right", device_id="zone-cam", name="Right", x=0.5, y=0.0, width=0.5, height=1.0))
+    db.add(InventoryItem(id="beans", canonical_name="black beans", package_type="can"))
+    db.add(ZonePattern(zone_id="left", inventory_item_id="beans", occurrence_count=9, confidence_score=0.9))
+    db.add(Capture(
+        id="zoned", device_id="zone-cam", trigger_type="door",
+        captured_at=datetime.fromisoformat("2026-01-15T10:00:00"),
+        image_path=_write_shelf_image(tmp_path / "zoned.jpg"), status="stored",
+    ))
+    db.commit()
+
+    left = Detection("can", 0.8, x=0.1, y=0.2, width=0.1, height=0.2)
+    right = Detection("box", 0.8, x=0.6, y=0.2, width=0.2, height=0.3)
+    fake = Mock(is_available=lambda: True)
+    fake.detect_zones_intersecting = lambda path, zones, conf_threshold: [
+        (left, next(z for z in zones if z.id == "left")),
+        (right, next(z for z in zones if z.id == "right")),
+    ]
+    monkeypatch.setattr(object_detection, "detector", fake)
+
+    processor = CaptureProcessor()
+    sent = []
+
+    def analyze_images(paths, **kw):
+        sent.extend(paths)
+        return [VisionOutput(scene_confidence=0.9, items=[ObservationItem(name="Rolled Oats", confidence=0.9)])]
+
+    monkeypatch.setattr(processor.vision, "analyze_images", analyze_images)
+    monkeypatch.setattr(processor.vision, "analyze_image", Mock(side_effect=AssertionError("full frame sent")))
+
+    assert processor.process_capture("zoned")
+
+    db.expire_all()
+    assert len(sent) == 1
+    names = {i.canonical_name for i in db.query(InventoryItem).all()}
+    assert names == {"black beans", "rolled oats"}
+    assert db.query(ZoneDetection).filter_by(inferred_item_id="beans").count() == 1
+    learned = db.query(ZonePattern).filter_by(zone_id="right").one()
+    assert learned.inventory_item_id == db.query(InventoryItem).filter_by(canonical_name="rolled oats").one().id
+
+
+def test_cascade_sums_one_item_seen_in_several_crops(db, monkeypatch, tmp_path):
+    """Two crops showing the same product add up to one count and one event"""
+    from app.config import settings
+    from app.db.models import InventoryEvent, InventoryItem, InventoryState, Zone
+    from app.services import object_detection
+    from app.services.object_detection import Detection
+
+    _bind_worker_session(db, monkeypatch)
+    monkeypatch.setattr(settings, "VISION_CASCADE_ENABLED", True)
+    db.add(Device(id="zone-cam", name="Zones", token_hash="hash"))
+    db.add(Zone(id="left", device_id="zone-cam", name="Left", x=0.0, y=0.0, width=0.5, height=1.0))
+    db.add(Capture(
+        id="doubled", device_id="zone-cam", trigger_type="door",
+        captured_at=datetime.fromisoformat("2026-01-15T10:00:00"),
+        image_path=_write_shelf_image(tmp_path / "doubled.jpg"), status="stored",
+    ))
+    db.commit()
+
+    first = Detection("can", 0.8, x=0.1, y=0.2, width=0.1, height=0.2)
+    second = Detection("can", 0.8, x=0.3, y=0.2, width=0.1, height=0.2)
+    fake = Mock(is_available=lambda: True)
+    fake.detect_zones_intersecting = lambda path, zones, conf_threshold: [(first, zones[0]), (second, zones[0])]
+    monkeypatch.setattr(object_detection, "detector", fake)
+
+    processor = CaptureProcessor()
+    monkeypatch.setattr(processor.vision, "analyze_images", lambda paths, **kw: [
+        VisionOutput(scene_confidence=0.9, items=[ObservationItem(name="Black Beans", quantity_estimate=2, confidence=0.8)]),
+        VisionOutput(scene_confidence=0.9, items=[ObservationItem(name="black beans", confidence=0.95)]),
+    ])
+
+    assert processor.process_capture("doubled")
+
+    db.expire_all()
+    beans = db.query(InventoryItem).filter_by(canonical_name="black beans").one()
+    state = db.query(InventoryState).filter_by(item_id=beans.id).one()
+    assert state.count_estimate == 3
+    assert state.confidence == 0.95
+    assert db.query(InventoryEvent).filter_by(capture_id="doubled").count() == 1
+
+
+def test_zone_crops_send_only_changed_zones(db, monkeypatch, tmp_path):
+    """Each zone is a separate crop; on the next frame only the changed zone is resent"""
+    from PIL import Image, ImageDraw
+    import app.workers.capture as capture_module
+    from app.config import settings
+    from app.db.models import InventoryEvent, Zone
+
+    _bind_worker_session(db, monkeypatch)
+    monkeypatch.setattr(settings, "VISION_ZONE_CROPS_ENABLED", True)
+    db.add(Device(id="zone-cam", name="Zones", token_hash="hash"))
+    db.add(Zone(id="left", device_id="zone-cam", name="Left", x=0.0, y=0.0, width=0.5, height=1.0))
+    db.add(Zone(id="right", device_id="zone-cam", name="Right", x=0.5, y=0.0, width=0.5, height=1.0))
+
+    def frame(name, right_fill):
+        img = Image.new("RGB", (200, 100), (200, 200, 200))
+        draw = ImageDraw.Draw(img)
+        draw.rectangle([10, 10, 40, 90], fill=(30, 60, 90))
+        draw.rectangle([60, 30, 90, 90], fill=(90, 30, 60))
+        for i, fill in enumerate(right_fill):
+            draw.rectangle([110 + i * 20, 10 + i * 15, 125 + i * 20, 90], fill=fill)
+        path = tmp_path / name
+        img.save(path, "JPEG")
+        return str(path)
+
+    for i, fills in enumerate([[(20, 20, 20), (240, 240, 240)], [(240, 240, 240), (20, 20, 20), (120, 0, 0)]]):
+        db.add(Capture(
+            id=f"zone-frame-{i}", device_id="zone-cam", trigger_type="door",
+            captured_at=datetime.fromisoformat("2026-01-15T10:00:00"),
+            image_path=frame(f"zone{i}.jpg", fills), status="stored",
+        ))
+    db.commit()
+
+    processor = CaptureProcessor()
+    sent = []
+
+    def analyze_image(path, **kw):
+        sent.append(path.rsplit("zone-", 1)[-1])
+        return VisionOutput(scene_confidence=0.9, items=[ObservationItem(name="rice", confidence=0.9)])
+
+    monkeypatch.setattr(processor.vision, "analyze_image", analyze_image)
+
+    assert processor.process_capture("zone-frame-0")
+    assert sorted(sent) == ["left.jpg", "right.jpg"]
+
+    sent.clear()
+    assert processor.process_capture("zone-frame-1")
+    assert sent == ["right.jpg"]
+
+    db.expire_all()
+    event = db.query(InventoryEvent).filter_by(capture_id="zone-frame-1").one()
+    assert event.details["zone_id"] == "right"
+
+    # Same shelf again, past the whole-frame check: no zone changed, nothing is sent,
+    # and frame 1 stays the reference observation for later near-duplicates
+    reference = db.query(Device).filter_by(id="zone-cam").one().last_observation_id
+    db.add(Capture(
+        id="zone-frame-2", device_id="zone-cam", trigger_type="door",
+        captured_at=datetime.fromisoformat("2026-01-15T10:05:00"),
+        image_path=frame("zone2.jpg", [(240, 240, 240), (20, 20, 20), (120, 0, 0)]), status="stored",
+    ))
+    db.commit()
+    monkeypatch.setattr(capture_module, "match_previous_frame", lambda device, frame_hash: None)
+    sent.clear()
+    assert processor.process_capture("zone-frame-2")
+    assert sent == []
+    db.expire_all()
+    assert db.query(Device).filter_by(id="zone-cam").one().last_observation_id == reference
+
+
+def test_partial_zone_pass_keeps_unchanged_zones_fresh(db, monkeypatch, tmp_path):
+    """Zones left out of a pass keep their items fresh, crops follow the trigger detail,
+    and one product across zones is summed"""
+    from PIL import Image, ImageDraw
+    import app.workers.capture as capture_module
+    from app.config import settings
+    from app.db.models import InventoryItem, InventoryState, Zone
+
+    _bind_worker_session(db, monkeypatch)
+    monkeypatch.setattr(settings, "VISION_ZONE_CROPS_ENABLED", True)
+    monkeypatch.setattr(settings, "VISION_DETAIL_BY_TRIGGER", "door:low")
+    db.add(Device(id="zone-cam", name="Zones", token_hash="hash"))
+    db.add(Zone(id="left", device_id="zone-cam", name="Left", x=0.0, y=0.0, width=0.5, height=1.0))
+    db.add(Zone(id="right", device_id="zone-cam", name="Right", x=0.5, y=0.0, width=0.5, height=1.0))
+
+    def frame(name, right_fill):
+        img = Image.new("RGB", (200, 100), (200, 200, 200))
+        draw = ImageDraw.Draw(img)
+        draw.rectangle([10, 10, 40, 90], fill=(30, 60, 90))
+        for i, fill in enumerate(right_fill):
+            draw.rectangle([110 + i * 20, 10 + i * 15, 125 + i * 20, 90], fill=fill)
+        path = tmp_path / name
+        img.save(path, "JPEG")
+        return str(path)
+
+    for i, fills in enumerate([[(20, 20, 20), (240, 240, 240)], [(240, 240, 240), (20, 20, 20), (120, 0, 0)]]):
+        db.add(Capture(
+            id=f"partial-{i}", device_id="zone-cam", trigger_type="door",
+            captured_at=datetime(2026, 1, 15, 10, i * 10),
+            image_path=frame(f"partial{i}.jpg", fills), status="stored",
+        ))
+    db.commit()
+
+    processor = CaptureProcessor()
+    details = []
+
+    def analyze_image(path, detail="high", **kw):
+        details.append(detail)
+        zone = path.rsplit("zone-", 1)[-1]
+        names = ["beans", "rice"] if zone == "left.jpg" else ["rice"]
+        return VisionOutput(scene_confidence=0.9, items=[ObservationItem(name=n, confidence=0.9) for n in names])
+
+    monkeypatch.setattr(processor.vision, "analyze_image", analyze_image)
+    monkeypatch.setattr(capture_module, "match_previous_frame", lambda device, frame_hash: None)
+
+    assert processor.process_capture("partial-0")
+    assert set(details) == {"low"}
+    db.expire_all()
+    rice = db.query(InventoryItem).filter_by(canonical_name="rice").one()
+    beans = db.query(InventoryItem).filter_by(canonical_name="beans").one()
+    assert db.query(InventoryState).filter_by(item_id=rice.id).one().count_estimate == 2
+
+    # Only the right zone changed: beans (left) are still on the shelf
+    details.clear()
+    assert processor.process_capture("partial-1")
+    assert len(details) == 1
+    db.expire_all()
+    beans_state = db.query(InventoryState).filter_by(item_id=beans.id).one()
+    assert beans_state.last_seen_at == datetime(2026, 1, 15, 10, 10)
+    checkpoint = db.query(Capture).filter_by(id="partial-1").one().pipeline_checkpoint
+    assert checkpoint["zone_item_ids"] == {"left": [beans.id, rice.id], "right": [rice.id]}
+
+
+def test_capture_claim_is_exclusive_and_leases_expire(db, monkeypatch, tmp_path):
+    """A live lease blocks a second worker; an expired one is reclaimed and analyzed once"""
+    from datetime import timedelta
+    from app.workers.claims import claim_capture, expired_lease_ids
+
+    _bind_worker_session(db, monkeypatch)
+    db.add(Device(id="lease-cam", name="Lease", token_hash="hash"))
+    db.add(Capture(
+        id="leased", device_id="lease-cam", trigger_type="door",
+        captured_at=datetime.fromisoformat("2026-01-15T10:00:00"),
+        image_path=_write_shelf_image(tmp_path / "leased.jpg"), status="stored",
+    ))
+    db.commit()
+
+    assert claim_capture(db, "leased")
+    assert not claim_capture(db, "leased")
+
+    processor = CaptureProcessor()
+    calls = []
+    monkeypatch.setattr(
+        processor.vision, "analyze_image",
+        lambda path, **kw: calls.append(path) or VisionOutput(scene_confidence=0.9, items=[]),
+    )
+    assert processor.process_capture("leased")  # held by the first claim: skipped
+    assert calls == []
+
+    capture = db.query(Capture).filter_by(id="leased").one()
+    capture.lease_until = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert expired_lease_ids(db) == ["leased"]
+    assert processor.process_capture("leased")
+    assert processor.process_capture("leased")  # complete: not reopened without reprocess
+    assert len(calls) == 1
+
+    db.expire_all()
+    assert db.query(Capture).filter_by(id="leased").one().status == "complete"
+
+
+def test_enqueue_capture_deduplicates_pending_enqueues(monkeypatch):
+    """A second enqueue while one is pending is dropped; re-analysis always queues"""
+    from app.workers import celery_app as tasks
+    from app.workers import claims
+
+    monkeypatch.setattr(claims, "_enqueue_dedup", claims.EnqueueDedup())
+    monkeypatch.setattr(claims.EnqueueDedup, "_get_redis", lambda self: None)
+    delay = Mock(return_value=Mock(id="task"))
+    monkeypatch.setattr(tasks.process_image_capture, "delay", delay)
+
+    assert tasks.enqueue_capture("cap-1") is not None
+    assert tasks.enqueue_capture("cap-1") is None
+    assert tasks.enqueue_capture("cap-1", use_cache=False, reprocess=True) is not None
+    claims.get_enqueue_dedup().clear("cap-1")
+    assert tasks.enqueue_capture("cap-1") is not None
+    assert delay.call_count == 3
+
+    # A failed publish leaves nothing queued, so it must not block the next enqueue
+    delay.side_effect = ConnectionError("broker down")
+    with pytest.raises(ConnectionError):
+        tasks.enqueue_capture("cap-2")
+    delay.side_effect = None
+    assert tasks.enqueue_capture("cap-2") is not None
+
+
+def test_retry_resumes_after_last_completed_stage(db, monkeypatch, tmp_path):
+    """A vision failure keeps the preprocess/barcode work; a persist failure keeps the vision result"""
+    import app.workers.capture as capture_module
+
+    _bind_worker_session(db, monkeypatch)
+    db.add(Device(id="retry-cam", name="Retry", token_hash="hash"))
+    db.add(Capture(
+        id="retried", device_id="retry-cam", trigger_type="door",
+        captured_at=datetime.fromisoformat("2026-01-15T10:00:00"),
+        image_path=_write_shelf_image(tmp_path / "retried.jpg"), status="stored",
+    ))
+    db.commit()
+
+    barcode_scans = Mock(return_value=[])
+    hashes = Mock(side_effect=capture_module.dhash)
+    monkeypatch.setattr(capture_module, "detect_barcodes", barcode_scans)
+    monkeypatch.setattr(capture_module, "dhash", hashes)
+
+    processor = CaptureProcessor()
+    output = VisionOutput(scene_confidence=0.9, items=[ObservationItem(name="rice", confidence=0.9)])
+    vision = Mock(side_effect=[capture_module.VisionAnalysisError("provider down"), output])
+    monkeypatch.setattr(processor.vision, "analyze_image", vision)
+
+    assert not processor.process_capture("retried")
+    db.expire_all()
+    capture = db.query(Capture).filter_by(id="retried").one()
+    assert (capture.status, capture.pipeline_stage) == ("failed", "barcode")
+
+    persist = processor._persist_result
+    monkeypatch.setattr(processor, "_persist_result", Mock(side_effect=RuntimeError("db hiccup")))
+    assert not processor.process_capture("retried")
+    db.expire_all()
+    assert db.query(Capture).filter_by(id="retried").one().pipeline_stage == "vision"
+
+    monkeypatch.setattr(processor, "_persist_result", persist)
+    assert processor.process_capture("retried")
+
+    db.expire_all()
+    capture = db.query(Capture).filter_by(id="retried").one()
+    assert (capture.status, capture.pipeline_stage) == ("complete", "notify")
+    assert barcode_scans.call_count == 1
+    assert hashes.call_count == 1
+    assert vision.call_count == 2
+    assert db.query(Observation).filter_by(capture_id="retried").count() == 1
+
+
+def test_forced_reanalysis_ignores_vision_checkpoint(db, monkeypatch, tmp_path):
+    """use_cache=False on a failed capture re-runs vision instead of reusing the checkpoint"""
+    import app.workers.capture as capture_module
+
+    _bind_worker_session(db, monkeypatch)
+    db.add(Device(id="redo-cam", name="Redo", token_hash="hash"))
+    db.add(Capture(
+        id="redo", device_id="redo-cam", trigger_type="door",
+        captured_at=datetime.fromisoformat("2026-01-15T10:00:00"),
+        image_path=_write_shelf_image(tmp_path / "redo.jpg"), status="stored",
+    ))
+    db.commit()
+    monkeypatch.setattr(capture_module, "detect_barcodes", Mock(return_value=[]))
+
+    processor = CaptureProcessor()
+    stale = VisionOutput(scene_confidence=0.9, items=[ObservationItem(name="rice", confidence=0.9)])
+    fresh = VisionOutput(scene_confidence=0.9, items=[ObservationItem(name="beans", confidence=0.9)])
+    vision = Mock(side_effect=[stale, fresh])
+    monkeypatch.setattr(processor.vision, "analyze_image", vision)
+
+    # Vision checkpointed, then persist failed: the capture is failed with a vision checkpoint
+    monkeypatch.setattr(processor, "_persist_result", Mock(side_effect=RuntimeError("db hiccup")))
+    assert not processor.process_capture("redo")
+    db.expire_all()
+    assert db.query(Capture).filter_by(id="redo").one().pipeline_stage == "vision"
+
+    persist = Mock()
+    monkeypatch.setattr(processor, "_persist_result", persist)
+    assert processor.process_capture("redo", use_cache=False)
+    assert vision.call_count == 2
+    assert persist.call_args.args[2] == fresh
+
+
+def test_barcode_lookups_run_alongside_vision(db, monkeypatch, tmp_path):
+    """Both lookups and the vision call are in flight together, then joined before persist"""
+    import threading
+    import app.workers.capture as capture_module
+    from app.db.models import BarcodeLookup
+    from app.services.barcode import BarcodeProduct
+    from app.services.barcode_detector import DetectedBarcode
+
+    _bind_worker_session(db, monkeypatch)
+    db.add(Device(id="scan-cam", name="Scan", token_hash="hash"))
+    db.add(Capture(
+        id="scanned", device_id="scan-cam", trigger_type="door",
+        captured_at=datetime.fromisoformat("2026-01-15T10:00:00"),
+        image_path=_write_shelf_image(tmp_path / "scanned.jpg"), status="stored",
+    ))
+    db.commit()
+
+    # Three parties: two lookups and the vision request must all be running at once
+    in_flight = threading.Barrier(3, timeout=5)
+
+    def lookup(code):
+        in_flight.wait()
+        return BarcodeProduct(barcode=code, product_name=f"product {code}", found=True)
+
+    def analyze_image(path, **kw):
+        in_flight.wait()
+        return VisionOutput(scene_confidence=0.9, items=[ObservationItem(name="rice", confidence=0.9)])
+
+    monkeypatch.setattr(capture_module, "detect_barcodes", lambda path: [
+        DetectedBarcode(data="0001", barcode_type="EAN13", confidence=1.0),
+        DetectedBarcode(data="0002", barcode_type="EAN13", confidence=1.0),
+    ])
+    monkeypatch.setattr(capture_module, "lookup_barcode", lookup)
+    processor = CaptureProcessor()
+    monkeypatch.setattr(processor.vision, "analyze_image", analyze_image)
+
+    assert processor.process_capture("scanned")
+
+    db.expire_all()
+    assert {b.barcode for b in db.query(BarcodeLookup).all()} == {"0001", "0002"}
+    assert db.query(Capture).filter_by(id="scanned").one().status == "complete"
+
+
+def test_inventory_upsert_uses_constant_queries(db):
+    """40 detections (half already known) cost two SELECTs and one batched INSERT per table"""
+    from sqlalchemy import event
+    from app.db.models import InventoryEvent, InventoryItem, InventoryState
+
+    db.add(Device(id="bulk-cam", name="Bulk", token_hash="hash"))
+    capture = Capture(
+        id="bulk", device_id="bulk-cam", trigger_type="door",
+        captured_at=datetime.fromisoformat("2026-01-15T10:00:00"),
+        image_path="images/bulk.jpg", status="analyzing",
+    )
+    db.add(capture)
+    for i in range(20):
+        db.add(InventoryItem(id=f"known-{i}", canonical_name=f"item {i}"))
+        db.add(InventoryState(item_id=f"known-{i}", count_estimate=1, confidence=0.9))
+    db.commit()
+    db.refresh(capture)
+
+    result = VisionOutput(scene_confidence=0.9, items=[
+        ObservationItem(name=f"Item {i}", quantity_estimate=3, confidence=0.9) for i in range(40)
+    ])
+    statements = []
+    engine = db.get_bind()
+    listener = lambda conn, cursor, statement, *args: statements.append(statement.split()[0])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        updated, _ = CaptureProcessor()._upsert_inventory(db, capture, result)
+        db.commit()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert updated == 40
+    assert statements.count("SELECT") == 2
+    assert len(statements) <= 8
+    assert db.query(InventoryItem).count() == 40
+    assert db.query(InventoryEvent).filter_by(capture_id="bulk", delta=2).count() == 20
+
+
+def test_unchanged_sightings_are_suppressed_and_coalesced(db, monkeypatch):
+    """Zero-delta sightings write no event; last_seen_at moves only once per coalesce window"""
+    from app.config import settings
+    from app.db.models import InventoryEvent, InventoryItem, InventoryState
+
+    monkeypatch.setattr(settings, "INVENTORY_SUPPRESS_UNCHANGED_EVENTS", True)
+    monkeypatch.setattr(settings, "INVENTORY_LAST_SEEN_COALESCE_SECONDS", 600)
+    db.add(Device(id="quiet-cam", name="Quiet", token_hash="hash"))
+    db.commit()
+    processor = CaptureProcessor()
+    result = VisionOutput(scene_confidence=0.9, items=[
+        ObservationItem(name="Rice", quantity_estimate=2, confidence=0.9),
+        ObservationItem(name="Beans", quantity_estimate=1, confidence=0.9),
+    ])
+
+    def persist(capture_id, at, items=result):
+        capture = Capture(
+            id=capture_id, device_id="quiet-cam", trigger_type="timer",
+            captured_at=datetime.fromisoformat(at), image_path=f"images/{capture_id}.jpg", status="analyzing",
+        )
+        db.add(capture)
+        written, seen = processor._upsert_inventory(db, capture, items)
+        db.commit()
+        return capture, written, seen
+
+    _, written, _ = persist("first", "2026-01-15T10:00:00")
+    assert written == 2
+    capture, written, seen = persist("second", "2026-01-15T10:05:00")
+    assert (written, capture.suppressed_events, len(seen)) == (0, 2, 2)
+    rice = db.query(InventoryItem).filter_by(canonical_name="rice").one()
+    state = db.query(InventoryState).filter_by(item_id=rice.id).one()
+    assert state.last_seen_at.replace(tzinfo=None) == datetime(2026, 1, 15, 10, 0)
+
+    persist("third", "2026-01-15T10:20:00")
+    db.refresh(state)
+    assert state.last_seen_at.replace(tzinfo=None) == datetime(2026, 1, 15, 10, 20)
+
+    changed = VisionOutput(scene_confidence=0.9, items=[ObservationItem(name="Rice", quantity_estimate=1, confidence=0.9)])
+    _, written, _ = persist("fourth", "2026-01-15T10:21:00", changed)
+    assert written == 1
+    assert db.query(InventoryEvent).count() == 3
+
+
+def test_shopping_notify_is_debounced_and_skips_unchanged_lists(db, monkeypatch):
+    """A burst of triggers schedules one run; an identical list is not re-posted"""
+    import app.db.session as worker_session
+    from app.db.models import InventoryItem, InventoryState
+    from app.services.shopping import sync_shopping_items
+    from app.workers import notify
+
+    _bind_worker_session(db, monkeypatch)
+    monkeypatch.setattr(notify, "SessionLocal", worker_session.SessionLocal)
+    monkeypatch.setattr(notify, "_notify_state", notify.NotifyState())
+    monkeypatch.setattr(notify.NotifyState, "_get_redis", lambda self: None)
+    post = Mock(return_value=True)
+    monkeypatch.setattr(notify, "_post_webhook", post)
+
+    assert notify.request_shopping_list_notify() is True
+    assert notify.request_shopping_list_notify() is False
+    assert notify.request_shopping_list_notify() is False
+    assert notify.notify_shopping_list.apply_async.call_count == 1
+
+    item = InventoryItem(canonical_name="rice")
+    db.add(item)
+    db.flush()
+    db.add(InventoryState(item_id=item.id, count_estimate=0, confidence=0.9, par_level=2))
+    sync_shopping_items(db, [item.id])
+    db.commit()
+
+    assert notify.notify_shopping_list()["notified"] is True
+    second = notify.notify_shopping_list()
+    assert second["notified"] is False and second["unchanged"] is True
+    assert post.call_count == 1
+    # The run cleared the pending marker, so the next trigger schedules again
+    assert notify.request_shopping_list_notify() is True
+
+
+def test_notify_lock_release_only_drops_own_token(monkeypatch):
+    """A run whose lock expired must not release the lock a newer run holds"""
+    import time
+    from app.workers import notify
+
+    state = notify.NotifyState()
+    monkeypatch.setattr(notify.NotifyState, "_get_redis", lambda self: None)
+
+    assert state.set_once("lock", "old-run", 0.01)
+    time.sleep(0.02)
+    assert state.set_once("lock", "new-run", 60)
+    assert state.release("lock", "old-run") is False
+    assert state.set_once("lock", "third-run", 60) is False
+    assert state.release("lock", "new-run") is True
+    assert state.set_once("lock", "third-run", 60) is True
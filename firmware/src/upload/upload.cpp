@@ -7,6 +7,14 @@
 const int MAX_RETRIES = 3;
 const int RETRY_DELAY_MS = 2000;
 
+// Set when the API refuses a capture under load (429/503 + Retry-After).
+// Timer captures are skipped until it passes; event triggers still try.
+static unsigned long backoff_until_ms = 0;
+
+static bool in_backoff() {
+    return backoff_until_ms != 0 && (long)(millis() - backoff_until_ms) < 0;
+}
+
 bool Upload::send_image(
     const uint8_t* image_data,
     size_t image_size,
@@ -16,6 +24,11 @@ bool Upload::send_image(
     float battery_v,
     int rssi
 ) {
+    if (strcmp(trigger_type, "timer") == 0 && in_backoff()) {
+        Serial.println("[UPLOAD] Server asked to back off; skipping timer capture");
+        return false;
+    }
+
     Serial.println("[UPLOAD] Preparing request...");
     
     // Generate ISO8601 timestamp
@@ -105,6 +118,10 @@ bool Upload::send_image(
         String content_type = String("multipart/form-data; boundary=") + boundary;
         http.addHeader("Content-Type", content_type);
         http.addHeader("Authorization", String("Bearer ") + Config::api_token);
+        // Lets the server shed a timer capture under backlog before the image is sent
+        http.addHeader("X-Trigger-Type", trigger_type);
+        const char* response_headers[] = {"Retry-After"};
+        http.collectHeaders(response_headers, 1);
         
         Serial.printf("[UPLOAD] Sending %d bytes...\n", full_size);
         
@@ -120,6 +137,17 @@ bool Upload::send_image(
                 free(full_body);
                 Serial.println("[UPLOAD] Image uploaded successfully!");
                 return true;
+            } else if (httpCode == 429 || httpCode == 503) {
+                // Overloaded: don't retry now, wait as long as the server asks
+                long retry_after_s = http.header("Retry-After").toInt();
+                if (retry_after_s <= 0) {
+                    retry_after_s = 30;
+                }
+                backoff_until_ms = millis() + (unsigned long)retry_after_s * 1000UL;
+                Serial.printf("[UPLOAD] Server busy (%d), backing off %lds\n", httpCode, retry_after_s);
+                http.end();
+                free(full_body);
+                return false;
             } else {
                 String error_body = http.getString();
                 Serial.printf("[UPLOAD] Server error (%d): %s\n", httpCode, error_body.c_str());
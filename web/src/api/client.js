@@ -107,6 +107,12 @@ export const deleteDevice = async (id) => {
   return data
 }
 
+// Delta sync: pass the cursor from the previous response; reset=true means refetch everything
+export const syncChanges = async (since) => {
+  const { data } = await apiClient.get('/v1/sync', { params: since ? { since } : {} })
+  return data
+}
+
 // Inventory API
 export const listInventory = async (params = {}) => {
   const { data } = await apiClient.get('/v1/inventory', { params })
@@ -279,7 +279,7 @@ function CaptureRow({ capture }) {
           {capture.image_url && (
             <div className="mb-3 rounded-lg overflow-hidden border max-w-sm">
               <img
-                src={capture.image_url}
+                src={`${capture.image_url}?size=medium`}
                 alt={`Capture ${capture.id}`}
                 className="w-full h-48 object-cover"
                 onError={(e) => { e.target.style.display = 'none'; }}
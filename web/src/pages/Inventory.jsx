@@ -57,7 +57,7 @@ export default function Inventory() {
         count: item.count_estimate || 0,
         par_level: item.par_level || 0,
         expires_at: item.expires_at || new Date(Date.now() + 365 * 86400000).toISOString().split('T')[0],
-        image_url: item.image_url ? `${import.meta.env.VITE_API_URL ?? ''}${item.image_url}` : null,
+        image_url: item.image_url ? `${import.meta.env.VITE_API_URL ?? ''}${item.image_url}?size=thumb` : null,
         location: item.location || null,
         notes: item.notes || null,
       }));